@@ -0,0 +1,108 @@
+"""Encode time and file size for output encoder settings
+
+    python -m benchmarks.encode_benchmark [image.png] [--repeat 3] [--json]
+
+Without an input image a smooth synthetic pattern at IMAGE_OUTPUT_SIZE is used.
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config.settings import IMAGE_OUTPUT_SIZE, PROCESSED_OUTPUTS, RAW_OUTPUT
+from utils.image_processor import encode_image, encode_outputs
+
+CANDIDATE_SETTINGS = {
+    "png-1": {"format": "PNG", "compress_level": 1},
+    "png-3": {"format": "PNG", "compress_level": 3},
+    "png-6": {"format": "PNG", "compress_level": 6},
+    "png-9": {"format": "PNG", "compress_level": 9},
+    "png-optimize": {"format": "PNG", "optimize": True},
+    "jpeg-75": {"format": "JPEG", "quality": 75},
+    "jpeg-85": {"format": "JPEG", "quality": 85},
+    "jpeg-95": {"format": "JPEG", "quality": 95},
+    "webp-80": {"format": "WEBP", "quality": 80},
+    "webp-90": {"format": "WEBP", "quality": 90},
+}
+
+def synthetic_image(size=IMAGE_OUTPUT_SIZE):
+    """Smooth, low-noise pattern comparable to a generated design upscaled to print size"""
+    from PIL import Image, ImageFilter
+
+    noise = Image.effect_noise((64, 64), 64).convert("RGB")
+    return noise.resize((512, 512), Image.BICUBIC).filter(ImageFilter.GaussianBlur(2)).resize(size, Image.LANCZOS)
+
+def benchmark(image, settings, repeat=3):
+    """Median encode seconds and encoded size for each named setting"""
+    results = []
+    for name, spec in settings.items():
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            data = encode_image(image, **spec)
+            timings.append(time.perf_counter() - start)
+        results.append({
+            "setting": name,
+            "spec": {key: value for key, value in spec.items() if key != "suffix"},
+            "seconds": statistics.median(timings),
+            "bytes": len(data),
+        })
+    return results
+
+def benchmark_single_pass(image, outputs=PROCESSED_OUTPUTS, repeat=3):
+    """Wall time to encode every configured output of one image in parallel"""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        encode_outputs(image, outputs)
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings)
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark output encoder settings')
+    parser.add_argument('image', nargs='?', help='Image to encode (defaults to a synthetic pattern)')
+    parser.add_argument('--repeat', type=int, default=3, help='Encodes per setting; the median is reported')
+    parser.add_argument('--json', action='store_true', help='Print machine-readable results')
+    args = parser.parse_args()
+
+    from PIL import Image
+
+    if args.image:
+        image = Image.open(args.image)
+        image.load()
+    else:
+        image = synthetic_image()
+
+    settings = dict(CANDIDATE_SETTINGS)
+    settings["configured-raw"] = RAW_OUTPUT
+    settings.update({f"configured-{name}": spec for name, spec in PROCESSED_OUTPUTS.items()})
+    results = benchmark(image, settings, args.repeat)
+    single_pass = benchmark_single_pass(image, repeat=args.repeat)
+
+    if args.json:
+        print(json.dumps({
+            "image_size": image.size,
+            "results": results,
+            "configured_outputs_seconds": single_pass,
+        }, indent=2))
+        return
+
+    from rich.console import Console
+    from rich.table import Table
+
+    table = Table(title=f"Encoding a {image.size[0]}×{image.size[1]} image (median of {args.repeat})")
+    table.add_column("Setting")
+    table.add_column("Seconds", justify="right")
+    table.add_column("Size (KiB)", justify="right")
+    for result in results:
+        table.add_row(result["setting"], f"{result['seconds']:.3f}", f"{result['bytes'] / 1024:.0f}")
+    console = Console()
+    console.print(table)
+    console.print(f"[blue]All configured outputs in one parallel pass: {single_pass:.3f} seconds[/blue]")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,272 @@
+"""End-to-end pipeline throughput with local stand-ins for inference and Drive
+
+    python -m benchmarks.pipeline_benchmark [--concurrency 1,4,8] [--prompts 12] [--json]
+
+Runs run_batch (generate, near-duplicate check, post-process, upload,
+catalog) on fake InferenceClients and a fake Drive with temporary stores,
+once per concurrency level, and reports images/sec, per-stage
+p50/p95/p99, peak RSS and peak thread count. --output writes the JSON
+report to a file for comparing commits. With --http inference goes over
+the shared connection pool to a local HTTP server, and connection reuse
+is reported too.
+"""
+import argparse
+import contextlib
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.stand_ins import (
+    FakeInferenceClient,
+    FakeDriveBackend,
+    HTTPInferenceClient,
+    StandInHTTPServer,
+    stand_in_pipeline,
+)
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+class ResourceSampler:
+    """Background thread tracking this process's peak RSS and thread count"""
+
+    def __init__(self, interval=0.05):
+        self.interval = interval
+        self.peak_rss = 0
+        self.peak_threads = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="resource-sampler", daemon=True)
+
+    @staticmethod
+    def current_rss():
+        """Resident set size in bytes (Linux /proc, else the peak so far from getrusage)"""
+        try:
+            with open("/proc/self/statm") as f:
+                return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+        except (OSError, ValueError, IndexError):
+            peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            return peak if sys.platform == "darwin" else peak * 1024
+
+    def _sample(self):
+        self.peak_rss = max(self.peak_rss, self.current_rss())
+        self.peak_threads = max(self.peak_threads, threading.active_count())
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self._sample()
+
+    def __enter__(self):
+        self._sample()
+        self._thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._stop.set()
+        self._thread.join()
+        self._sample()
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=PROJECT_ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def fake_models(count, client_options, server=None):
+    """(key, (name, client)) pairs like warm_up_models returns, with unlimited quotas
+
+    With a StandInHTTPServer every model calls it over HTTP instead.
+    """
+    from utils.scheduler import register_model_limits
+
+    models = []
+    for index in range(count):
+        name = f"Fake-{index + 1}"
+        register_model_limits(name, requests_per_minute=10 ** 6, max_in_flight=10 ** 6)
+        if server is not None:
+            client = HTTPInferenceClient(f"{server.url}/models/{name}")
+        else:
+            client = FakeInferenceClient(seed=index, **client_options)
+        models.append((str(index + 1), (name, client)))
+    return models
+
+def run_level(concurrency, prompts, args, work_dir):
+    """Run one batch at a concurrency level and summarise it"""
+    from txt2img import run_batch, iter_jobs
+    from utils.excel_utils import export_product_catalog
+    from utils.http_pool import connection_stats
+    from utils.image_processor import shutdown_postprocess_pool
+    from utils.job_journal import CATALOGUED, DUPLICATE
+    from utils.metrics import metrics
+
+    client_options = {
+        "latency": args.latency,
+        "jitter": args.jitter,
+        "error_rate": args.error_rate,
+        "image_size": (args.image_size, args.image_size),
+    }
+    server = None
+    if args.http:
+        server = StandInHTTPServer(latency=args.latency, error_rate=args.error_rate,
+                                   image_size=client_options["image_size"])
+    drive = FakeDriveBackend(latency=args.upload_latency)
+    metrics.reset()
+    connection_stats.reset()
+    with contextlib.ExitStack() as stack:
+        if server is not None:
+            stack.enter_context(server)
+        models = fake_models(args.models, client_options, server)
+        journal = stack.enter_context(stand_in_pipeline(work_dir, drive))
+        sampler = stack.enter_context(ResourceSampler())
+        start = time.perf_counter()
+        totals = run_batch(iter_jobs(prompts, args.duplicates), models, os.path.join(work_dir, "output"),
+                           journal=journal, streaming=args.streaming, concurrency=concurrency)
+        export_product_catalog(os.path.join(work_dir, "catalog.xlsx"))
+        elapsed = time.perf_counter() - start
+        # Worker processes are only counted in RUSAGE_CHILDREN once they exit
+        shutdown_postprocess_pool()
+        counts = journal.counts()
+
+    snapshot = metrics.snapshot()
+    child_rss = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    child_rss = child_rss if sys.platform == "darwin" else child_rss * 1024
+    images = counts.get(CATALOGUED, 0)
+    result = {
+        "concurrency": concurrency,
+        "jobs": totals["jobs"],
+        "images": images,
+        "duplicates": counts.get(DUPLICATE, 0),
+        "failed": totals["failed"],
+        "seconds": elapsed,
+        "images_per_sec": images / elapsed if elapsed else None,
+        "inference_calls": sum(client.calls for _, (_, client) in models),
+        "uploaded_bytes": drive.uploaded_bytes,
+        "stages": {
+            ".".join([stage["stage"], *stage["labels"].values()]): {
+                key: stage[key] for key in ("count", "mean", "p50", "p95", "p99", "max")
+            }
+            for stage in snapshot["stages"]
+        },
+        "counters": snapshot["counters"],
+        "gauges": snapshot["gauges"],
+        "peak_rss_mb": sampler.peak_rss / 1024 ** 2,
+        # Largest worker process so far; cumulative across levels
+        "peak_worker_rss_mb": child_rss / 1024 ** 2,
+        "peak_threads": sampler.peak_threads,
+    }
+    if server is not None:
+        result["http"] = {
+            "server_connections": server.connections,
+            "server_requests": server.requests,
+            "hosts": connection_stats.snapshot(),
+        }
+    return result
+
+def print_report(report):
+    from rich.console import Console
+    from rich.table import Table
+
+    console = Console()
+    table = Table(title=f"Pipeline throughput ({report['config']['prompts']} prompts × "
+                        f"{report['config']['models']} models, commit {report['commit']})")
+    for column in ("Concurrency", "Images", "Seconds", "Images/s", "Peak RSS (MiB)", "Peak threads"):
+        table.add_column(column, justify="right")
+    for level in report["levels"]:
+        table.add_row(str(level["concurrency"]), str(level["images"]), f"{level['seconds']:.1f}",
+                      f"{level['images_per_sec']:.2f}", f"{level['peak_rss_mb']:.0f}", str(level["peak_threads"]))
+    console.print(table)
+
+    stages = Table(title="Stage latency in seconds (p50 / p95 / p99)")
+    stages.add_column("Stage")
+    for level in report["levels"]:
+        stages.add_column(f"c={level['concurrency']}", justify="right")
+    names = sorted({name for level in report["levels"] for name in level["stages"]})
+    for name in names:
+        cells = []
+        for level in report["levels"]:
+            stage = level["stages"].get(name)
+            cells.append(f"{stage['p50']:.3f} / {stage['p95']:.3f} / {stage['p99']:.3f}" if stage else "-")
+        stages.add_row(name, *cells)
+    console.print(stages)
+
+    for level in report["levels"]:
+        if "http" in level:
+            http = level["http"]
+            reuse = 1 - http["server_connections"] / http["server_requests"] if http["server_requests"] else 0.0
+            console.print(f"c={level['concurrency']}: {http['server_requests']} HTTP requests over "
+                          f"{http['server_connections']} connections ({reuse:.0%} reused)")
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the generation pipeline end to end with local stand-ins')
+    parser.add_argument('--concurrency', type=str, default='1,4,8', help='Comma-separated concurrency levels')
+    parser.add_argument('--prompts', type=int, default=12, help='Prompts per level')
+    parser.add_argument('--duplicates', type=int, default=1, help='Images per prompt and model')
+    parser.add_argument('--models', type=int, default=2, help='Number of fake models')
+    parser.add_argument('--latency', type=float, default=0.5, help='Mean fake inference latency in seconds')
+    parser.add_argument('--jitter', type=float, default=0.2, help='Latency spread as a fraction of the mean')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Fraction of inference calls that fail')
+    parser.add_argument('--image-size', type=int, default=1024, help='Side of the fake generated images in pixels')
+    parser.add_argument('--upload-latency', type=float, default=0.1, help='Seconds per fake Drive upload')
+    parser.add_argument('--streaming', action='store_true', help='Benchmark the in-memory streaming pipeline')
+    parser.add_argument('--http', action='store_true',
+                        help='Serve fake inference from a local HTTP server through the shared connection pool')
+    parser.add_argument('--verbose', action='store_true', help='Show the pipeline\'s own output on stderr')
+    parser.add_argument('--json', action='store_true', help='Print machine-readable results')
+    parser.add_argument('--output', type=str, help='Also write the JSON report to this file')
+    args = parser.parse_args()
+
+    from utils.events import events
+    from utils.http_pool import configure_inference_http
+    from utils.metrics import metrics
+
+    levels = [int(level) for level in args.concurrency.split(",") if level.strip()]
+    config = {key: value for key, value in vars(args).items() if key not in ("json", "output", "verbose")}
+    config["concurrency"] = levels
+    report = {
+        "benchmark": "pipeline",
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "config": config,
+        "levels": [],
+    }
+
+    metrics.enable()
+    if args.http:
+        config["http_backend"] = configure_inference_http()
+    # Events are consumed as in a headless run; --verbose prints them to stderr
+    events.start("plain" if args.verbose else "quiet")
+    # The pipeline reports progress on stdout; keep it out of the results
+    sink = sys.stderr if args.verbose else open(os.devnull, "w")
+    try:
+        for level in levels:
+            prompts = [f"benchmark pattern {index} at concurrency {level}" for index in range(args.prompts)]
+            with tempfile.TemporaryDirectory(prefix="pipeline-benchmark-") as work_dir, \
+                    contextlib.redirect_stdout(sink):
+                report["levels"].append(run_level(level, prompts, args, work_dir))
+            print(f"concurrency {level}: {report['levels'][-1]['images_per_sec']:.2f} images/s", file=sys.stderr)
+    finally:
+        events.stop()
+        metrics.disable()
+        if sink is not sys.stderr:
+            sink.close()
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_report(report)
+
+if __name__ == "__main__":
+    main()
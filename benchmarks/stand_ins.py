@@ -0,0 +1,244 @@
+"""Local stand-ins for the inference API, Google Drive and the on-disk stores
+
+Used by the pipeline benchmark to run the real pipeline end to end without
+network access, credentials or touching the project's own databases.
+"""
+import hashlib
+import io
+import itertools
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from config.settings import GENERATION_TIMEOUT
+
+class FakeHTTPError(Exception):
+    """Server error shaped like the ones the HTTP clients raise"""
+
+    def __init__(self, status_code):
+        super().__init__(f"{status_code} Server Error (stand-in)")
+        self.status_code = status_code
+        self.response = None
+
+def pattern_image(prompt, image_size):
+    """Smooth pattern seeded by the prompt, so different prompts are not near-duplicates"""
+    import numpy as np
+    from PIL import Image
+
+    seed = int.from_bytes(hashlib.sha256(prompt.encode("utf-8")).digest()[:4], "big")
+    noise = np.random.default_rng(seed).integers(0, 256, (8, 8, 3), dtype=np.uint8)
+    return Image.fromarray(noise, "RGB").resize(image_size, Image.BICUBIC)
+
+class FakeInferenceClient:
+    """InferenceClient stand-in with configurable latency, error rate and image size
+
+    Latency is drawn around latency with ±jitter (as a fraction); failures
+    raise a 500 so the real retry policy and circuit breaker are exercised.
+    Images are a smooth pattern seeded by the prompt, so different prompts
+    give images that are not near-duplicates of each other.
+    """
+
+    def __init__(self, latency=0.5, jitter=0.2, error_rate=0.0, image_size=(1024, 1024),
+                 timeout=GENERATION_TIMEOUT, seed=0):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.image_size = image_size
+        self.timeout = timeout
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.calls = 0
+
+    def _draw(self):
+        with self._lock:
+            self.calls += 1
+            delay = self.latency * (1 + self._random.uniform(-self.jitter, self.jitter))
+            failed = self._random.random() < self.error_rate
+        return max(0.0, delay), failed
+
+    def text_to_image(self, prompt):
+        delay, failed = self._draw()
+        time.sleep(delay)
+        if failed:
+            raise FakeHTTPError(500)
+        return pattern_image(prompt, self.image_size)
+
+class _StandInHandler(BaseHTTPRequestHandler):
+    # HTTP/1.1 so clients keep the connection open between requests
+    protocol_version = "HTTP/1.1"
+
+    def setup(self):
+        super().setup()
+        self.server.stand_in.connection_opened()
+
+    def do_POST(self):
+        import json
+
+        body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        try:
+            prompt = json.loads(body or b"{}").get("inputs", "")
+        except ValueError:
+            prompt = ""
+        self._answer(prompt)
+
+    def do_GET(self):
+        self._answer(self.path)
+
+    def _answer(self, prompt):
+        status, payload, content_type = self.server.stand_in.respond(prompt)
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass
+
+class StandInHTTPServer:
+    """Keep-alive HTTP server on 127.0.0.1 answering inference requests with PNGs
+
+    POST {"inputs": prompt} (or any GET) returns a pattern image after
+    latency seconds, or a 500 for error_rate of requests. Counts the TCP
+    connections and requests it served so connection reuse can be checked.
+
+        with StandInHTTPServer(latency=0.2) as server:
+            client = HTTPInferenceClient(server.url)
+    """
+
+    def __init__(self, latency=0.0, error_rate=0.0, image_size=(256, 256), seed=0):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.image_size = image_size
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.connections = 0
+        self.requests = 0
+        self._server = None
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def connection_opened(self):
+        with self._lock:
+            self.connections += 1
+
+    def respond(self, prompt):
+        with self._lock:
+            self.requests += 1
+            failed = self._random.random() < self.error_rate
+        time.sleep(self.latency)
+        if failed:
+            return 500, b'{"error": "stand-in failure"}', "application/json"
+        buffer = io.BytesIO()
+        pattern_image(prompt, self.image_size).save(buffer, format="PNG", compress_level=1)
+        return 200, buffer.getvalue(), "image/png"
+
+    def __enter__(self):
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), _StandInHandler)
+        self._server.daemon_threads = True
+        self._server.stand_in = self
+        self._thread = threading.Thread(target=self._server.serve_forever, name="stand-in-http", daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._server.shutdown()
+        self._server.server_close()
+        self._thread.join()
+
+class HTTPInferenceClient:
+    """InferenceClient stand-in that calls a StandInHTTPServer
+
+    Requests go through huggingface_hub's shared session, so they use the
+    same pooled connections (see utils.http_pool) as real InferenceClients.
+    """
+
+    def __init__(self, url, timeout=GENERATION_TIMEOUT):
+        self.url = url
+        self.timeout = timeout
+        self.calls = 0
+
+    def text_to_image(self, prompt):
+        from PIL import Image
+        from huggingface_hub.utils import get_session
+
+        self.calls += 1
+        response = get_session().post(self.url, json={"inputs": prompt}, timeout=self.timeout)
+        if response.status_code >= 400:
+            raise FakeHTTPError(response.status_code)
+        image = Image.open(io.BytesIO(response.content))
+        image.load()
+        return image
+
+class FakeDrive:
+    """Placeholder for the authenticated GoogleDrive object; uploads go through FakeDriveBackend"""
+
+class FakeDriveBackend:
+    """Upload backend stand-in: reads the whole stream, waits, and returns a fake link
+
+    Upload time is latency plus size / bandwidth (bytes per second, None
+    for unlimited); sharing a batch takes share_latency.
+    """
+
+    def __init__(self, latency=0.1, bandwidth=None, share_latency=0.05):
+        self.latency = latency
+        self.bandwidth = bandwidth
+        self.share_latency = share_latency
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self.uploaded_bytes = 0
+
+    def upload(self, stream, title, mime_type):
+        size = len(stream.read())
+        time.sleep(self.latency + (size / self.bandwidth if self.bandwidth else 0.0))
+        with self._lock:
+            file_id = f"fake-{next(self._ids)}"
+            self.uploaded_bytes += size
+        return file_id, f"https://drive.example.invalid/file/d/{file_id}/view"
+
+    def share(self, file_ids):
+        time.sleep(self.share_latency)
+        return {}
+
+@contextmanager
+def stand_in_pipeline(work_dir, drive_backend=None):
+    """Point Drive, the catalog and the caches at stand-ins under work_dir
+
+    Yields a JobJournal in work_dir for run_batch. Everything is restored
+    when the block exits.
+    """
+    from utils.drive_utils import set_google_drive_instance, set_upload_pool
+    from utils.excel_utils import set_catalog_store
+    from utils.generation_cache import GenerationCache, set_generation_cache
+    from utils.catalog_store import CatalogStore
+    from utils.job_journal import JobJournal
+    from utils.phash_index import PerceptualHashIndex, set_phash_index
+    from utils.upload_pool import UploadPool, UploadIndex
+
+    os.makedirs(work_dir, exist_ok=True)
+    catalog = CatalogStore(os.path.join(work_dir, "catalog.db"))
+    phash_index = PerceptualHashIndex(os.path.join(work_dir, "phash_index.db"))
+    cache = GenerationCache(os.path.join(work_dir, "generation_cache"))
+    previous_catalog = set_catalog_store(catalog)
+    previous_phash_index = set_phash_index(phash_index)
+    previous_cache = set_generation_cache(cache)
+    set_google_drive_instance(FakeDrive())
+    set_upload_pool(UploadPool(drive_backend or FakeDriveBackend(),
+                               index=UploadIndex(os.path.join(work_dir, "upload_index.db"))))
+    try:
+        yield JobJournal(os.path.join(work_dir, "job_journal.db"))
+    finally:
+        set_google_drive_instance(None)
+        set_catalog_store(previous_catalog)
+        set_phash_index(previous_phash_index)
+        set_generation_cache(previous_cache)
+        catalog.close()
+        phash_index.close()
+        cache.close()
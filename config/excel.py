@@ -1,33 +1,97 @@
-import openpyxl
 import logging
-from .settings import INPUT_EXCEL_FILE
+import os
+from functools import lru_cache
 
-def read_prompts_from_excel(file_path=INPUT_EXCEL_FILE):
+from .settings import INPUT_EXCEL_FILE, PROMPT_CACHE_SIZE
+
+REQUIRED_COLUMNS = ("Prompts", "Theme", "Category", "Product Type")
+
+def _as_filter(values):
+    """Normalise a selection to a hashable frozenset, or None for no filtering"""
+    if values is None:
+        return None
+    if isinstance(values, (str, int)):
+        values = [values]
+    return frozenset(values)
+
+def iter_prompt_rows(file_path=INPUT_EXCEL_FILE, rows=None, themes=None, categories=None):
     """
-    Read prompts, Product Type, Category, and Theme from the specified Excel file.
+    Lazily yield prompt rows from an Excel file opened in read-only mode.
+
+    Args:
+        file_path (str): Workbook to read
+        rows (range or iterable of int): Sheet row numbers to include; a range
+            only reads that slice of the sheet
+        themes (str or iterable): Only include rows with one of these themes
+        categories (str or iterable): Only include rows in one of these categories
     """
+    import openpyxl
+
+    rows = rows if isinstance(rows, range) else _as_filter(rows)
+    themes = _as_filter(themes)
+    categories = _as_filter(categories)
+
+    workbook = openpyxl.load_workbook(file_path, read_only=True, data_only=True)
     try:
-        workbook = openpyxl.load_workbook(file_path)
         sheet = workbook.active
-        headers = [cell.value for cell in sheet[1]]
+        headers = [cell.value for cell in next(sheet.iter_rows(min_row=1, max_row=1))]
+        prompts_index, theme_index, category_index, product_type_index = (
+            headers.index(column) for column in REQUIRED_COLUMNS
+        )
 
-        prompts_index = headers.index("Prompts")
-        theme_index = headers.index("Theme")
-        category_index = headers.index("Category")
-        product_type_index = headers.index("Product Type")
+        min_row, max_row = 2, None
+        if rows is not None:
+            if not rows:
+                return
+            min_row, max_row = max(2, min(rows)), max(rows)
 
-        data = []
-        for row in sheet.iter_rows(min_row=2, values_only=True):
+        for row_number, row in enumerate(sheet.iter_rows(min_row=min_row, max_row=max_row, values_only=True),
+                                         start=min_row):
+            if rows is not None and row_number not in rows:
+                continue
+            # Filters are checked before the prompt cell is split
+            if themes is not None and row[theme_index] not in themes:
+                continue
+            if categories is not None and row[category_index] not in categories:
+                continue
             if row[prompts_index]:
-                prompts = [line.strip() for line in row[prompts_index].splitlines() if line.strip()]
-                data.append({
+                prompts = [line.strip() for line in str(row[prompts_index]).splitlines() if line.strip()]
+                yield {
                     "Prompts": prompts,
                     "Theme": row[theme_index],
                     "Category": row[category_index],
                     "Product Type": row[product_type_index],
                     "Row Index": row[0]
-                })
-        return data
+                }
+    finally:
+        workbook.close()
+
+@lru_cache(maxsize=PROMPT_CACHE_SIZE)
+def _read_prompts_cached(file_path, mtime_ns, size, rows, themes, categories):
+    # mtime_ns and size are only part of the cache key: an edited file misses the cache
+    return tuple(iter_prompt_rows(file_path, rows=rows, themes=themes, categories=categories))
+
+def read_prompts_from_excel(file_path=INPUT_EXCEL_FILE, rows=None, themes=None, categories=None):
+    """
+    Read prompts, Product Type, Category, and Theme from the specified Excel file.
+
+    Results are cached by path, modification time and size, so reading an
+    unchanged file again costs a stat call. Rows, themes and categories
+    select a subset as in iter_prompt_rows. Each call gets its own copies
+    of the rows, so callers may modify them without changing the cache.
+    """
+    try:
+        stat = os.stat(file_path)
+        rows = rows if isinstance(rows, range) else _as_filter(rows)
+        cached = _read_prompts_cached(
+            os.path.abspath(file_path),
+            stat.st_mtime_ns,
+            stat.st_size,
+            rows,
+            _as_filter(themes),
+            _as_filter(categories),
+        )
+        return [{**row, "Prompts": list(row["Prompts"])} for row in cached]
     except Exception as e:
         logging.error(f"Error reading Excel file: {e}")
-        return [] 
\ No newline at end of file
+        return []
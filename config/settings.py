@@ -1,11 +1,196 @@
 import os
 
 # change this to the folder where the excel file is located
-DOWNLOADS_FOLDER = '/Users/mac/Downloads/'
+DOWNLOADS_FOLDER = os.environ.get("DOWNLOADS_FOLDER", '/Users/mac/Downloads/')
 # Excel Settings
-INPUT_EXCEL_FILE = os.path.join(DOWNLOADS_FOLDER, "template (4).xlsx")
+INPUT_EXCEL_FILE = os.environ.get("INPUT_EXCEL_FILE", os.path.join(DOWNLOADS_FOLDER, "template (4).xlsx"))
+PROMPT_CACHE_SIZE = 16
 
 # Image Processing Settings
 IMAGE_OUTPUT_SIZE = (3600, 3600)
 IMAGE_DPI = (300, 300)
-SUPPORTED_IMAGE_FORMATS = ('.png', '.jpg', '.jpeg')
\ No newline at end of file
+SUPPORTED_IMAGE_FORMATS = ('.png', '.jpg', '.jpeg')
+
+# Output Encoding Settings
+# Every processed image is encoded once per entry, all from the same resized
+# image. The first entry is the main deliverable that gets uploaded and
+# catalogued. "size" fits the output inside that box (default: full size),
+# "suffix" is appended to the file name and "tile" repeats the image. PNG
+# compress_level 3 encodes about 2.5x faster than Pillow's default 6 for ~20%
+# larger files; see benchmarks/encode_benchmark.py.
+PROCESSED_OUTPUTS = {
+    "full": {"format": "PNG", "compress_level": 3, "optimize": False, "dpi": IMAGE_DPI, "suffix": ""},
+    "preview": {"format": "JPEG", "quality": 85, "optimize": True, "size": (1200, 1200), "dpi": IMAGE_DPI,
+                "suffix": "_preview"},
+    "thumbnail": {"format": "WEBP", "quality": 80, "size": (400, 400), "suffix": "_thumb"},
+    # 2×2 repeat of a small copy to check the pattern tiles; remove to skip it
+    "tile_preview": {"format": "JPEG", "quality": 85, "size": (900, 900), "tile": 2, "suffix": "_tile_preview"},
+}
+
+# Seamless Tiling Settings
+# Processed images scoring below SEAMLESS_MIN_SCORE (0-1 edge continuity) are
+# repaired by blending SEAMLESS_BLEND_WIDTH of each edge with the opposite side.
+SEAMLESS_REPAIR = True
+SEAMLESS_MIN_SCORE = 0.85
+SEAMLESS_BLEND_WIDTH = 0.08
+SEAMLESS_SCORE_BAND = 8
+
+# Near-Duplicate Settings
+# Generated images within NEAR_DUPLICATE_MAX_DISTANCE bits (of 64) of an earlier
+# one are skipped before post-processing and upload, or only flagged.
+NEAR_DUPLICATE_ACTION = "skip"  # "skip", "flag" or None to turn the check off
+NEAR_DUPLICATE_MAX_DISTANCE = 6
+
+# Generation Cache Settings
+# Generated images are cached by (model ID, final prompt, seed) so re-running a
+# sheet needs no inference calls; least recently used entries are evicted past
+# GENERATION_CACHE_MAX_BYTES (0 turns the cache off).
+GENERATION_CACHE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ".generation_cache")
+GENERATION_CACHE_MAX_BYTES = 5 * 1024 ** 3
+# Seeds are derived from (prompt, model) and offset by the duplicate index
+SEED_RANGE = 1000000
+
+# Database Settings
+# SQLite files for the job journal, catalog, upload index and near-duplicate
+# index; point them at a shared mount along with WORK_QUEUE_PATH when workers
+# run on several hosts. WAL needs every process on one host, so on a network
+# mount set DATABASE_JOURNAL_MODE = "DELETE"; every database uses it.
+DATABASE_JOURNAL_MODE = os.environ.get("DATABASE_JOURNAL_MODE", "WAL")
+JOB_JOURNAL_PATH = os.environ.get(
+    "JOB_JOURNAL_PATH",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "job_journal.db"),
+)
+CATALOG_DB_PATH = os.environ.get(
+    "CATALOG_DB_PATH",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "product_catalog.db"),
+)
+UPLOAD_INDEX_PATH = os.environ.get(
+    "UPLOAD_INDEX_PATH",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "upload_index.db"),
+)
+PHASH_INDEX_PATH = os.environ.get(
+    "PHASH_INDEX_PATH",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "phash_index.db"),
+)
+
+# Worker Queue Settings
+# Producer and worker processes share WORK_QUEUE_PATH, on a network mount
+# for workers on several hosts (see DATABASE_JOURNAL_MODE).
+WORK_QUEUE_PATH = os.environ.get(
+    "WORK_QUEUE_PATH",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "work_queue.db"),
+)
+WORK_QUEUE_JOURNAL_MODE = os.environ.get("WORK_QUEUE_JOURNAL_MODE", DATABASE_JOURNAL_MODE)
+LEASE_SECONDS = 10 * 60
+HEARTBEAT_INTERVAL = 60
+MAX_JOB_ATTEMPTS = 3
+WORKER_POLL_INTERVAL = 5
+
+# Routing Settings
+# Latency and success rate are tracked over the last ROUTING_WINDOW calls per
+# model. A hedged request waits for the model's p95 (HEDGE_DELAY until
+# ROUTING_MIN_SAMPLES calls were seen) before starting the next-fastest one.
+ROUTING_WINDOW = 100
+ROUTING_MIN_SAMPLES = 5
+HEDGE_DELAY = 45
+HEDGE_MIN_DELAY = 5
+HEDGE_MAX_EXTRA = 1
+HEDGE_WORKERS = 16
+# Model keys each model may be hedged with; models not listed use any other
+HEDGE_EQUIVALENTS = {}
+
+# Metrics Settings
+# Per-stage timings, retry counts and sampled queue depths, exported to
+# metrics.json and metrics.prom in METRICS_DIR at the end of a run.
+# Off by default; --metrics turns them on for one run.
+METRICS_ENABLED = os.environ.get("METRICS_ENABLED", "") == "1"
+METRICS_DIR = os.environ.get(
+    "METRICS_DIR",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "metrics"),
+)
+METRICS_SAMPLE_INTERVAL = 1.0
+# Histogram bucket bounds in seconds
+METRICS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+# Event Settings
+# Pipeline stages report to one renderer thread. "live" redraws per-model
+# counters during a batch, "plain" prints warnings, errors and a summary line
+# every EVENT_SUMMARY_INTERVAL seconds, "quiet" prints nothing; "auto" is live
+# on a terminal. EVENT_LOG_PATH (or --event-log) records every event as JSON lines.
+EVENT_DISPLAY = os.environ.get("EVENT_DISPLAY", "auto")
+EVENT_LOG_PATH = os.environ.get("EVENT_LOG_PATH")
+EVENT_RENDER_INTERVAL = 0.5
+EVENT_SUMMARY_INTERVAL = 10
+
+# Raw images are saved as generated, before any processing
+RAW_OUTPUT = {"format": "PNG", "compress_level": 3, "optimize": False}
+ENCODE_THREADS = 3
+
+# Scheduler Settings
+MAX_CONCURRENT_JOBS = 8
+MAX_QUEUED_JOBS = 32
+DEFAULT_REQUESTS_PER_MINUTE = 30
+DEFAULT_MAX_IN_FLIGHT = 2
+
+# Async Engine Settings
+ASYNC_MAX_CONCURRENCY = 256
+ASYNC_EXECUTOR_WORKERS = 4
+
+# Post-processing Settings
+POSTPROCESS_WORKERS = os.cpu_count() or 1
+POSTPROCESS_MAX_QUEUED = 2 * POSTPROCESS_WORKERS
+
+# Streaming Pipeline Settings
+BACKGROUND_WRITER_WORKERS = 2
+
+# Inference Settings (seconds, enforced by the HTTP transport)
+GENERATION_TIMEOUT = 120
+WARM_UP_REQUEST_TIMEOUT = 2
+
+# HTTP Connection Settings
+# Every InferenceClient shares one keep-alive pool (HTTP/2 when the h2
+# package is installed) and Drive calls share a pool of httplib2 connections.
+# HTTP_HOST_LIMITS caps concurrent requests per host; other hosts get
+# HTTP_MAX_PER_HOST. Connection reuse is reported every HTTP_STATS_INTERVAL
+# seconds while requests are being made and at the end of each batch.
+HTTP_MAX_CONNECTIONS = 64
+HTTP_MAX_KEEPALIVE = 32
+HTTP_KEEPALIVE_EXPIRY = 60  # seconds an idle connection is kept open
+HTTP_MAX_PER_HOST = 16
+HTTP_HOST_LIMITS = {
+    # One connection per upload worker plus one for permission batches
+    "www.googleapis.com": 5,
+}
+HTTP2_ENABLED = os.environ.get("HTTP2_ENABLED", "1") != "0"
+HTTP_STATS_INTERVAL = 60
+
+# Retry Settings
+RETRY_MAX_ATTEMPTS = 6
+RETRY_BASE_DELAY = 2
+RETRY_MAX_DELAY = 60
+CIRCUIT_FAILURE_THRESHOLD = 5
+CIRCUIT_RESET_TIMEOUT = 60
+MAX_COOL_DOWN_WAIT = 120
+
+# Warm-up Settings
+MODEL_READINESS_TTL = 15 * 60  # seconds a successful warm-up is trusted across runs
+WARM_UP_IN_BACKGROUND = True
+
+# Drive Credentials Settings
+# Sign-in saved by the first interactive run, refreshed as needed; headless
+# runs (--input, --worker) never open a browser, so they need this file or a
+# service account key (JSON) shared with the target Drive folder.
+DRIVE_CREDENTIALS_FILE = os.environ.get(
+    "DRIVE_CREDENTIALS_FILE",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "drive_credentials.json"),
+)
+DRIVE_SERVICE_ACCOUNT_FILE = os.environ.get("DRIVE_SERVICE_ACCOUNT_FILE")
+
+# Drive Upload Settings
+UPLOAD_WORKERS = 4
+UPLOAD_MAX_QUEUED = 16
+UPLOAD_CHUNK_SIZE = 8 * 1024 * 1024  # bytes per resumable upload chunk
+UPLOAD_CHUNK_RETRIES = 5
+PERMISSION_BATCH_SIZE = 50
+PERMISSION_BATCH_WAIT = 0.5  # seconds to collect permission changes into one batch
+UPLOAD_WAIT_TIMEOUT = 15 * 60  # seconds a job waits for its upload before giving up on it
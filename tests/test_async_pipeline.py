@@ -0,0 +1,72 @@
+import asyncio
+from concurrent.futures import Future
+
+import pytest
+
+from benchmarks.stand_ins import FakeDriveBackend, FakeHTTPError, pattern_image, stand_in_pipeline
+from utils import async_pipeline
+from utils.async_pipeline import run_async_pipeline
+from utils.image_processor import shutdown_postprocess_pool
+from utils.job_journal import CATALOGUED, GENERATED
+from utils.retry_policy import default_retry_policy
+from utils.scheduler import register_model_limits
+
+
+class FakeAsyncClient:
+    """AsyncInferenceClient stand-in that fails its first failures calls with a 500"""
+
+    def __init__(self, failures=0):
+        self.failures = failures
+        self.timeout = 5
+        self.calls = 0
+
+    async def text_to_image(self, prompt):
+        self.calls += 1
+        await asyncio.sleep(0)
+        if self.calls <= self.failures:
+            raise FakeHTTPError(500)
+        return pattern_image(prompt, (64, 64))
+
+
+@pytest.fixture
+def journal(tmp_path, monkeypatch):
+    # Retry straight away instead of backing off for seconds
+    monkeypatch.setattr(default_retry_policy, "_backoff", lambda retry_state: 0)
+    with stand_in_pipeline(str(tmp_path / "stores"), FakeDriveBackend(latency=0, share_latency=0)) as journal:
+        yield journal
+    shutdown_postprocess_pool()
+
+
+def run(prompts, model_name, client, output_dir, journal):
+    register_model_limits(model_name, requests_per_minute=60000, max_in_flight=4)
+    return asyncio.run(run_async_pipeline(prompts, [("1", (model_name, client))], str(output_dir), journal=journal))
+
+
+def test_jobs_run_through_every_stage(tmp_path, journal):
+    client = FakeAsyncClient()
+    assert run(["red", "green", "blue"], "Async-ok", client, tmp_path / "out", journal) == 3
+    assert client.calls == 3
+    assert journal.counts() == {CATALOGUED: 3}
+
+
+def test_failed_request_is_retried(tmp_path, journal):
+    client = FakeAsyncClient(failures=1)
+    assert run(["retry me"], "Async-retry", client, tmp_path / "out", journal) == 1
+    assert client.calls == 2
+    assert journal.counts() == {CATALOGUED: 1}
+
+
+def test_processing_failure_fails_the_job(tmp_path, journal, monkeypatch):
+    class BrokenPool:
+        def submit(self, input_path, output_path):
+            future = Future()
+            future.set_exception(RuntimeError("worker died"))
+            return future
+
+    monkeypatch.setattr(async_pipeline, "get_postprocess_pool", lambda: BrokenPool())
+    uploads = []
+    monkeypatch.setattr(async_pipeline, "submit_upload", uploads.append)
+    assert run(["doomed"], "Async-broken", FakeAsyncClient(), tmp_path / "out", journal) == 0
+    # Nothing is uploaded and the job stays generated, so --resume can process it again
+    assert uploads == []
+    assert journal.counts() == {GENERATED: 1}
@@ -0,0 +1,75 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from benchmarks.stand_ins import StandInHTTPServer, HTTPInferenceClient
+from utils.http_pool import ConnectionStats, HttpObjectPool, make_httpx_client_factories, make_requests_session
+
+
+@pytest.fixture
+def server():
+    with StandInHTTPServer(image_size=(16, 16)) as server:
+        yield server
+
+
+@pytest.fixture
+def stats():
+    return ConnectionStats(interval=0)
+
+
+def hf_http():
+    """huggingface_hub's HTTP module and the httpx package it was built on"""
+    _http = pytest.importorskip("huggingface_hub.utils._http")
+    if not hasattr(_http, "set_client_factory"):
+        pytest.skip("huggingface_hub < 1.0 uses requests sessions")
+    return _http, getattr(_http, "httpx2", None) or _http.httpx
+
+
+def test_inference_clients_share_one_keep_alive_connection(server, stats):
+    _http, httpx = hf_http()
+    client_factory, _ = make_httpx_client_factories(httpx, stats=stats)
+    _http.set_client_factory(client_factory)
+    try:
+        for client in (HTTPInferenceClient(server.url), HTTPInferenceClient(server.url)):
+            for i in range(3):
+                client.text_to_image(f"prompt {i}")
+    finally:
+        _http.set_client_factory(_http.default_client_factory)
+    assert server.requests == 6
+    assert server.connections == 1
+    host = stats.snapshot()["127.0.0.1"]
+    assert (host["requests"], host["connections"], host["reused"]) == (6, 1, 5)
+
+
+def test_requests_session_reuses_its_connection(server, stats):
+    session = make_requests_session(stats=stats)
+    try:
+        for i in range(4):
+            assert session.post(server.url, json={"inputs": str(i)}).status_code == 200
+    finally:
+        session.close()
+    assert server.connections == 1
+    assert stats.snapshot()["127.0.0.1"]["reused"] == 3
+
+
+def test_http_object_pool_hands_back_open_connections(server, stats):
+    httplib2 = pytest.importorskip("httplib2")
+    pool = HttpObjectPool(httplib2.Http, size=2, stats=stats)
+
+    def fetch(i):
+        with pool.connection() as http:
+            response, _ = http.request(f"{server.url}/{i}")
+        return response.status
+
+    try:
+        assert [fetch(i) for i in range(3)] == [200] * 3
+        assert server.connections == 1
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            assert list(executor.map(fetch, range(12))) == [200] * 12
+    finally:
+        pool.close()
+    # The pool never holds more than size connections to the host
+    assert server.connections <= 2
+    host = stats.snapshot()["127.0.0.1"]
+    assert host["requests"] == 15
+    assert host["connections"] == server.connections
@@ -0,0 +1,96 @@
+import pytest
+
+from benchmarks.stand_ins import FakeDriveBackend
+from utils.upload_pool import UploadPool, UploadIndex, content_hash
+
+
+@pytest.fixture
+def index(tmp_path):
+    return UploadIndex(str(tmp_path / "upload_index.db"))
+
+
+def make_pool(backend, index):
+    return UploadPool(backend, index=index, max_workers=4, max_queued=4, batch_wait=0.01)
+
+
+def test_identical_uploads_in_flight_share_one_upload(index):
+    backend = FakeDriveBackend(latency=0.3, share_latency=0)
+    pool = make_pool(backend, index)
+    data = b"same image bytes"
+    try:
+        first = pool.submit(data=data, title="a.png")
+        second = pool.submit(data=data, title="b.png")
+        link = first.result(timeout=5)
+        assert second.result(timeout=5) == link
+    finally:
+        pool.shutdown()
+    assert pool.uploaded == 1
+    assert pool.skipped == 1
+    assert backend.uploaded_bytes == len(data)
+
+
+def test_different_content_is_uploaded_separately(index):
+    backend = FakeDriveBackend(latency=0, share_latency=0)
+    pool = make_pool(backend, index)
+    try:
+        links = {pool.submit(data=data, title="x.png").result(timeout=5) for data in (b"one", b"two")}
+    finally:
+        pool.shutdown()
+    assert len(links) == 2
+    assert pool.uploaded == 2
+    assert pool.skipped == 0
+
+
+def test_content_uploaded_by_an_earlier_run_is_not_uploaded_again(tmp_path, index):
+    data = b"already on drive"
+    pool = make_pool(FakeDriveBackend(latency=0, share_latency=0), index)
+    try:
+        link = pool.submit(data=data, title="first.png").result(timeout=5)
+    finally:
+        pool.shutdown()
+    assert index.get(content_hash(data=data)) == link
+
+    # A file with the same bytes hashes the same as the buffer
+    path = tmp_path / "second.png"
+    path.write_bytes(data)
+    backend = FakeDriveBackend(latency=0, share_latency=0)
+    pool = make_pool(backend, UploadIndex(index.db_path))
+    try:
+        assert pool.submit(path=str(path)).result(timeout=5) == link
+    finally:
+        pool.shutdown()
+    assert pool.uploaded == 0
+    assert pool.skipped == 1
+    assert backend.uploaded_bytes == 0
+
+
+def test_upload_failure_reaches_every_waiter(index):
+    class FailingBackend(FakeDriveBackend):
+        def upload(self, stream, title, mime_type):
+            super().upload(stream, title, mime_type)
+            raise OSError("connection reset")
+
+    pool = make_pool(FailingBackend(latency=0.2, share_latency=0), index)
+    try:
+        futures = [pool.submit(data=b"doomed", title=f"{i}.png") for i in range(2)]
+        for future in futures:
+            with pytest.raises(OSError):
+                future.result(timeout=5)
+    finally:
+        pool.shutdown()
+    assert index.get(content_hash(data=b"doomed")) is None
+
+
+def test_index_write_failure_still_returns_the_link(index):
+    class BrokenIndex(UploadIndex):
+        def put(self, key, file_id, link, title):
+            raise OSError("disk full")
+
+    pool = make_pool(FakeDriveBackend(latency=0, share_latency=0), BrokenIndex(index.db_path))
+    try:
+        first = pool.submit(data=b"first", title="first.png").result(timeout=5)
+        # The share thread keeps running for later uploads
+        second = pool.submit(data=b"second", title="second.png").result(timeout=5)
+    finally:
+        pool.shutdown()
+    assert first and second and first != second
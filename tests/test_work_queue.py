@@ -0,0 +1,96 @@
+import time
+
+import pytest
+
+from utils.work_queue import WorkQueue, QUEUED, LEASED, DONE, FAILED
+
+
+@pytest.fixture
+def make_queue(tmp_path):
+    def make(**options):
+        return WorkQueue(str(tmp_path / "work_queue.db"), **options)
+    return make
+
+
+def test_enqueue_ignores_jobs_already_queued(make_queue):
+    queue = make_queue()
+    assert queue.enqueue([("a", 0, "1"), ("a", 1, "1"), ("b", 0, "2")]) == 3
+    assert queue.enqueue([("a", 0, "1"), ("c", 0, "1")]) == 1
+    assert queue.counts() == {QUEUED: 4}
+
+
+def test_claim_leases_jobs_oldest_first_once_each(make_queue):
+    queue = make_queue()
+    queue.enqueue([("a", 0, "1"), ("b", 0, "1")])
+    first = queue.claim("worker-1")
+    second = queue.claim("worker-2")
+    assert (first["prompt"], second["prompt"]) == ("a", "b")
+    assert first["attempts"] == 1
+    assert queue.claim("worker-3") is None
+    assert queue.counts() == {LEASED: 2}
+    assert queue.complete(first["id"], "worker-1")
+    assert queue.counts() == {LEASED: 1, DONE: 1}
+
+
+def test_expired_lease_is_claimed_again(make_queue):
+    queue = make_queue(lease_seconds=0.05)
+    queue.enqueue([("a", 0, "1")])
+    job = queue.claim("worker-1")
+    assert queue.claim("worker-2") is None
+    time.sleep(0.1)
+    retried = queue.claim("worker-2")
+    assert retried["id"] == job["id"]
+    assert retried["attempts"] == 2
+    # The worker that lost the lease can no longer finish the job
+    assert not queue.complete(job["id"], "worker-1")
+    assert queue.complete(job["id"], "worker-2")
+
+
+def test_heartbeat_keeps_a_lease(make_queue):
+    queue = make_queue(lease_seconds=0.2)
+    queue.enqueue([("a", 0, "1")])
+    job = queue.claim("worker-1")
+    for _ in range(3):
+        time.sleep(0.1)
+        assert queue.heartbeat([job["id"]], "worker-1") == {job["id"]}
+    assert queue.claim("worker-2") is None
+    assert queue.heartbeat([job["id"]], "worker-2") == set()
+
+
+def test_job_fails_once_expired_leases_use_up_its_attempts(make_queue):
+    queue = make_queue(lease_seconds=0.05, max_attempts=2)
+    queue.enqueue([("a", 0, "1")])
+    for attempt in range(2):
+        assert queue.claim(f"worker-{attempt}") is not None
+        time.sleep(0.1)
+    assert queue.claim("worker-3") is None
+    assert queue.counts() == {FAILED: 1}
+
+
+def test_fail_requeues_until_attempts_run_out(make_queue):
+    queue = make_queue(max_attempts=2)
+    queue.enqueue([("a", 0, "1")])
+    job = queue.claim("worker-1")
+    assert queue.fail(job["id"], "worker-1", "boom")
+    assert queue.counts() == {QUEUED: 1}
+    job = queue.claim("worker-1")
+    assert queue.fail(job["id"], "worker-1", "boom")
+    assert queue.counts() == {FAILED: 1}
+
+
+def test_fail_without_retry_fails_at_once(make_queue):
+    queue = make_queue()
+    queue.enqueue([("a", 0, "9")])
+    job = queue.claim("worker-1")
+    assert queue.fail(job["id"], "worker-1", "Unknown model: 9", retry=False)
+    assert queue.counts() == {FAILED: 1}
+    assert queue.claim("worker-1") is None
+
+
+def test_queue_works_without_wal_for_shared_mounts(make_queue):
+    queue = make_queue(journal_mode="DELETE")
+    queue.enqueue([("a", 0, "1")])
+    job = queue.claim("worker-1")
+    assert queue.complete(job["id"], "worker-1")
+    mode = queue._conn().execute("PRAGMA journal_mode").fetchone()[0]
+    assert mode.upper() == "DELETE"
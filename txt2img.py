@@ -1,102 +1,632 @@
+import time
+STARTUP_BEGAN = time.perf_counter()
+
 import argparse
-from datetime import datetime
+import contextlib
 import os
-import time
+import threading
 
 from rich.console import Console
 from rich.panel import Panel
-from rich.progress import Progress, SpinnerColumn, TextColumn, TimeElapsedColumn
 from rich.prompt import Prompt
-from concurrent.futures import ThreadPoolExecutor, as_completed
 
-from utils.model_utils import load_environment, warm_up_models
-from utils.generation_utils import generate_single_image
-from utils.drive_utils import init_google_drive, upload_file_to_drive, get_drive_instance
-from utils.excel_utils import update_product_catalog
-from utils.image_processor import process_images
+from utils.model_utils import MODEL_TABLE, load_environment, warm_up_models
+from utils.generation_utils import (
+    generate_single_image,
+    generate_image,
+    encode_generated,
+    save_generated,
+    request_tracker,
+)
+from utils.routing import hedge_candidates, hedged_generate
+from utils.drive_utils import init_google_drive, submit_upload, collect_upload, get_drive_instance, shutdown_upload_pool
+from utils.excel_utils import update_product_catalog, export_product_catalog, shutdown_catalog_store
+from utils.image_processor import (
+    process_image_files,
+    get_postprocess_pool,
+    shutdown_postprocess_pool,
+    record_process_metrics,
+    output_paths,
+    primary_output_path,
+)
+from utils.streaming import write_in_background, shutdown_background_writer
+from utils.scheduler import JobScheduler
+from utils.metrics import metrics
+from utils.events import events, QUEUED, STARTED, DONE, FAILED, SKIPPED
+from utils.http_pool import connection_stats
+from utils.paths import make_output_dirs, new_job_id, image_filename
+from utils.job_journal import (
+    JobJournal,
+    job_key,
+    STATES,
+    PENDING,
+    GENERATED,
+    PROCESSED,
+    UPLOADED,
+    CATALOGUED,
+    DUPLICATE,
+    mark_job,
+)
+from utils.phash_index import skip_near_duplicate
+from utils.work_queue import WorkQueue, LeaseKeeper, worker_id
+from utils.prompt_sources import iter_prompts
 from config.excel import read_prompts_from_excel
+from config.settings import (
+    MAX_CONCURRENT_JOBS,
+    INPUT_EXCEL_FILE,
+    WORKER_POLL_INTERVAL,
+    METRICS_DIR,
+    EVENT_DISPLAY,
+    EVENT_LOG_PATH,
+)
 
 console = Console()
 
-def process_single_prompt(prompt, models, output_dir, progress):
-    """Process a single prompt with the selected models"""
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    start_time = time.time()
+def _mark_when_written(write_future, journal, key, state, **fields):
+    """Advance a job once a background write has landed on disk"""
+    def on_done(future):
+        if future.exception() is None:
+            mark_job(journal, key, state, **fields)
+    write_future.add_done_callback(on_done)
+
+def complete_job(prompt, key, record, journal=None, model_name=None, buffers=None, writes=()):
+    """Run the stages a generated job has not finished yet
+
+    Files are uploaded from disk unless buffers maps their paths to the
+    bytes already in memory. writes are background writes of the job's
+    files, which must land before the job counts as uploaded.
+    """
+    model_name = model_name or record.get("model_name")
+    buffers = buffers or {}
+    state = record["state"]
+    raw_path = record["raw_path"]
+    processed_path = record["processed_path"]
+    raw_drive_link = record.get("raw_drive_link")
+    processed_drive_link = record.get("processed_drive_link")
     
-    raw_output_dir = os.path.join(output_dir, "Digital Paper Store - Raw Folders", timestamp)
-    unprocessed_output_dir = os.path.join(output_dir, "Digital Paper Store - Digital Paper", timestamp)
-    processed_output_dir = os.path.join(output_dir, "Digital Paper Store - Seamless Paper", timestamp)
+    if state == GENERATED:
+        events.emit("process", STARTED, model_name)
+        result = process_image_files([raw_path], os.path.dirname(processed_path))[0]
+        if not result["ok"]:
+            events.emit("process", FAILED, model_name, error=result["error"])
+            mark_job(journal, key, GENERATED, error=result["error"])
+            return False
+        events.emit("process", DONE, model_name, seconds=result["seconds"])
+        processed_path = result["output_path"]
+        mark_job(journal, key, PROCESSED, processed_path=processed_path)
     
-    # Create all necessary directories
-    os.makedirs(raw_output_dir, exist_ok=True)
-    os.makedirs(unprocessed_output_dir, exist_ok=True)
-    os.makedirs(processed_output_dir, exist_ok=True)
+    if state in (GENERATED, PROCESSED):
+        # Upload to Drive - Simplified error handling
+        if not get_drive_instance():
+            events.emit("upload", SKIPPED, model_name, message="Google Drive not initialized")
+            return False
+        
+        def upload(path):
+            if path in buffers:
+                return submit_upload(data=buffers[path], title=os.path.basename(path))
+            return submit_upload(file_path=path)
+        
+        # Upload both raw and processed images side by side on the upload pool
+        events.emit("upload", STARTED, model_name, file=os.path.basename(raw_path))
+        started = time.perf_counter()
+        raw_upload = upload(raw_path)
+        processed_upload = upload(processed_path)
+        raw_drive_link = collect_upload(raw_upload, os.path.basename(raw_path))
+        processed_drive_link = collect_upload(processed_upload, os.path.basename(processed_path))
+        if not (raw_drive_link and processed_drive_link):
+            events.emit("upload", FAILED, model_name, error=f"Failed to upload some files for prompt: {prompt}")
+            return False
+        events.emit("upload", DONE, model_name, seconds=time.perf_counter() - started)
+        # The files must be on disk before the job can skip straight to cataloguing
+        for write in writes:
+            write.result()
+        mark_job(journal, key, UPLOADED, raw_drive_link=raw_drive_link, processed_drive_link=processed_drive_link,
+              raw_path=raw_path, processed_path=processed_path, raw_output_dir=record["raw_output_dir"],
+              processed_output_dir=record["processed_output_dir"])
+    
+    if state != CATALOGUED:
+        product_name = os.path.splitext(os.path.basename(raw_path))[0]
+        update_product_catalog(
+            product_name=product_name,
+            prompt=prompt,
+            folder_path=record["processed_output_dir"],
+            raw_path=record["raw_output_dir"],
+            drive_link=processed_drive_link,
+            raw_drive_link=raw_drive_link  # Add raw image link
+        )
+        mark_job(journal, key, CATALOGUED)
+        events.emit("catalog", DONE, model_name, message=product_name)
+    return True
+
+def resume_job(prompt, key, journal, resume):
+    """Finish a journalled job from where it stopped
+
+    Returns the raw image path when the job needs no new generation, or
+    None when it has to start from scratch.
+    """
+    record = journal.get(key) if (journal and resume) else None
+    if record and record["state"] == DUPLICATE:
+        events.info("job", f"Skipping near-duplicate job: {record['error']}", record["model_name"])
+        return record["raw_path"]
+    if not record or record["state"] == PENDING or not os.path.exists(record["raw_path"] or ""):
+        return None
+    if record["state"] == CATALOGUED:
+        events.info("job", f"Skipping finished job: {os.path.basename(record['raw_path'])}", record["model_name"])
+    else:
+        events.info("job", f"Resuming {os.path.basename(record['raw_path'])} from state: {record['state']}",
+                    record["model_name"])
+        complete_job(prompt, key, record, journal)
+    return record["raw_path"]
+
+def finish_generated(prompt, model_name, image_path, journal_key, output_dirs, journal=None):
+    """Take a raw image saved to disk through the near-duplicate check and the remaining stages"""
+    raw_output_dir, unprocessed_output_dir, processed_output_dir = output_dirs
+    if skip_near_duplicate(image_path, image_path, model_name, prompt, journal, journal_key):
+        return
+    
+    record = {
+        "state": GENERATED,
+        "raw_path": image_path,
+        "processed_path": primary_output_path(os.path.join(processed_output_dir, os.path.basename(image_path))),
+        "raw_output_dir": raw_output_dir,
+        "processed_output_dir": processed_output_dir,
+    }
+    mark_job(journal, journal_key, GENERATED, **{field: value for field, value in record.items() if field != "state"})
+    complete_job(prompt, journal_key, record, journal, model_name)
+
+def process_single_prompt(prompt, models, output_dir, scheduler=None,
+                          duplicate_index=0, journal=None, resume=False):
+    """Process a single prompt with the selected models
+
+    Models are run one after another; fan-out across prompts and models is
+    handled by the scheduler, which also provides each model's rate limiter.
+    Each (prompt, duplicate, model) job records its progress in the journal
+    so a resumed run only redoes unfinished stages.
+    """
+    job_id = new_job_id()
+    output_dirs = None
     
     generated_paths = []
     
-    # Generate images using selected models
-    with ThreadPoolExecutor(max_workers=len(models)) as executor:
-        futures = []
-        for key, (name, client) in models:
-            future = executor.submit(
-                generate_single_image,
-                name,
+    for key, (model_name, client) in models:
+        events.emit("job", STARTED, model_name)
+        try:
+            journal_key = job_key(prompt, duplicate_index, model_name)
+            image_path = resume_job(prompt, journal_key, journal, resume)
+            if image_path:
+                generated_paths.append(image_path)
+                continue
+            if journal:
+                journal.start(journal_key, prompt, duplicate_index, model_name)
+            
+            if output_dirs is None:
+                # Create all necessary directories
+                output_dirs = make_output_dirs(output_dir, job_id)
+            raw_output_dir, unprocessed_output_dir, processed_output_dir = output_dirs
+            
+            image_path = generate_single_image(
+                model_name,
                 client,
                 prompt,
                 raw_output_dir,
-                timestamp,
-                progress
+                job_id,
+                limiter=scheduler.limiter(model_name) if scheduler else None,
+                duplicate_index=duplicate_index
             )
-            futures.append((future, name))
-        
-        for future, model_name in futures:
-            try:
-                image_path = future.result()
-                if image_path:
-                    generated_paths.append(image_path)
-                    elapsed = time.time() - start_time
-                    console.print(f"[blue]{model_name} completed in {elapsed:.1f} seconds[/blue]")
-            except Exception as e:
-                console.print(f"[red]Unexpected error with {model_name}: {str(e)}[/red]")
+            if not image_path:
+                continue
+            generated_paths.append(image_path)
+            finish_generated(prompt, model_name, image_path, journal_key, output_dirs, journal)
+        except Exception as e:
+            events.error("job", f"Unexpected error: {str(e)}", model_name)
+    
+    return generated_paths
 
-    if generated_paths:
-        # Process the generated images
-        process_images(raw_output_dir, processed_output_dir)
-        
-        # Upload to Drive and update Excel - Simplified error handling
-        drive = get_drive_instance()
-        if not drive:
-            console.print("[red]Error: Google Drive not initialized[/red]")
-            return generated_paths
+def process_hedged_prompt(prompt, candidates, output_dir, scheduler=None,
+                          duplicate_index=0, journal=None, resume=False, first_n=1, preferred_keys=None):
+    """Process a prompt with the first first_n candidate models to answer
 
-        for image_path in generated_paths:
-            try:
-                # Upload both raw and processed images
-                raw_drive_link = upload_file_to_drive(image_path)
-                processed_path = os.path.join(processed_output_dir, os.path.basename(image_path))
-                processed_drive_link = upload_file_to_drive(processed_path)
-                
-                if raw_drive_link and processed_drive_link:
-                    product_name = os.path.splitext(os.path.basename(image_path))[0]
-                    excel_path = update_product_catalog(
-                        product_name=product_name,
-                        prompt=prompt,
-                        folder_path=processed_output_dir,
-                        raw_path=raw_output_dir,
-                        drive_link=processed_drive_link,
-                        raw_drive_link=raw_drive_link  # Add raw image link
-                    )
-                    console.print(f"[green]✓ Uploaded and updated catalog for: {product_name}[/green]")
-                else:
-                    console.print(f"[yellow]⚠ Failed to upload some files for prompt: {prompt}[/yellow]")
+    Candidates are raced by the routing layer, which starts the models in
+    preferred_keys first and hedges slow ones with equivalents; each
+    winning image then goes through the usual stages. Finished jobs from
+    the journal count towards first_n on resume.
+    """
+    job_id = new_job_id()
+    events.emit("job", STARTED)
+    generated_paths = []
+    remaining = []
+    for key, (model_name, client) in candidates:
+        image_path = resume_job(prompt, job_key(prompt, duplicate_index, model_name), journal, resume)
+        if image_path:
+            generated_paths.append(image_path)
+        else:
+            remaining.append((key, (model_name, client)))
+    needed = first_n - len(generated_paths)
+    if needed <= 0:
+        return generated_paths[:first_n]
+    
+    results = hedged_generate(prompt, remaining, needed, scheduler, duplicate_index, preferred_keys=preferred_keys)
+    output_dirs = make_output_dirs(output_dir, job_id) if results else None
+    for key, model_name, image in results:
+        try:
+            journal_key = job_key(prompt, duplicate_index, model_name)
+            if journal:
+                journal.start(journal_key, prompt, duplicate_index, model_name)
+            image_path = os.path.join(output_dirs[0], image_filename(model_name, job_id))
+            save_generated(image, image_path)
+            generated_paths.append(image_path)
+            finish_generated(prompt, model_name, image_path, journal_key, output_dirs, journal)
+        except Exception as e:
+            events.error("job", f"Unexpected error: {str(e)}", model_name)
+    
+    return generated_paths
+
+def process_single_prompt_streaming(prompt, models, output_dir, scheduler=None,
+                                    duplicate_index=0, journal=None, resume=False):
+    """Process a single prompt keeping each image in memory between stages
+
+    The generated image goes straight to the post-processing pool, each PNG
+    is encoded once, written to disk in the background and uploaded from the
+    same buffer. Jobs resumed from the journal finish from their files on disk.
+    """
+    job_id = new_job_id()
+    output_dirs = None
+    
+    generated_paths = []
+    
+    for key, (model_name, client) in models:
+        events.emit("job", STARTED, model_name)
+        try:
+            journal_key = job_key(prompt, duplicate_index, model_name)
+            image_path = resume_job(prompt, journal_key, journal, resume)
+            if image_path:
+                generated_paths.append(image_path)
+                continue
+            if journal:
+                journal.start(journal_key, prompt, duplicate_index, model_name)
             
-            except Exception as e:
-                console.print(f"[red]Error uploading {os.path.basename(image_path)}: {str(e)}[/red]")
+            if output_dirs is None:
+                output_dirs = make_output_dirs(output_dir, job_id)
+            raw_output_dir, unprocessed_output_dir, processed_output_dir = output_dirs
+            
+            image = generate_image(
+                model_name,
+                client,
+                prompt,
+                limiter=scheduler.limiter(model_name) if scheduler else None,
+                duplicate_index=duplicate_index
+            )
+            if image is None:
+                continue
+            
+            filename = image_filename(model_name, job_id)
+            image_path = os.path.join(raw_output_dir, filename)
+            processed_paths = output_paths(os.path.join(processed_output_dir, filename))
+            processed_path = primary_output_path(os.path.join(processed_output_dir, filename))
+            paths = {
+                "raw_path": image_path,
+                "processed_path": processed_path,
+                "raw_output_dir": raw_output_dir,
+                "processed_output_dir": processed_output_dir,
+            }
+            if skip_near_duplicate(image, image_path, model_name, prompt, journal, journal_key):
+                continue
+            
+            # Resize in the process pool while the raw PNG is encoded here
+            events.emit("process", STARTED, model_name)
+            processed_future = get_postprocess_pool().submit_image(image)
+            raw_data = encode_generated(image)
+            raw_write = write_in_background(image_path, raw_data)
+            # The job only counts as generated once the raw file is on disk
+            _mark_when_written(raw_write, journal, journal_key, GENERATED, **paths)
+            generated_paths.append(image_path)
+            
+            result = processed_future.result()
+            record_process_metrics(result)
+            if not result["ok"]:
+                events.emit("process", FAILED, model_name, error=f"{filename}: {result['error']}")
                 continue
+            events.emit("process", DONE, model_name, seconds=result["seconds"])
+            processed_data = result["data"]
+            # Every deliverable was encoded from the same resized image; the main one gates the journal
+            processed_writes = [
+                write_in_background(path, result["outputs"][name])
+                for name, path in processed_paths.items() if path != processed_path
+            ]
+            processed_write = write_in_background(processed_path, processed_data)
+            _mark_when_written(processed_write, journal, journal_key, PROCESSED, **paths)
+            
+            # Upload and catalogue from the in-memory buffers
+            complete_job(
+                prompt,
+                journal_key,
+                dict(paths, state=PROCESSED),
+                journal,
+                model_name,
+                buffers={image_path: raw_data, processed_path: processed_data},
+                writes=[raw_write, processed_write, *processed_writes]
+            )
+        except Exception as e:
+            events.error("job", f"Unexpected error: {str(e)}", model_name)
     
     return generated_paths
 
-def interactive_loop(models, output_dir="Digital Paper Store"):
+def iter_jobs(prompts, duplicates=1):
+    """Lazily expand prompts into (prompt, duplicate_index) jobs"""
+    for prompt in prompts:
+        for duplicate_index in range(duplicates):
+            yield prompt, duplicate_index
+
+def select_models(models, selection):
+    """Resolve a comma-separated list of model keys or names ("all" or "A" for every model)"""
+    if selection.strip().upper() in ("A", "ALL"):
+        return list(models.items())
+    by_name = {name.lower(): key for key, (name, _) in models.items()}
+    selected = []
+    for item in selection.split(","):
+        item = item.strip()
+        key = item if item in models else by_name.get(item.lower())
+        if key is None:
+            raise ValueError(f"Unknown model: {item}")
+        selected.append((key, models[key]))
+    return selected
+
+def run_batch(jobs, selected_models, output_dir, journal=None, streaming=False, resume=False,
+              concurrency=MAX_CONCURRENT_JOBS, first_n=None, preferred_keys=None):
+    """Feed (prompt, duplicate_index) jobs to the thread scheduler as they are read
+
+    jobs may be a lazy generator: submission blocks while the scheduler is
+    full, so only a bounded window of jobs is held at a time. Results are
+    reported from done-callbacks rather than by keeping a future per job.
+    With first_n, each prompt is one hedged job that keeps the first first_n
+    of the selected models to answer; models in preferred_keys run first
+    and the rest only as fallbacks.
+    """
+    process = process_single_prompt_streaming if streaming else process_single_prompt
+    totals = {"jobs": 0, "images": 0, "failed": 0}
+    lock = threading.Lock()
+
+    def report(future, prompt, model_name):
+        if future.cancelled():
+            return
+        try:
+            generated_paths = future.result()
+            if generated_paths:
+                events.emit("job", DONE, model_name, images=len(generated_paths))
+            else:
+                events.emit("job", FAILED, model_name, error=f"No images generated for prompt: {prompt}")
+        except Exception as e:
+            events.emit("job", FAILED, model_name, error=f"Error processing prompt '{prompt}': {str(e)}")
+            generated_paths = []
+        with lock:
+            totals["images"] += len(generated_paths)
+            if not generated_paths:
+                totals["failed"] += 1
+
+    events.emit("batch", STARTED)
+    with JobScheduler(max_concurrency=concurrency) as scheduler:
+        metrics.register_gauge("jobs_pending", scheduler.pending)
+        # One job per (prompt, model); the scheduler caps concurrency
+        # and blocks submission while its queue is full
+        for prompt, duplicate_index in jobs:
+            if first_n:
+                events.emit("job", QUEUED)
+                future = scheduler.submit(
+                    process_hedged_prompt,
+                    prompt,
+                    selected_models,
+                    output_dir,
+                    scheduler=scheduler,
+                    duplicate_index=duplicate_index,
+                    journal=journal,
+                    resume=resume,
+                    first_n=first_n,
+                    preferred_keys=preferred_keys
+                )
+                with lock:
+                    totals["jobs"] += 1
+                future.add_done_callback(lambda f, prompt=prompt: report(f, prompt, None))
+                continue
+            for model in selected_models:
+                events.emit("job", QUEUED, model[1][0])
+                future = scheduler.submit(
+                    process,
+                    prompt,
+                    [model],
+                    output_dir,
+                    scheduler=scheduler,
+                    duplicate_index=duplicate_index,
+                    journal=journal,
+                    resume=resume
+                )
+                with lock:
+                    totals["jobs"] += 1
+                future.add_done_callback(lambda f, prompt=prompt, model_name=model[1][0]: report(f, prompt, model_name))
+    events.emit("batch", DONE, **totals)
+    # Let the renderer finish drawing before the summary is printed
+    events.flush()
+    return totals
+
+def print_batch_summary(totals, journal=None, export=True):
+    """Export the catalog and report how the batch went
+
+    Workers sharing a queue pass export=False; the workbook is exported
+    once, e.g. with --export-catalog, instead of by every worker.
+    """
+    # Write the formatted catalog once per batch
+    if export:
+        export_product_catalog()
+    if totals:
+        console.print(f"[blue]Batch: {totals['jobs']} jobs, {totals['images']} images, {totals['failed']} failed[/blue]")
+    requests = request_tracker.snapshot()
+    console.print(
+        f"[blue]Inference requests: {requests['completed']} completed, {requests['failed']} failed, "
+        f"{requests['timed_out']} timed out, {requests['in_flight']} in flight "
+        f"({requests['overdue']} overdue), {requests['threads']} threads[/blue]"
+    )
+    # Connection reuse goes to the event log as well
+    connection_stats.report()
+    for line in connection_stats.summary_lines():
+        console.print(f"[blue]HTTP {line}[/blue]")
+    if journal:
+        counts = journal.counts()
+        console.print(f"[blue]Job journal: {', '.join(f'{state}: {counts.get(state, 0)}' for state in STATES)}[/blue]")
+
+def run_async_jobs(token, selected_models, jobs, output_dir, concurrency=None, journal=None):
+    """Run jobs on the asyncio engine, recording them in the journal"""
+    import asyncio
+    from utils.async_pipeline import run_async_batch
+    kwargs = {"max_concurrency": concurrency} if concurrency else {}
+    kwargs["journal"] = journal
+    events.emit("batch", STARTED)
+    try:
+        generated = asyncio.run(run_async_batch(token, [key for key, _ in selected_models], jobs, output_dir, **kwargs))
+    finally:
+        events.emit("batch", DONE)
+        events.flush()
+    return {"jobs": None, "images": generated, "failed": None}
+
+def hedge_models(models, selected_models, first_n):
+    """Candidates for hedged jobs, or the selection unchanged when not hedging"""
+    if not first_n:
+        return selected_models
+    candidates = hedge_candidates(models, selected_models)
+    console.print(f"[yellow]Hedging: first {first_n} of {', '.join(name for _, (name, _) in candidates)}[/yellow]")
+    return candidates
+
+def headless_run(models, input_path, model_selection="all", duplicates=1, concurrency=None,
+                 output_dir="Digital Paper Store", engine="threads", token=None, streaming=False, resume=False,
+                 first_n=None):
+    """Run one batch from a prompt file without any interactive questions"""
+    if duplicates < 1:
+        raise ValueError("Duplication factor must be at least 1")
+    selected_models = select_models(models, model_selection)
+    console.print(f"[yellow]Using models: {', '.join(name for _, (name, _) in selected_models)}[/yellow]")
+    console.print(f"[blue]Streaming prompts from {input_path} (×{duplicates})[/blue]")
+    jobs = iter_jobs(iter_prompts(input_path), duplicates)
+
+    journal = JobJournal()
+    if engine == "async":
+        totals = run_async_jobs(token, selected_models, jobs, output_dir, concurrency, journal)
+        console.print(f"[blue]Batch: {totals['images']} images generated[/blue]")
+        print_batch_summary(None, journal)
+        return totals
+
+    totals = run_batch(jobs, hedge_models(models, selected_models, first_n), output_dir, journal=journal,
+                       streaming=streaming, resume=resume, concurrency=concurrency or MAX_CONCURRENT_JOBS,
+                       first_n=first_n, preferred_keys=[key for key, _ in selected_models])
+    print_batch_summary(totals, journal)
+    return totals
+
+def enqueue_jobs(prompts, model_selection="all", duplicates=1, queue=None):
+    """Add a (prompt, duplicate, model) job for every prompt to the shared work queue
+
+    Jobs already in the queue, finished or not, are left as they are.
+    """
+    queue = queue or WorkQueue()
+    menu = {key: (name, None) for key, (name, *_) in MODEL_TABLE.items()}
+    selected_models = select_models(menu, model_selection)
+    jobs = (
+        (prompt, duplicate_index, key)
+        for prompt, duplicate_index in iter_jobs(prompts, duplicates)
+        for key, _ in selected_models
+    )
+    added = queue.enqueue(jobs)
+    counts = queue.counts()
+    console.print(f"[green]✓ Queued {added} new jobs[/green]")
+    console.print(f"[blue]Work queue: {', '.join(f'{status}: {count}' for status, count in sorted(counts.items()))}[/blue]")
+    return added
+
+def run_queued_job(job, models, output_dir, scheduler, journal, queue, worker, streaming=False):
+    """Run one claimed job through the pipeline and report the outcome to the queue"""
+    if job["model_key"] not in models:
+        queue.fail(job["id"], worker, f"Unknown model: {job['model_key']}", retry=False)
+        return False
+    model = (job["model_key"], models[job["model_key"]])
+    model_name = model[1][0]
+    process = process_single_prompt_streaming if streaming else process_single_prompt
+    # A job retried after a lost lease picks up from its journal record
+    process(job["prompt"], [model], output_dir, None, scheduler=scheduler,
+            duplicate_index=job["duplicate_index"], journal=journal, resume=True)
+    record = journal.get(job_key(job["prompt"], job["duplicate_index"], model_name))
+    if record and record["state"] in (CATALOGUED, DUPLICATE):
+        if not queue.complete(job["id"], worker):
+            events.warning("job", f"Lease on job {job['id']} expired before it finished", model_name)
+        return True
+    error = (record or {}).get("error") or f"stopped at state: {(record or {}).get('state', PENDING)}"
+    queue.fail(job["id"], worker, error)
+    return False
+
+def run_worker(models, output_dir="Digital Paper Store", concurrency=None, streaming=False, wait=False, queue=None):
+    """Claim and run jobs from the shared work queue
+
+    Each of the concurrency threads claims one job at a time, so leases are
+    only taken for work that is about to start. A heartbeat thread keeps
+    them alive. The worker stops when the queue has nothing claimable,
+    unless wait is set.
+    """
+    queue = queue or WorkQueue()
+    worker = worker_id()
+    concurrency = concurrency or MAX_CONCURRENT_JOBS
+    journal = JobJournal()
+    keeper = LeaseKeeper(queue, worker)
+    totals = {"jobs": 0, "images": 0, "failed": 0}
+    lock = threading.Lock()
+    console.print(f"[blue]Worker {worker} running {concurrency} jobs at a time from {queue.db_path}[/blue]")
+
+    def work(scheduler):
+        while True:
+            job = queue.claim(worker)
+            if job is None:
+                if not wait:
+                    return
+                time.sleep(WORKER_POLL_INTERVAL)
+                continue
+            keeper.hold(job["id"])
+            try:
+                ok = run_queued_job(job, models, output_dir, scheduler, journal, queue, worker, streaming)
+            except Exception as e:
+                queue.fail(job["id"], worker, str(e))
+                ok = False
+                events.error("job", f"Error running job {job['id']}: {str(e)}")
+            finally:
+                keeper.release(job["id"])
+            events.emit("job", DONE if ok else FAILED, job["model_key"], queue_id=job["id"])
+            with lock:
+                totals["jobs"] += 1
+                totals["images" if ok else "failed"] += 1
+
+    events.emit("batch", STARTED)
+    try:
+        with JobScheduler(max_concurrency=concurrency, max_queued=0) as scheduler:
+            metrics.register_gauge("jobs_pending", scheduler.pending)
+            metrics.register_gauge("work_queue_pending", queue.pending)
+            workers = [scheduler.submit(work, scheduler) for _ in range(concurrency)]
+            for future in workers:
+                future.result()
+    finally:
+        keeper.stop()
+        events.emit("batch", DONE, **totals)
+        events.flush()
+    print_batch_summary(totals, journal, export=False)
+    console.print("[blue]Run with --export-catalog once the queue is done to write the Excel catalog[/blue]")
+    return totals
+
+def parse_rows(value):
+    """Parse a sheet row selection such as "2-50" or "3,7,9" """
+    if not value:
+        return None
+    if "-" in value:
+        start, end = value.split("-", 1)
+        return range(int(start), int(end) + 1)
+    return [int(row) for row in value.split(",")]
+
+def split_list(value):
+    return [item.strip() for item in value.split(",") if item.strip()] if value else None
+
+def interactive_loop(models, output_dir="Digital Paper Store", engine="threads", token=None, streaming=False,
+                     resume=False, excel_path=INPUT_EXCEL_FILE, rows=None, themes=None, categories=None,
+                     first_n=None):
     """Main interactive loop for generating images"""
     while True:
         console.print(Panel.fit("Available Models:", style="bold blue"))
@@ -111,7 +641,7 @@ def interactive_loop(models, output_dir="Digital Paper Store"):
             break
 
         # Read prompts from Excel
-        prompts_data = read_prompts_from_excel()
+        prompts_data = read_prompts_from_excel(excel_path, rows=rows, themes=themes, categories=categories)
         if not prompts_data:
             console.print("[red]No prompts found in Excel file[/red]")
             continue
@@ -131,73 +661,136 @@ def interactive_loop(models, output_dir="Digital Paper Store"):
             duplication_factor = 1
 
         # Select models based on choice
-        selected_models = models.items() if choice.upper() == "A" else [(choice, models[choice])]
+        selected_models = select_models(models, choice)
         console.print("[yellow]Using models:[/yellow]")
         for key, (name, _) in selected_models:
             console.print(f"[yellow]- {name}[/yellow]")
 
-        # Collect all prompts and duplicate them
-        all_prompts = []
-        for data in prompts_data:
-            all_prompts.extend(data["Prompts"] * duplication_factor)
-
-        console.print(f"[blue]Processing {len(all_prompts)} total prompts ({len(all_prompts)//duplication_factor} unique prompts × {duplication_factor})[/blue]")
-
-        # Process all prompts in parallel
-        with Progress(
-            SpinnerColumn(),
-            TextColumn("[progress.description]{task.description}"),
-            TimeElapsedColumn(),
-            console=console
-        ) as progress:
-            with ThreadPoolExecutor(max_workers=len(all_prompts)) as executor:
-                futures = []
-                for prompt in all_prompts:
-                    # Add 2-second delay before submitting each prompt
-                    time.sleep(2)
-                    future = executor.submit(
-                        process_single_prompt,
-                        prompt,
-                        list(selected_models),
-                        output_dir,
-                        progress
-                    )
-                    futures.append((future, prompt))
-                
-                for future, prompt in futures:
-                    try:
-                        generated_paths = future.result()
-                        if not generated_paths:
-                            console.print(f"[red]No images generated for prompt: {prompt}[/red]")
-                    except Exception as e:
-                        console.print(f"[red]Error processing prompt '{prompt}': {str(e)}[/red]")
+        prompts = [prompt for data in prompts_data for prompt in data["Prompts"]]
+        console.print(f"[blue]Processing {len(prompts) * duplication_factor} total prompts ({len(prompts)} unique prompts × {duplication_factor})[/blue]")
+        jobs = iter_jobs(prompts, duplication_factor)
+
+        journal = JobJournal()
+        if engine == "async":
+            run_async_jobs(token, selected_models, jobs, output_dir, journal=journal)
+            print_batch_summary(None, journal)
+            continue
+
+        # Process all prompts in parallel; progress is drawn by the event renderer
+        totals = run_batch(jobs, hedge_models(models, selected_models, first_n), output_dir, journal=journal,
+                           streaming=streaming, resume=resume, first_n=first_n,
+                           preferred_keys=[key for key, _ in selected_models])
+
+        print_batch_summary(totals, journal)
 
 def main():
     parser = argparse.ArgumentParser(description='Generate images from text prompt')
     parser.add_argument('--output', type=str, default='Digital Paper Store', help='Output directory for generated images')
-    parser.add_argument('--upload', action='store_true', default=True, help='Upload generated images to Google Drive')
+    parser.add_argument('--upload', action=argparse.BooleanOptionalAction, default=True, help='Upload generated images to Google Drive; with --no-upload jobs stop after post-processing and a later --resume run uploads them')
+    parser.add_argument('--engine', choices=['threads', 'async'], default='threads', help='Run generation on the thread scheduler or a single asyncio event loop')
+    parser.add_argument('--streaming', action='store_true', help='Pass images between stages in memory and write each file once in the background')
+    parser.add_argument('--resume', action='store_true', help='Skip jobs already finished in the job journal and finish incomplete ones')
+    parser.add_argument('--export-catalog', action='store_true', help='Export the catalog journal to product_catalog.xlsx and exit')
+    parser.add_argument('--excel', type=str, default=INPUT_EXCEL_FILE, help='Prompt template workbook for the interactive menu')
+    parser.add_argument('--rows', type=str, help='Only use these template rows, e.g. "2-50" or "3,7,9"')
+    parser.add_argument('--themes', type=str, help='Only use template rows with these comma-separated themes')
+    parser.add_argument('--categories', type=str, help='Only use template rows in these comma-separated categories')
+    parser.add_argument('--input', type=str, help='Run headless on prompts from a .jsonl, .csv or .xlsx file instead of the interactive menu')
+    parser.add_argument('--models', type=str, default='all', help='Headless mode: comma-separated model keys or names, or "all"')
+    parser.add_argument('--duplicates', type=int, default=1, help='Headless mode: how many times to generate each prompt')
+    parser.add_argument('--concurrency', type=int, help='Headless mode: maximum jobs running at once (defaults to the engine setting)')
+    parser.add_argument('--hedge', action='store_true', help='Race each prompt across equivalent models and keep the fastest answers')
+    parser.add_argument('--first', type=int, default=1, help='Hedged mode: how many models\' images to keep per prompt')
+    parser.add_argument('--quiet', action='store_true', help='Print nothing; for headless runs, together with --event-log')
+    parser.add_argument('--display', choices=['auto', 'live', 'plain', 'quiet'], default=EVENT_DISPLAY, help='How pipeline progress is shown: a live counter table, plain warning/summary lines, or nothing')
+    parser.add_argument('--event-log', type=str, default=EVENT_LOG_PATH, help='Append every pipeline event to this JSON lines file')
+    parser.add_argument('--metrics', nargs='?', const=METRICS_DIR, help='Record stage timings and write metrics.json and metrics.prom to this folder (default: %(const)s)')
+    parser.add_argument('--enqueue', action='store_true', help='Add jobs from --input (or the Excel template) to the shared work queue and exit')
+    parser.add_argument('--worker', action='store_true', help='Run jobs from the shared work queue on the thread engine instead of reading prompts')
+    parser.add_argument('--wait', action='store_true', help='Worker mode: keep polling for new jobs when the queue is empty')
     args = parser.parse_args()
+    display = "quiet" if args.quiet else args.display
+    if display == "quiet" and not (args.input or args.worker or args.enqueue or args.export_catalog):
+        parser.error("quiet mode needs a headless run: --input, --worker, --enqueue or --export-catalog")
+    if args.engine == "async" and not args.worker:
+        unsupported = [flag for flag, used in (("--resume", args.resume), ("--hedge", args.hedge),
+                                               ("--streaming", args.streaming)) if used]
+        if unsupported:
+            parser.error(f"--engine async does not support {', '.join(unsupported)}; use --engine threads")
+    if args.metrics:
+        metrics.enable()
+    
+    events.start(display, args.event_log)
+    try:
+        if display == "quiet":
+            # Fully quiet: nothing from the pipeline or the libraries it calls reaches the terminal
+            with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+                run_cli(args)
+        else:
+            run_cli(args)
+    finally:
+        events.stop()
+
+def run_cli(args):
+    """Run whatever the parsed command line asks for"""
+    if args.export_catalog:
+        export_product_catalog()
+        return
+    
+    if args.enqueue:
+        if args.input:
+            prompts = iter_prompts(args.input)
+        else:
+            prompts = (
+                prompt
+                for data in read_prompts_from_excel(args.excel, rows=parse_rows(args.rows),
+                                                    themes=split_list(args.themes),
+                                                    categories=split_list(args.categories))
+                for prompt in data["Prompts"]
+            )
+        enqueue_jobs(prompts, model_selection=args.models, duplicates=args.duplicates)
+        return
     
     try:
         console.print(Panel.fit("🚀 Starting Image Generation System", style="bold green"))
         
         # Move Google Drive initialization to the top and make it required
-        try:
-            init_google_drive(os.path.dirname(__file__))
-            console.print("[green]✓ Google Drive initialized successfully[/green]")
-        except Exception as e:
-            console.print(Panel.fit(
-                f"❌ Google Drive initialization failed: {e}\nPlease ensure Google Drive credentials are properly set up.",
-                title="Critical Error",
-                style="bold red"
-            ))
-            return  # Exit if Google Drive setup fails
+        if args.upload:
+            try:
+                # Headless runs must not wait on a browser sign-in
+                init_google_drive(os.path.dirname(__file__), interactive=not (args.input or args.worker))
+                console.print("[green]✓ Google Drive initialized successfully[/green]")
+            except Exception as e:
+                console.print(Panel.fit(
+                    f"❌ Google Drive initialization failed: {e}\nPlease ensure Google Drive credentials are properly set up.",
+                    title="Critical Error",
+                    style="bold red"
+                ))
+                return  # Exit if Google Drive setup fails
+        else:
+            console.print("[yellow]Uploads are off: jobs stop after post-processing[/yellow]")
         
         token = load_environment()
-        models = warm_up_models(token)
+        if args.engine == "async" and not args.worker:
+            from utils.async_pipeline import warm_up_async_engine
+            models = warm_up_async_engine(token)
+        else:
+            models = warm_up_models(token)
         console.print("\n[green]All models initialized and ready![/green]")
+        console.print(f"[blue]Startup took {time.perf_counter() - STARTUP_BEGAN:.2f} seconds[/blue]")
         
-        interactive_loop(models, args.output)
+        if args.worker:
+            run_worker(models, args.output, concurrency=args.concurrency, streaming=args.streaming, wait=args.wait)
+        elif args.input:
+            headless_run(models, args.input, model_selection=args.models, duplicates=args.duplicates,
+                         concurrency=args.concurrency, output_dir=args.output, engine=args.engine, token=token,
+                         streaming=args.streaming, resume=args.resume,
+                         first_n=args.first if args.hedge else None)
+        else:
+            interactive_loop(models, args.output, engine=args.engine, token=token, streaming=args.streaming,
+                             resume=args.resume, excel_path=args.excel, rows=parse_rows(args.rows),
+                             themes=split_list(args.themes), categories=split_list(args.categories),
+                             first_n=args.first if args.hedge else None)
         
     except Exception as e:
         console.print(Panel.fit(
@@ -205,6 +798,14 @@ def main():
             title="Error",
             style="bold red"
         ))
+    finally:
+        shutdown_postprocess_pool()
+        shutdown_background_writer()
+        shutdown_upload_pool()
+        shutdown_catalog_store()
+        if metrics.enabled:
+            json_path, prom_path = metrics.export(args.metrics or METRICS_DIR)
+            console.print(f"[blue]Metrics written to {json_path} and {prom_path}[/blue]")
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,377 @@
+import asyncio
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+from huggingface_hub import AsyncInferenceClient
+from rich.console import Console
+from rich.panel import Panel
+
+from config.settings import ASYNC_MAX_CONCURRENCY, ASYNC_EXECUTOR_WORKERS, GENERATION_TIMEOUT
+from utils.drive_utils import get_drive_instance, submit_upload, collect_upload
+from utils.excel_utils import update_product_catalog
+from utils.generation_utils import (
+    get_model_specific_prompt,
+    describe_failure,
+    job_seed,
+    cached_generation,
+    save_generated,
+)
+from utils.http_pool import configure_inference_http
+from utils.image_processor import (
+    get_postprocess_pool,
+    report_process_result,
+    worker_failure,
+    primary_output_path,
+    save_raw_image,
+)
+from utils.events import events, STARTED, RETRY, DONE, FAILED, SKIPPED
+from utils.job_journal import job_key, mark_job, GENERATED, PROCESSED, UPLOADED, CATALOGUED
+from utils.metrics import metrics
+from utils.model_utils import MODEL_TABLE, load_readiness_cache, record_readiness, is_ready_cached
+from utils.paths import make_output_dirs, new_job_id, image_filename
+from utils.phash_index import skip_near_duplicate
+from utils.retry_policy import (
+    default_retry_policy,
+    get_circuit_breaker,
+    classify_error,
+    retry_after,
+    CircuitOpenError,
+)
+from utils.scheduler import register_model_limits, get_model_limits
+
+console = Console()
+
+class AsyncModelLimiter:
+    """asyncio counterpart of scheduler.ModelLimiter"""
+
+    def __init__(self, model_name, requests_per_minute, max_in_flight):
+        self.model_name = model_name
+        self.interval = 60.0 / requests_per_minute
+        self._in_flight = asyncio.Semaphore(max_in_flight)
+        self._lock = asyncio.Lock()
+        self._next_slot = 0.0
+
+    @classmethod
+    def for_model(cls, model_name):
+        limits = get_model_limits(model_name)
+        return cls(model_name, limits["requests_per_minute"], limits["max_in_flight"])
+
+    async def _wait_for_rate(self):
+        async with self._lock:
+            now = time.monotonic()
+            wait = max(0.0, self._next_slot - now)
+            self._next_slot = max(now, self._next_slot) + self.interval
+        if wait:
+            await asyncio.sleep(wait)
+
+    async def __aenter__(self):
+        await self._in_flight.acquire()
+        try:
+            await self._wait_for_rate()
+        except BaseException:
+            self._in_flight.release()
+            raise
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        self._in_flight.release()
+
+async def _close_client(client):
+    close = getattr(client, "close", None)
+    if close:
+        await close()
+
+async def async_warm_up_models(token, timeout=10, client_factory=AsyncInferenceClient):
+    """Create async clients for every model and warm them up concurrently
+
+    client_factory is called as client_factory(model_id, token=..., timeout=...)
+    and may return any object with an async text_to_image(prompt) method.
+    """
+    console.print(Panel.fit("🎨 Initializing AI Models (async)", style="bold magenta"))
+    console.print(f"[blue]HTTP connection pool: {configure_inference_http()}[/blue]")
+    models = {}
+    for key, (name, model_id, requests_per_minute, max_in_flight) in MODEL_TABLE.items():
+        models[key] = (name, client_factory(model_id, token=token, timeout=GENERATION_TIMEOUT))
+        register_model_limits(name, requests_per_minute=requests_per_minute, max_in_flight=max_in_flight)
+
+    start_time = time.time()
+
+    cache = load_readiness_cache()
+
+    async def warm_up(name, model_id, client):
+        if is_ready_cached(cache, model_id):
+            console.print(f"[green]✓ {name} ready (cached)[/green]")
+            return
+        try:
+            async with asyncio.timeout(timeout):
+                await client.text_to_image("test")
+            record_readiness(model_id, True)
+            console.print(f"[green]✓ {name} ready[/green]")
+        except TimeoutError:
+            record_readiness(model_id, False)
+            console.print(f"[yellow]⚠ {name} warm-up skipped: timed out after {timeout} seconds[/yellow]")
+        except Exception as e:
+            record_readiness(model_id, False)
+            console.print(f"[yellow]⚠ {name} warm-up skipped: {str(e)}[/yellow]")
+
+    await asyncio.gather(*(
+        warm_up(name, MODEL_TABLE[key][1], client) for key, (name, client) in models.items()
+    ))
+
+    elapsed = time.time() - start_time
+    console.print(f"[blue]Model initialization completed in {elapsed:.1f} seconds[/blue]")
+    return models
+
+async def async_generate_single_image(model_name, client, prompt, output_dir, job_id,
+                                      limiter=None, executor=None, timeout=GENERATION_TIMEOUT,
+                                      retry_policy=default_retry_policy, duplicate_index=0):
+    """Generate and save a single image, cancelling the request on timeout"""
+    loop = asyncio.get_running_loop()
+    seed = job_seed(prompt, duplicate_index, model_name)
+    unique_prompt = get_model_specific_prompt(prompt, seed)
+    image_path = os.path.join(output_dir, image_filename(model_name, job_id))
+    started_at = time.perf_counter()
+    events.emit("generate", STARTED, model_name, prompt=unique_prompt)
+
+    cache_key, image = await loop.run_in_executor(executor, cached_generation, model_name, client, unique_prompt, seed)
+    if image is not None:
+        await loop.run_in_executor(executor, save_raw_image, image, image_path)
+        events.emit("generate", DONE, model_name, message="served from the generation cache", cached=True,
+                    seconds=time.perf_counter() - started_at)
+        return image_path
+
+    breaker = get_circuit_breaker(model_name)
+    max_retries = retry_policy.max_attempts
+    attempt_number = 0
+
+    try:
+        async for attempt in retry_policy.async_retrying():
+            with attempt:
+                attempt_number = attempt.retry_state.attempt_number
+                try:
+                    pause = breaker.before_call()
+                except CircuitOpenError as e:
+                    if attempt_number < max_retries:
+                        events.emit("generate", RETRY, model_name, attempt=attempt_number, kind="circuit_open",
+                                    error=str(e))
+                    raise
+                await asyncio.sleep(pause)
+                started = time.perf_counter()
+                try:
+                    if limiter:
+                        async with limiter:
+                            async with asyncio.timeout(timeout):
+                                image = await client.text_to_image(unique_prompt)
+                    else:
+                        async with asyncio.timeout(timeout):
+                            image = await client.text_to_image(unique_prompt)
+                except Exception as e:
+                    kind = classify_error(e)
+                    breaker.record_failure(kind, retry_after(e))
+                    metrics.inc("inference_failures", model=model_name, kind=kind)
+                    if retry_policy.should_retry(e) and attempt_number < max_retries:
+                        metrics.inc("inference_retries", model=model_name)
+                        events.emit("generate", RETRY, model_name, attempt=attempt_number, kind=kind,
+                                    error=describe_failure(e, client))
+                    raise
+                metrics.observe("inference", time.perf_counter() - started, model=model_name)
+                breaker.record_success()
+    except Exception as e:
+        events.emit("generate", FAILED, model_name, attempts=attempt_number, error=describe_failure(e, client),
+                    seconds=time.perf_counter() - started_at)
+        return None
+
+    # PNG encoding is CPU-bound, keep it off the event loop
+    await loop.run_in_executor(executor, save_generated, image, image_path, cache_key)
+
+    events.emit("generate", DONE, model_name, attempts=attempt_number, seconds=time.perf_counter() - started_at)
+    return image_path
+
+async def async_upload_file_to_drive(file_path, executor=None):
+    """Upload a file to Google Drive on the upload pool without blocking the event loop"""
+    loop = asyncio.get_running_loop()
+    # Submitting only blocks while the upload pool is full; the upload itself is awaited on the loop
+    future = await loop.run_in_executor(executor, submit_upload, file_path)
+    try:
+        await asyncio.wrap_future(future)
+    except Exception:
+        pass
+    return collect_upload(future, os.path.basename(file_path))
+
+async def async_process_image_file(image_path, processed_output_dir, executor=None):
+    """Post-process one raw image on the shared process pool without blocking the event loop"""
+    loop = asyncio.get_running_loop()
+    output_path = os.path.join(processed_output_dir, os.path.basename(image_path))
+    # Submitting only blocks while the pool is full; the work itself is awaited on the loop
+    future = await loop.run_in_executor(executor, get_postprocess_pool().submit, image_path, output_path)
+    try:
+        result = await asyncio.wrap_future(future)
+    except Exception as e:
+        result = worker_failure(image_path, output_path, e)
+    report_process_result(result)
+    return result
+
+async def async_process_single_prompt(prompt, model, output_dir, limiters=None, executor=None, upload=True,
+                                      duplicate_index=0, journal=None):
+    """Async counterpart of txt2img.process_single_prompt for a single model
+
+    Jobs are recorded in the journal and checked for near-duplicates like
+    on the thread engine, so a later --resume run can finish them.
+    """
+    loop = asyncio.get_running_loop()
+    key, (model_name, client) = model
+    job_id = new_job_id()
+    journal_key = job_key(prompt, duplicate_index, model_name)
+    events.emit("job", STARTED, model_name)
+
+    async def mark(state, **fields):
+        await loop.run_in_executor(executor, partial(mark_job, journal, journal_key, state, **fields))
+
+    if journal:
+        await loop.run_in_executor(executor, journal.start, journal_key, prompt, duplicate_index, model_name)
+    raw_output_dir, unprocessed_output_dir, processed_output_dir = await loop.run_in_executor(
+        executor, make_output_dirs, output_dir, job_id
+    )
+
+    image_path = await async_generate_single_image(
+        model_name,
+        client,
+        prompt,
+        raw_output_dir,
+        job_id,
+        limiter=limiters.get(model_name) if limiters else None,
+        executor=executor,
+        duplicate_index=duplicate_index
+    )
+    if not image_path:
+        return []
+    if await loop.run_in_executor(executor, skip_near_duplicate, image_path, image_path, model_name, prompt,
+                                  journal, journal_key):
+        return [image_path]
+    paths = {
+        "raw_path": image_path,
+        "processed_path": primary_output_path(os.path.join(processed_output_dir, os.path.basename(image_path))),
+        "raw_output_dir": raw_output_dir,
+        "processed_output_dir": processed_output_dir,
+    }
+    await mark(GENERATED, **paths)
+
+    events.emit("process", STARTED, model_name)
+    result = await async_process_image_file(image_path, processed_output_dir, executor)
+    if not result["ok"]:
+        events.emit("process", FAILED, model_name, error=result["error"])
+        await mark(GENERATED, error=result["error"])
+        return []
+    events.emit("process", DONE, model_name, seconds=result["seconds"])
+    processed_path = result["output_path"]
+    await mark(PROCESSED, processed_path=processed_path)
+
+    if not (upload and get_drive_instance()):
+        events.emit("upload", SKIPPED, model_name, message="Google Drive not initialized")
+        return [image_path]
+
+    events.emit("upload", STARTED, model_name, file=os.path.basename(image_path))
+    started = time.perf_counter()
+    raw_drive_link, processed_drive_link = await asyncio.gather(
+        async_upload_file_to_drive(image_path, executor),
+        async_upload_file_to_drive(processed_path, executor)
+    )
+    if not (raw_drive_link and processed_drive_link):
+        events.emit("upload", FAILED, model_name, error=f"Failed to upload some files for prompt: {prompt}")
+        return [image_path]
+    events.emit("upload", DONE, model_name, seconds=time.perf_counter() - started)
+    await mark(UPLOADED, raw_drive_link=raw_drive_link, processed_drive_link=processed_drive_link)
+
+    product_name = os.path.splitext(os.path.basename(image_path))[0]
+    await loop.run_in_executor(
+        executor,
+        lambda: update_product_catalog(
+            product_name=product_name,
+            prompt=prompt,
+            folder_path=processed_output_dir,
+            raw_path=raw_output_dir,
+            drive_link=processed_drive_link,
+            raw_drive_link=raw_drive_link
+        )
+    )
+    await mark(CATALOGUED)
+    events.emit("catalog", DONE, model_name, message=product_name)
+    return [image_path]
+
+async def run_async_pipeline(prompts, models, output_dir, max_concurrency=ASYNC_MAX_CONCURRENCY,
+                             executor_workers=ASYNC_EXECUTOR_WORKERS, upload=True, journal=None):
+    """Run every (prompt, model) pair on one event loop
+
+    prompts may be any iterable of prompts or (prompt, duplicate_index)
+    pairs, including a lazy generator: a task is only
+    created once a concurrency slot is free, so at most max_concurrency jobs
+    exist at a time. Inference calls are also bounded by each model's limiter;
+    short blocking calls run on a fixed pool of executor_workers threads while
+    post-processing and uploads are awaited on their own pools. Jobs are
+    recorded in journal when one is given. Returns the number of images
+    generated.
+    """
+    semaphore = asyncio.Semaphore(max_concurrency)
+    limiters = {name: AsyncModelLimiter.for_model(name) for _, (name, _) in models}
+    executor = ThreadPoolExecutor(max_workers=executor_workers, thread_name_prefix="async-io")
+    running = set()
+    generated = 0
+
+    async def run(prompt, duplicate_index, model):
+        nonlocal generated
+        try:
+            paths = await async_process_single_prompt(prompt, model, output_dir, limiters, executor, upload,
+                                                      duplicate_index, journal)
+        except Exception as e:
+            events.emit("job", FAILED, model[1][0], error=f"Error processing prompt '{prompt}': {str(e)}")
+            return
+        finally:
+            semaphore.release()
+        if paths:
+            events.emit("job", DONE, model[1][0], images=len(paths))
+        else:
+            events.emit("job", FAILED, model[1][0], error=f"No images generated for prompt: {prompt}")
+        generated += len(paths)
+
+    try:
+        for item in prompts:
+            prompt, duplicate_index = item if isinstance(item, tuple) else (item, 0)
+            for model in models:
+                # Wait for a free slot before pulling more work from the source
+                await semaphore.acquire()
+                task = asyncio.create_task(run(prompt, duplicate_index, model))
+                running.add(task)
+                task.add_done_callback(running.discard)
+        if running:
+            await asyncio.gather(*running)
+    finally:
+        for task in running:
+            task.cancel()
+        executor.shutdown(wait=True)
+    return generated
+
+async def close_models(models):
+    """Close the HTTP sessions held by async clients"""
+    await asyncio.gather(*(_close_client(client) for _, client in models.values()))
+
+async def run_async_batch(token, model_keys, prompts, output_dir, client_factory=AsyncInferenceClient, **kwargs):
+    """Create clients for the selected models, run the pipeline and close them"""
+    configure_inference_http()
+    models = {
+        key: (MODEL_TABLE[key][0], client_factory(MODEL_TABLE[key][1], token=token, timeout=GENERATION_TIMEOUT))
+        for key in model_keys
+    }
+    try:
+        return await run_async_pipeline(prompts, list(models.items()), output_dir, **kwargs)
+    finally:
+        await close_models(models)
+
+def warm_up_async_engine(token, client_factory=AsyncInferenceClient):
+    """Warm up every model from a short-lived event loop and return the model menu"""
+    async def run():
+        models = await async_warm_up_models(token, client_factory=client_factory)
+        await close_models(models)
+        return models
+    return asyncio.run(run())
@@ -0,0 +1,191 @@
+import os
+import queue
+import sqlite3
+import threading
+from concurrent.futures import Future
+from datetime import datetime
+
+from config.settings import DATABASE_JOURNAL_MODE
+
+CATALOG_COLUMNS = [
+    'Product Name', 'Category', 'Prompts',
+    'Raw Folder Path', 'Processed Folder Path',
+    'Google Drive Link', 'Raw Google Drive Link', 'Created Date'
+]
+
+_SQL_COLUMNS = [
+    'product_name', 'category', 'prompts',
+    'raw_folder_path', 'processed_folder_path',
+    'drive_link', 'raw_drive_link', 'created_date'
+]
+
+_STOP = object()
+
+class CatalogStore:
+    """Append-only SQLite journal of catalog rows with a single writer thread
+
+    Callers enqueue rows with append(); the writer thread commits them in
+    batches, so adding a row costs the same no matter how big the catalog is.
+    append(row, wait=True) returns once that row is committed, or raises
+    the error that kept it from being written.
+    """
+
+    def __init__(self, db_path, batch_size=100, journal_mode=DATABASE_JOURNAL_MODE):
+        self.db_path = db_path
+        self.journal_mode = journal_mode
+        self.batch_size = batch_size
+        self._queue = queue.Queue()
+        # Last failure of a row appended without wait, until flush() reports it
+        self._error = None
+        self._error_lock = threading.Lock()
+        self._init_db()
+        self._writer = threading.Thread(target=self._write_loop, name="catalog-writer", daemon=True)
+        self._writer.start()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.execute(f"PRAGMA journal_mode={self.journal_mode}")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def _init_db(self):
+        os.makedirs(os.path.dirname(os.path.abspath(self.db_path)), exist_ok=True)
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS catalog ("
+                "id INTEGER PRIMARY KEY AUTOINCREMENT, "
+                + ", ".join(f"{column} TEXT" for column in _SQL_COLUMNS)
+                + ")"
+            )
+        conn.close()
+
+    def _write_loop(self):
+        conn = self._connect()
+        try:
+            while True:
+                item = self._queue.get()
+                batch = [item]
+                # Drain whatever else is waiting so one commit covers the burst
+                while len(batch) < self.batch_size:
+                    try:
+                        batch.append(self._queue.get_nowait())
+                    except queue.Empty:
+                        break
+                entries = [entry for entry in batch if entry is not _STOP]
+                try:
+                    if entries:
+                        self._write(conn, entries)
+                finally:
+                    for _ in batch:
+                        self._queue.task_done()
+                if len(entries) != len(batch):
+                    return
+        finally:
+            conn.close()
+
+    def _write(self, conn, entries):
+        """Commit a batch of rows and report each row's outcome
+
+        If the batch fails its rows are committed one by one, so a bad row
+        fails only itself. Errors go to the row's waiter, or for rows nobody
+        waits on, to the next flush().
+        """
+        placeholders = ", ".join("?" for _ in _SQL_COLUMNS)
+        insert = f"INSERT INTO catalog ({', '.join(_SQL_COLUMNS)}) VALUES ({placeholders})"
+
+        def values(row):
+            return [row.get(column) for column in CATALOG_COLUMNS]
+
+        try:
+            with conn:
+                conn.executemany(insert, [values(row) for row, _ in entries])
+            errors = [None] * len(entries)
+        except Exception:
+            errors = []
+            for row, _ in entries:
+                try:
+                    with conn:
+                        conn.execute(insert, values(row))
+                    errors.append(None)
+                except Exception as e:
+                    errors.append(e)
+        for (row, committed), error in zip(entries, errors):
+            if committed is not None:
+                if error is None:
+                    committed.set_result(row)
+                else:
+                    committed.set_exception(error)
+            elif error is not None:
+                with self._error_lock:
+                    self._error = error
+
+    def append(self, row, wait=False):
+        """Queue a catalog row for writing
+
+        Returns immediately, or with wait once the row is committed; a row
+        that could not be written then raises its own error.
+        """
+        row = dict(row)
+        row.setdefault('Created Date', datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
+        committed = Future() if wait else None
+        self._queue.put((row, committed))
+        if committed is not None:
+            committed.result()
+        return row
+
+    def flush(self):
+        """Block until every queued row has been written
+
+        Raises the last error of a row appended without wait, once.
+        """
+        self._queue.join()
+        with self._error_lock:
+            error, self._error = self._error, None
+        if error is not None:
+            raise error
+
+    def count(self):
+        self.flush()
+        conn = self._connect()
+        try:
+            return conn.execute("SELECT COUNT(*) FROM catalog").fetchone()[0]
+        finally:
+            conn.close()
+
+    def iter_rows(self):
+        """Yield every committed row as a dict keyed by catalog column"""
+        self.flush()
+        conn = self._connect()
+        try:
+            cursor = conn.execute(f"SELECT {', '.join(_SQL_COLUMNS)} FROM catalog ORDER BY id")
+            for values in cursor:
+                yield dict(zip(CATALOG_COLUMNS, values))
+        finally:
+            conn.close()
+
+    def import_excel(self, excel_path):
+        """Load rows from an existing catalog workbook into an empty journal"""
+        import openpyxl
+
+        if self.count() or not os.path.exists(excel_path):
+            return 0
+        workbook = openpyxl.load_workbook(excel_path, read_only=True)
+        sheet = workbook.active
+        rows = sheet.iter_rows(values_only=True)
+        headers = list(next(rows, []))
+        imported = 0
+        for values in rows:
+            row = dict(zip(headers, values))
+            self.append({
+                column: None if row.get(column) is None else str(row.get(column))
+                for column in CATALOG_COLUMNS
+            })
+            imported += 1
+        workbook.close()
+        self.flush()
+        return imported
+
+    def close(self):
+        """Commit queued rows and stop the writer thread"""
+        self._queue.put(_STOP)
+        self._writer.join()
@@ -1,21 +1,64 @@
-from pydrive.auth import GoogleAuth
-from pydrive.drive import GoogleDrive
 import os
-import logging
+import threading
+from concurrent.futures import Future
 from rich.console import Console
 
+from config.settings import UPLOAD_WAIT_TIMEOUT, DRIVE_CREDENTIALS_FILE, DRIVE_SERVICE_ACCOUNT_FILE
+from utils.events import events
+from utils.metrics import metrics, timed
+from utils.upload_pool import UploadPool, PyDriveBackend
+
 console = Console()
 
 # Global drive instance
 _drive_instance = None
 
-def init_google_drive(project_root):
-    """Initialize Google Drive connection"""
+# Shared upload pool for the drive instance, started on first upload
+_upload_pool = None
+_upload_pool_lock = threading.Lock()
+
+def authenticate_drive(gauth, interactive=True):
+    """Authorize a GoogleAuth without a browser when possible
+
+    Uses the service account key in DRIVE_SERVICE_ACCOUNT_FILE if set,
+    otherwise the credentials saved in DRIVE_CREDENTIALS_FILE (refreshed
+    when expired). Only an interactive run falls back to the browser
+    sign-in; its result is saved for later headless runs.
+    """
+    if DRIVE_SERVICE_ACCOUNT_FILE:
+        from oauth2client.service_account import ServiceAccountCredentials
+
+        gauth.credentials = ServiceAccountCredentials.from_json_keyfile_name(
+            DRIVE_SERVICE_ACCOUNT_FILE, gauth.settings['oauth_scope']
+        )
+        gauth.Authorize()
+        return
+    if os.path.exists(DRIVE_CREDENTIALS_FILE):
+        gauth.LoadCredentialsFile(DRIVE_CREDENTIALS_FILE)
+    if gauth.credentials is None or (gauth.access_token_expired and gauth.credentials.refresh_token is None):
+        if not interactive:
+            raise RuntimeError(
+                f"No usable Google Drive credentials in {DRIVE_CREDENTIALS_FILE}. Sign in once with an "
+                "interactive run, set DRIVE_SERVICE_ACCOUNT_FILE, or run with --no-upload"
+            )
+        gauth.LocalWebserverAuth()
+    elif gauth.access_token_expired:
+        gauth.Refresh()
+        gauth.Authorize()
+    else:
+        gauth.Authorize()
+    gauth.SaveCredentialsFile(DRIVE_CREDENTIALS_FILE)
+
+def init_google_drive(project_root, interactive=True):
+    """Initialize Google Drive connection; headless runs pass interactive=False"""
+    from pydrive.auth import GoogleAuth
+    from pydrive.drive import GoogleDrive
+
     try:
         gauth = GoogleAuth()
         # Set path to client_secrets.json
         gauth.settings['client_config_file'] = os.path.join(project_root, 'client_secrets.json')
-        gauth.LocalWebserverAuth()
+        authenticate_drive(gauth, interactive)
         drive = GoogleDrive(gauth)
         set_google_drive_instance(drive)
         console.print("[green]✓ Google Drive initialized successfully[/green]")
@@ -27,39 +70,54 @@ def init_google_drive(project_root):
 def set_google_drive_instance(drive):
     """Set the global drive instance"""
     global _drive_instance
+    shutdown_upload_pool()
     _drive_instance = drive
 
 def get_drive_instance():
     """Get the global drive instance"""
     return _drive_instance
 
-def upload_file_to_drive(file_path):
-    """Upload a single file to Google Drive and return its link"""
+def get_upload_pool():
+    """Get the shared upload pool for the global drive instance, or None"""
+    global _upload_pool
+    with _upload_pool_lock:
+        if _upload_pool is None and _drive_instance is not None:
+            _upload_pool = UploadPool(PyDriveBackend(_drive_instance))
+            metrics.register_gauge("uploads_queued", lambda pool=_upload_pool: pool.queued)
+        return _upload_pool
+
+def set_upload_pool(pool):
+    """Use another upload pool for the global drive instance, e.g. one with a stand-in backend"""
+    global _upload_pool
+    shutdown_upload_pool()
+    with _upload_pool_lock:
+        _upload_pool = pool
+    metrics.register_gauge("uploads_queued", lambda: pool.queued)
+
+def shutdown_upload_pool():
+    """Wait for queued uploads and stop the shared upload pool"""
+    global _upload_pool
+    with _upload_pool_lock:
+        pool, _upload_pool = _upload_pool, None
+    if pool is not None:
+        pool.shutdown()
+
+def submit_upload(file_path=None, data=None, title=None, mime_type='image/png'):
+    """Queue a file or in-memory buffer for upload and return a future for its link"""
+    pool = get_upload_pool()
+    if not pool:
+        future = Future()
+        future.set_exception(Exception("Google Drive not initialized"))
+        return future
+    return pool.submit(path=file_path, data=data, title=title, mime_type=mime_type)
+
+@timed("upload_wait")
+def collect_upload(future, title, timeout=UPLOAD_WAIT_TIMEOUT):
+    """Wait for a queued upload and return its link, or None on failure or after timeout seconds"""
     try:
-        console.print(f"\n[yellow]Uploading {os.path.basename(file_path)} to Google Drive...[/yellow]")
-        drive = get_drive_instance()
-        if not drive:
-            raise Exception("Google Drive not initialized")
-
-        # Create file in Drive
-        file_drive = drive.CreateFile({
-            'title': os.path.basename(file_path)
-        })
-        file_drive.SetContentFile(file_path)
-        file_drive.Upload()
-        
-        # Make the file publicly accessible and get the link
-        file_drive.InsertPermission({
-            'type': 'anyone',
-            'value': 'anyone',
-            'role': 'reader'
-        })
-        
-        share_link = file_drive['alternateLink']
-        console.print(f"[green]✓ Successfully uploaded: {os.path.basename(file_path)}[/green]")
-        console.print(f"[green]🔗 File link: {share_link}[/green]")
-        
+        share_link = future.result(timeout=timeout)
+        events.info("upload", f"Uploaded {title}", link=share_link)
         return share_link
     except Exception as e:
-        console.print(f"[red]Error uploading file to Google Drive: {e}[/red]")
-        return None
\ No newline at end of file
+        events.error("upload", f"Error uploading {title} to Google Drive: {e}")
+        return None
@@ -0,0 +1,262 @@
+import json
+import os
+import sys
+import threading
+import time
+from collections import Counter, deque
+from queue import SimpleQueue, Empty
+
+from rich.console import Console
+from rich.markup import escape
+
+from config.settings import EVENT_RENDER_INTERVAL, EVENT_SUMMARY_INTERVAL
+
+# Statuses counted per (model, stage); the rest are messages
+QUEUED = "queued"
+STARTED = "started"
+RETRY = "retry"
+DONE = "done"
+FAILED = "failed"
+SKIPPED = "skipped"
+INFO = "info"
+WARNING = "warning"
+ERROR = "error"
+COUNTED = (QUEUED, STARTED, RETRY, DONE, FAILED, SKIPPED)
+
+# Pipeline stages in display order
+STAGES = ("job", "generate", "dedupe", "process", "upload", "catalog")
+
+_COLORS = {
+    DONE: "green", SKIPPED: "blue", RETRY: "yellow", WARNING: "yellow",
+    FAILED: "red", ERROR: "red", INFO: "cyan",
+}
+
+console = Console()
+
+# Queued by EventBus.stop() to end the renderer thread
+_STOP = object()
+
+def describe(event):
+    """One-line, markup-escaped description of an event"""
+    parts = [event["stage"]]
+    if event.get("model"):
+        parts.append(event["model"])
+    text = " ".join(parts) + f" {event['status']}"
+    detail = event.get("message") or event.get("error")
+    if detail:
+        text += f": {detail}"
+    if event.get("seconds") is not None:
+        text += f" ({event['seconds']:.1f}s)"
+    return escape(text)
+
+def print_event(event, target=None):
+    color = _COLORS.get(event["status"])
+    text = describe(event)
+    (target or console).print(f"[{color}]{text}[/{color}]" if color else text)
+
+class EventRenderer:
+    """Single consumer of pipeline events
+
+    Keeps queued/running/done/failed counts per model and stage, appends
+    every event to a JSON lines log, and draws them in one of three modes:
+    "live" redraws a counter table during batches, "plain" prints warnings,
+    errors and a periodic summary line, "quiet" prints nothing.
+    """
+
+    def __init__(self, events, mode="live", log_path=None, interval=EVENT_RENDER_INTERVAL,
+                 summary_interval=EVENT_SUMMARY_INTERVAL):
+        self.mode = mode
+        self.interval = interval
+        self.summary_interval = summary_interval
+        self.counts = {}
+        self.recent = deque(maxlen=6)
+        self._events = events
+        self._log = open(log_path, "a", encoding="utf-8") if log_path else None
+        self._live = None
+        self._dirty = False
+        self._last_summary = time.monotonic()
+        self._console = Console()
+        self._thread = threading.Thread(target=self._run, name="event-renderer", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            try:
+                batch = [self._events.get(timeout=self.interval)]
+            except Empty:
+                batch = []
+            # Drain whatever else arrived so one redraw covers it all
+            while True:
+                try:
+                    batch.append(self._events.get_nowait())
+                except Empty:
+                    break
+            stop = False
+            for event in batch:
+                if isinstance(event, threading.Event):
+                    # flush() marker: everything queued before it was handled
+                    self._redraw()
+                    if self._log:
+                        self._log.flush()
+                    event.set()
+                elif event is _STOP:
+                    stop = True
+                else:
+                    self._handle(event)
+            if self._log and batch:
+                self._log.flush()
+            self._redraw()
+            if stop:
+                self._stop_live()
+                if self._log:
+                    self._log.close()
+                return
+
+    def _handle(self, event):
+        if self._log:
+            self._log.write(json.dumps(event, default=str) + "\n")
+        stage, status = event["stage"], event["status"]
+        if stage == "batch":
+            if status == STARTED:
+                self.counts = {}
+                self.recent.clear()
+                self._start_live()
+            elif status in (DONE, FAILED):
+                self._redraw(force=True)
+                self._stop_live()
+            return
+        if status in COUNTED:
+            key = (event.get("model") or "-", stage)
+            self.counts.setdefault(key, Counter())[status] += 1
+            self._dirty = True
+        if status in (WARNING, ERROR, FAILED):
+            self.recent.append(event)
+            self._dirty = True
+            if self.mode == "plain" or (self.mode == "live" and self._live is None):
+                print_event(event, self._console)
+
+    def _start_live(self):
+        if self.mode != "live" or self._live is not None:
+            return
+        from rich.live import Live
+
+        self._live = Live(self._table(), console=self._console, auto_refresh=False, transient=False)
+        self._live.start()
+
+    def _stop_live(self):
+        if self._live is not None:
+            self._live.stop()
+            self._live = None
+
+    def _redraw(self, force=False):
+        if self._live is not None and (self._dirty or force):
+            self._live.update(self._table(), refresh=True)
+            self._dirty = False
+        elif self.mode == "plain" and self.counts and self._dirty:
+            now = time.monotonic()
+            if now - self._last_summary >= self.summary_interval:
+                self._last_summary = now
+                self._console.print(f"[blue]{escape(self.summary())}[/blue]")
+                self._dirty = False
+
+    def totals(self):
+        """Counts per stage summed over models"""
+        totals = {}
+        for (_, stage), counts in self.counts.items():
+            totals.setdefault(stage, Counter()).update(counts)
+        return totals
+
+    def summary(self):
+        parts = []
+        totals = self.totals()
+        for stage in sorted(totals, key=lambda name: STAGES.index(name) if name in STAGES else len(STAGES)):
+            counts = totals[stage]
+            running = counts[STARTED] - counts[DONE] - counts[FAILED] - counts[SKIPPED]
+            parts.append(f"{stage} {counts[DONE]} done/{max(running, 0)} running/{counts[FAILED]} failed")
+        return "; ".join(parts)
+
+    def _table(self):
+        from rich.console import Group
+        from rich.table import Table
+
+        table = Table(title="Pipeline", expand=False)
+        for column in ("Model", "Stage", "Queued", "Running", "Done", "Failed", "Skipped", "Retries"):
+            table.add_column(column, justify="left" if column in ("Model", "Stage") else "right")
+        order = sorted(self.counts, key=lambda key: (key[0], STAGES.index(key[1]) if key[1] in STAGES else len(STAGES)))
+        for model, stage in order:
+            counts = self.counts[(model, stage)]
+            finished = counts[DONE] + counts[FAILED] + counts[SKIPPED]
+            running = max(counts[STARTED] - finished, 0)
+            queued = max(counts[QUEUED] - counts[STARTED], 0) if counts[QUEUED] else 0
+            table.add_row(escape(model), stage, str(queued), str(running), str(counts[DONE]),
+                          str(counts[FAILED]), str(counts[SKIPPED]), str(counts[RETRY]))
+        recent = [
+            f"[{_COLORS[event['status']]}]{describe(event)}[/{_COLORS[event['status']]}]"
+            for event in self.recent
+        ]
+        return Group(table, *recent)
+
+    def join(self):
+        self._thread.join()
+
+class EventBus:
+    """Structured pipeline events from any thread
+
+    emit() only builds a dict and appends it to a SimpleQueue, so workers
+    never wait on the terminal; a single EventRenderer does the rest. Until
+    a renderer is started each event is printed as it is emitted.
+    """
+
+    def __init__(self):
+        self._queue = SimpleQueue()
+        self._renderer = None
+
+    @property
+    def renderer(self):
+        return self._renderer
+
+    def emit(self, stage, status, model=None, **fields):
+        event = {"ts": time.time(), "stage": stage, "status": status, "model": model, **fields}
+        if self._renderer is None:
+            if status not in (QUEUED, STARTED):
+                print_event(event)
+            return
+        self._queue.put(event)
+
+    def info(self, stage, message, model=None, **fields):
+        self.emit(stage, INFO, model, message=message, **fields)
+
+    def warning(self, stage, message, model=None, **fields):
+        self.emit(stage, WARNING, model, message=message, **fields)
+
+    def error(self, stage, message, model=None, **fields):
+        self.emit(stage, ERROR, model, message=message, **fields)
+
+    def start(self, mode="auto", log_path=None):
+        """Start the renderer; "auto" is live on a terminal and plain otherwise"""
+        if self._renderer is not None:
+            return self._renderer
+        if mode == "auto":
+            mode = "live" if sys.stdout.isatty() else "plain"
+        if log_path:
+            os.makedirs(os.path.dirname(os.path.abspath(log_path)), exist_ok=True)
+        self._renderer = EventRenderer(self._queue, mode, log_path)
+        return self._renderer
+
+    def flush(self, timeout=None):
+        """Wait until every event emitted so far has been rendered and logged"""
+        if self._renderer is None:
+            return True
+        marker = threading.Event()
+        self._queue.put(marker)
+        return marker.wait(timeout)
+
+    def stop(self):
+        """Render what is queued, close the log and go back to direct printing"""
+        renderer, self._renderer = self._renderer, None
+        if renderer is not None:
+            self._queue.put(_STOP)
+            renderer.join()
+
+# Global event bus shared by every pipeline stage
+events = EventBus()
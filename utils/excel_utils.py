@@ -1,12 +1,55 @@
-import pandas as pd
 import os
-from datetime import datetime
-from openpyxl.styles import Alignment
+import tempfile
+import threading
 
+from config.settings import CATALOG_DB_PATH
+from utils.catalog_store import CatalogStore, CATALOG_COLUMNS
+from utils.events import events
+from utils.metrics import timed
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(__file__))
+CATALOG_EXCEL_PATH = os.path.join(PROJECT_ROOT, "product_catalog.xlsx")
+
+# Global catalog store, opened on first use
+_catalog_store = None
+_catalog_store_lock = threading.Lock()
+
+def get_catalog_store():
+    """Get the global catalog journal, importing an existing workbook on first use"""
+    global _catalog_store
+    with _catalog_store_lock:
+        if _catalog_store is None:
+            _catalog_store = CatalogStore(CATALOG_DB_PATH)
+            imported = _catalog_store.import_excel(CATALOG_EXCEL_PATH)
+            if imported:
+                events.info("catalog", f"Imported {imported} rows from {CATALOG_EXCEL_PATH} into {CATALOG_DB_PATH}")
+        return _catalog_store
+
+def set_catalog_store(store):
+    """Use another catalog store, e.g. a temporary one; returns the previous store"""
+    global _catalog_store
+    with _catalog_store_lock:
+        previous, _catalog_store = _catalog_store, store
+    return previous
+
+def shutdown_catalog_store():
+    """Commit queued rows and close the global catalog store"""
+    global _catalog_store
+    with _catalog_store_lock:
+        store, _catalog_store = _catalog_store, None
+    if store is not None:
+        store.close()
+
+@timed("catalog")
 def update_product_catalog(product_name, prompt, folder_path, raw_path, drive_link, raw_drive_link):
     """
-    Create or update an Excel file with product information.
-    
+    Append product information to the catalog journal.
+
+    Returns once the row is committed, so a job can be marked catalogued.
+
+    The formatted Excel file is written by export_product_catalog, once per
+    batch, rather than on every image.
+
     Args:
         product_name (str): Name of the product
         prompt (str): The prompt used to generate the image
@@ -15,25 +58,6 @@ def update_product_catalog(product_name, prompt, folder_path, raw_path, drive_li
         drive_link (str): Google Drive sharing link
         raw_drive_link (str): Google Drive sharing link for the raw image
     """
-    excel_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), "product_catalog.xlsx")
-    
-    print(f"\n[yellow]Excel Catalog Operations:[/yellow]")
-    print(f"📁 Excel file location: {excel_path}")
-    print(f"📝 Updating catalog for: {product_name}")
-    
-    # Create new DataFrame if file doesn't exist
-    if not os.path.exists(excel_path):
-        print(f"[yellow]Creating new Excel catalog: {excel_path}[/yellow]")
-        df = pd.DataFrame(columns=[
-            'Product Name', 'Category', 'Prompts', 
-            'Raw Folder Path', 'Processed Folder Path', 
-            'Google Drive Link', 'Raw Google Drive Link', 'Created Date'
-        ])
-    else:
-        print(f"[blue]Updating existing catalog: {excel_path}[/blue]")
-        df = pd.read_excel(excel_path)
-    
-    # Prepare new row
     new_row = {
         'Product Name': product_name,
         'Category': "Seamless Pattern",
@@ -42,48 +66,74 @@ def update_product_catalog(product_name, prompt, folder_path, raw_path, drive_li
         'Processed Folder Path': folder_path,
         'Google Drive Link': drive_link,
         'Raw Google Drive Link': raw_drive_link,
-        'Created Date': datetime.now().strftime("%Y-%m-%d %H:%M:%S")
     }
-    
-    # Print row details
-    print("\n[cyan]Adding new entry:[/cyan]")
-    for key, value in new_row.items():
-        print(f"{key}: {value}")
-    
-    # Append new row to DataFrame
-    df = pd.concat([df, pd.DataFrame([new_row])], ignore_index=True)
-    
+    get_catalog_store().append(new_row, wait=True)
+    events.info("catalog", f"Catalog entry saved for: {product_name}")
+    return CATALOG_DB_PATH
+
+@timed("catalog_export")
+def export_product_catalog(excel_path=CATALOG_EXCEL_PATH):
+    """
+    Write the whole catalog journal to a formatted Excel file.
+
+    Args:
+        excel_path (str): Destination workbook path
+    """
+    from openpyxl import Workbook
+    from openpyxl.cell import WriteOnlyCell
+    from openpyxl.styles import Alignment
+
+    store = get_catalog_store()
+    events.info("catalog", f"Exporting Excel catalog to: {excel_path}")
+
+    # Column widths
+    column_widths = {
+        'A': 30,  # Product Name
+        'B': 20,  # Category
+        'C': 50,  # Prompts
+        'D': 40,  # Raw Folder Path
+        'E': 40,  # Processed Folder Path
+        'F': 50,  # Google Drive Link
+        'G': 50,  # Raw Google Drive Link
+        'H': 20   # Created Date
+    }
+    alignment = Alignment(horizontal='center', vertical='center')
+
+    # Write-only mode streams rows to disk instead of building the sheet in memory
+    workbook = Workbook(write_only=True)
+    worksheet = workbook.create_sheet('Sheet1')
+    for column, width in column_widths.items():
+        worksheet.column_dimensions[column].width = width
+
+    def centered(values):
+        cells = []
+        for value in values:
+            cell = WriteOnlyCell(worksheet, value=value)
+            cell.alignment = alignment
+            cells.append(cell)
+        return cells
+
+    worksheet.append(centered(CATALOG_COLUMNS))
+    total = 0
+    for row in store.iter_rows():
+        worksheet.append(centered(row[column] for column in CATALOG_COLUMNS))
+        total += 1
+
     try:
-        # Save to Excel with formatting
-        with pd.ExcelWriter(excel_path, engine='openpyxl') as writer:
-            df.to_excel(writer, index=False)
-            worksheet = writer.sheets['Sheet1']
-            
-            # Set column widths
-            column_widths = {
-                'A': 30,  # Product Name
-                'B': 20,  # Category
-                'C': 50,  # Prompts
-                'D': 40,  # Raw Folder Path
-                'E': 40,  # Processed Folder Path
-                'F': 50,  # Google Drive Link
-                'G': 50,  # Raw Google Drive Link
-                'H': 20   # Created Date
-            }
-            
-            # Apply formatting
-            for column, width in column_widths.items():
-                worksheet.column_dimensions[column].width = width
-                
-            # Center align all cells
-            for row in worksheet.iter_rows():
-                for cell in row:
-                    cell.alignment = Alignment(horizontal='center', vertical='center')
-            
-        print(f"[green]✓ Successfully updated Excel catalog: {excel_path}[/green]")
-        print(f"[green]✓ Total entries in catalog: {len(df)}[/green]")
+        # Write to a temporary file first so a failed export never truncates the old one;
+        # its name is unique so processes exporting at the same time never share it
+        fd, tmp_path = tempfile.mkstemp(suffix=".xlsx.tmp", dir=os.path.dirname(os.path.abspath(excel_path)))
+        os.close(fd)
+        try:
+            workbook.save(tmp_path)
+            os.replace(tmp_path, excel_path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        events.info("catalog", f"Exported Excel catalog: {excel_path}", entries=total)
     except Exception as e:
-        print(f"[red]Error saving Excel file: {e}[/red]")
+        events.error("catalog", f"Error saving Excel file: {e}")
         raise
-    
-    return excel_path 
\ No newline at end of file
+
+    return excel_path
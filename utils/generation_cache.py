@@ -0,0 +1,123 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+
+from config.settings import GENERATION_CACHE_DIR, GENERATION_CACHE_MAX_BYTES, DATABASE_JOURNAL_MODE
+
+def generation_key(model_id, prompt, seed):
+    """Content address of one inference call"""
+    raw = f"{model_id}\x00{prompt}\x00{seed}"
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+class GenerationCache:
+    """On-disk cache of generated images keyed by (model ID, final prompt, seed)
+
+    Images are stored as PNG files named by their key. A SQLite index
+    tracks sizes and last use, and the least recently used entries are
+    evicted once the cache grows past max_bytes.
+    """
+
+    def __init__(self, cache_dir=GENERATION_CACHE_DIR, max_bytes=GENERATION_CACHE_MAX_BYTES,
+                 journal_mode=DATABASE_JOURNAL_MODE):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        os.makedirs(cache_dir, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(os.path.join(cache_dir, "index.db"), timeout=30, check_same_thread=False)
+        self._conn.execute(f"PRAGMA journal_mode={journal_mode}")
+        with self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS entries ("
+                "key TEXT PRIMARY KEY, size INTEGER, last_used REAL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS entries_last_used ON entries (last_used)")
+        self.total_bytes = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+        self.hits = 0
+        self.misses = 0
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, key[:2], f"{key}.png")
+
+    def get(self, key):
+        """Cached image for a key as a loaded PIL image, or None"""
+        from PIL import Image
+
+        path = self._path(key)
+        try:
+            with Image.open(path) as img:
+                img.load()
+        except (OSError, ValueError):
+            with self._lock:
+                self.misses += 1
+                self._forget(key)
+            return None
+        with self._lock:
+            self.hits += 1
+            with self._conn:
+                self._conn.execute("UPDATE entries SET last_used = ? WHERE key = ?", (time.time(), key))
+        return img
+
+    def put(self, key, data):
+        """Store encoded PNG bytes for a key, evicting old entries if over budget"""
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Unique per process and thread, since several runs may share the cache directory
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.part"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        with self._lock:
+            self._forget(key)
+            with self._conn:
+                self._conn.execute("INSERT OR REPLACE INTO entries VALUES (?, ?, ?)", (key, len(data), time.time()))
+            self.total_bytes += len(data)
+            self._evict()
+
+    def _forget(self, key):
+        row = self._conn.execute("SELECT size FROM entries WHERE key = ?", (key,)).fetchone()
+        if row:
+            with self._conn:
+                self._conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+            self.total_bytes -= row[0]
+
+    def _evict(self):
+        # Other processes may share the cache, so re-read the total from the index
+        self.total_bytes = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+        while self.total_bytes > self.max_bytes:
+            row = self._conn.execute("SELECT key, size FROM entries ORDER BY last_used LIMIT 1").fetchone()
+            if row is None:
+                return
+            key, size = row
+            with self._conn:
+                self._conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+            self.total_bytes -= size
+            try:
+                os.remove(self._path(key))
+            except FileNotFoundError:
+                pass
+
+    def close(self):
+        self._conn.close()
+
+# Global generation cache, opened on first use
+_generation_cache = None
+_generation_cache_lock = threading.Lock()
+
+def get_generation_cache():
+    """Get the shared generation cache, or None when caching is turned off"""
+    global _generation_cache
+    if not GENERATION_CACHE_MAX_BYTES:
+        return None
+    with _generation_cache_lock:
+        if _generation_cache is None:
+            _generation_cache = GenerationCache()
+        return _generation_cache
+
+def set_generation_cache(cache):
+    """Use another generation cache, e.g. a temporary one; returns the previous cache"""
+    global _generation_cache
+    with _generation_cache_lock:
+        previous, _generation_cache = _generation_cache, cache
+    return previous
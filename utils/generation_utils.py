@@ -1,74 +1,247 @@
-from threading import Thread
-from queue import Queue
+from contextlib import contextmanager
+from threading import Lock
+import hashlib
+import itertools
+import threading
 import time
 import os
-from rich.console import Console
-from rich.progress import Progress, SpinnerColumn, TextColumn
 
-console = Console()
+from config.settings import GENERATION_TIMEOUT, SEED_RANGE
+from utils.paths import image_filename
+from utils.image_processor import encode_png
+from utils.generation_cache import generation_key, get_generation_cache
+from utils.events import events, STARTED, RETRY, DONE, FAILED, SKIPPED
+from utils.metrics import metrics, timed
+from utils.model_stats import record_latency
+from utils.retry_policy import (
+    default_retry_policy,
+    get_circuit_breaker,
+    classify_error,
+    retry_after,
+    CircuitOpenError,
+)
 
-def generate_with_timeout(client, prompt, timeout=60):
-    """Generate image in a thread with timeout"""
-    result_queue = Queue()
-    thread = Thread(target=lambda: result_queue.put(client.text_to_image(prompt)))
-    thread.daemon = True
-    
-    thread.start()
-    thread.join(timeout=timeout)
-    
-    if thread.is_alive():
-        return None
-    
-    try:
-        return result_queue.get_nowait()
-    except:
+def is_timeout_error(error):
+    """True for timeouts raised by the HTTP transport (httpx, requests) or Python"""
+    return isinstance(error, TimeoutError) or "timeout" in type(error).__name__.lower()
+
+class RequestTracker:
+    """Counts inference requests so long runs can report in-flight and overdue calls"""
+
+    def __init__(self):
+        self._lock = Lock()
+        self._ids = itertools.count()
+        self._active = {}
+        self.completed = 0
+        self.failed = 0
+        self.timed_out = 0
+
+    @contextmanager
+    def track(self, deadline=None):
+        """Count one request for the duration of the block"""
+        request_id = next(self._ids)
+        with self._lock:
+            self._active[request_id] = (time.monotonic(), deadline)
+        try:
+            yield
+        except Exception as e:
+            with self._lock:
+                if is_timeout_error(e):
+                    self.timed_out += 1
+                else:
+                    self.failed += 1
+            raise
+        else:
+            with self._lock:
+                self.completed += 1
+        finally:
+            with self._lock:
+                del self._active[request_id]
+
+    def snapshot(self):
+        """Current counters; overdue requests are still open past their deadline"""
+        now = time.monotonic()
+        with self._lock:
+            overdue = sum(
+                1 for started, deadline in self._active.values()
+                if deadline is not None and now - started > deadline
+            )
+            return {
+                "in_flight": len(self._active),
+                "overdue": overdue,
+                "completed": self.completed,
+                "failed": self.failed,
+                "timed_out": self.timed_out,
+                "threads": threading.active_count(),
+            }
+
+# Global request tracker shared by generation and warm-up
+request_tracker = RequestTracker()
+metrics.register_gauge("inference_in_flight", lambda: request_tracker.snapshot()["in_flight"])
+
+def request_image(client, prompt):
+    """Call the inference API on the current thread
+
+    The deadline is enforced by the client's HTTP transport (the timeout it
+    was created with), so a timed out request raises and its connection is
+    closed instead of being left running on a background thread.
+    """
+    deadline = getattr(client, "timeout", None)
+    with request_tracker.track(deadline):
+        return client.text_to_image(prompt)
+
+def request_unless_cancelled(client, prompt, cancel, breaker):
+    """Call the inference API unless the attempt was cancelled while it waited
+
+    Returns None without a request once cancel is set, handing the
+    breaker's call back so a half-open circuit can still be tried.
+    """
+    if cancel is not None and cancel.is_set():
+        breaker.skip_call()
         return None
+    return request_image(client, prompt)
+
+def job_seed(prompt, duplicate_index, model_name):
+    """Deterministic seed for a (prompt, duplicate index, model) job
 
-def get_model_specific_prompt(base_prompt):
+    The base seed comes from a hash of the prompt and model, and each
+    duplicate takes the next one, so copies of a prompt never share a seed.
+    """
+    digest = hashlib.sha256(f"{model_name}\x00{prompt}".encode("utf-8")).digest()
+    return (int.from_bytes(digest[:8], "big") + duplicate_index) % SEED_RANGE
+
+def get_model_specific_prompt(base_prompt, seed):
     """Add model-specific modifications to the prompt"""
-    timestamp_seed = int(time.time() * 1000) % 1000000
-    return f"{base_prompt} --seed {timestamp_seed}"
+    return f"{base_prompt} --seed {seed}"
 
-def generate_single_image(model_name, client, prompt, output_dir, timestamp, progress=None):
-    """Generate and save a single image with retry logic"""
-    unique_prompt = get_model_specific_prompt(prompt)
-    console.print(f"[cyan]Using model: {model_name}[/cyan]")
-    console.print(f"[cyan]Modified prompt: {unique_prompt}[/cyan]")
-    
-    max_retries = 6
-    timeout = 120
-    retry_delay = 3
-
-    for attempt in range(max_retries):
-        if progress:
-            if 'task_id' in locals():
-                progress.remove_task(task_id)
-            task_id = progress.add_task(
-                f"Generating {model_name} image (attempt {attempt + 1}/{max_retries})...", 
-                total=None
-            )
+def cached_generation(model_name, client, unique_prompt, seed):
+    """Cache key for a call and the cached image, if any"""
+    cache = get_generation_cache()
+    if cache is None:
+        return None, None
+    key = generation_key(getattr(client, "model", None) or model_name, unique_prompt, seed)
+    return key, cache.get(key)
 
-        try:
-            image = generate_with_timeout(client, unique_prompt, timeout)
-            
-            if image is None:
-                raise TimeoutError(f"Generation timed out after {timeout} seconds")
-            
-            image_path = os.path.join(output_dir, f"{model_name.lower()}_{timestamp}.png")
-            image.save(image_path)
-            
-            if progress:
-                progress.remove_task(task_id)
-                
-            console.print(f"[green]✓ {model_name} image generated successfully![/green]")
-            return image_path
+# Set on a freshly generated image until its raw PNG is encoded and cached
+_CACHE_KEY_INFO = "generation_cache_key"
 
+def store_generation(key, data):
+    """Cache the raw PNG bytes of a generated image"""
+    if key is not None:
+        try:
+            get_generation_cache().put(key, data)
         except Exception as e:
-            if attempt < max_retries - 1:
-                console.print(f"[yellow]{model_name}: Attempt {attempt + 1} failed: {str(e)}. Retrying...[/yellow]")
-                time.sleep(retry_delay)
-            else:
-                if progress:
-                    progress.update(task_id, description=f"✗ {model_name} failed!", completed=True)
-                console.print(f"[red]Failed to generate image with {model_name} after {max_retries} attempts: {str(e)}[/red]")
-                return None 
\ No newline at end of file
+            events.warning("generate", f"Could not cache generated image: {e}")
+
+def encode_generated(image, cache_key=None):
+    """Raw PNG bytes of a generated image, stored in the generation cache as well
+
+    generate_image leaves a fresh image's cache key on the image, so the
+    one PNG encode of the raw output also fills the cache.
+    """
+    data = encode_png(image)
+    store_generation(cache_key or image.info.pop(_CACHE_KEY_INFO, None), data)
+    return data
+
+def save_generated(image, path, cache_key=None):
+    """Write a generated image with the raw output settings, caching the same bytes"""
+    data = encode_generated(image, cache_key)
+    with open(path, "wb") as f:
+        f.write(data)
+
+def describe_failure(error, client):
+    """Readable message for a failed inference attempt"""
+    if is_timeout_error(error):
+        return f"Generation timed out after {getattr(client, 'timeout', None) or GENERATION_TIMEOUT} seconds"
+    return str(error)
+
+@timed("generate")
+def generate_image(model_name, client, prompt, limiter=None, retry_policy=default_retry_policy, duplicate_index=0,
+                   cancel=None):
+    """Generate a single image in memory with retry logic
+
+    Attempts follow the retry policy (exponential backoff with jitter,
+    Retry-After, no retries for permanent errors) and consult the model's
+    shared circuit breaker first. When a limiter is given, every attempt
+    waits for a request slot from the model's rate limiter. Images already
+    in the generation cache are returned without an inference call. Once
+    the cancel event is set no further attempt is made and None is returned.
+    """
+    seed = job_seed(prompt, duplicate_index, model_name)
+    unique_prompt = get_model_specific_prompt(prompt, seed)
+    started_at = time.perf_counter()
+    events.emit("generate", STARTED, model_name, prompt=unique_prompt)
+    cache_key, image = cached_generation(model_name, client, unique_prompt, seed)
+    if image is not None:
+        events.emit("generate", DONE, model_name, message="served from the generation cache", cached=True,
+                    seconds=time.perf_counter() - started_at)
+        return image
+    
+    breaker = get_circuit_breaker(model_name)
+    max_retries = retry_policy.max_attempts
+    attempt_number = 0
+    image = None
+
+    try:
+        for attempt in retry_policy.retrying():
+            with attempt:
+                attempt_number = attempt.retry_state.attempt_number
+                if cancel is not None and cancel.is_set():
+                    break
+                # Wait out a shared pause; an open circuit is retried once it reopens
+                try:
+                    pause = breaker.before_call()
+                except CircuitOpenError as e:
+                    if attempt_number < max_retries:
+                        events.emit("generate", RETRY, model_name, attempt=attempt_number, kind="circuit_open",
+                                    error=str(e))
+                    raise
+                time.sleep(pause)
+                started = time.perf_counter()
+                try:
+                    if limiter:
+                        with limiter.slot():
+                            image = request_unless_cancelled(client, unique_prompt, cancel, breaker)
+                    else:
+                        image = request_unless_cancelled(client, unique_prompt, cancel, breaker)
+                except Exception as e:
+                    record_latency(model_name, time.perf_counter() - started, ok=False)
+                    kind = classify_error(e)
+                    breaker.record_failure(kind, retry_after(e))
+                    metrics.inc("inference_failures", model=model_name, kind=kind)
+                    if retry_policy.should_retry(e) and attempt_number < max_retries:
+                        metrics.inc("inference_retries", model=model_name)
+                        events.emit("generate", RETRY, model_name, attempt=attempt_number, kind=kind,
+                                    error=describe_failure(e, client))
+                    raise
+                if image is None:
+                    # Cancelled while waiting for the breaker or a request slot
+                    break
+                record_latency(model_name, time.perf_counter() - started, ok=True)
+                metrics.observe("inference", time.perf_counter() - started, model=model_name)
+                breaker.record_success()
+        
+        if cancel is not None and cancel.is_set() and image is None:
+            events.emit("generate", SKIPPED, model_name, message="cancelled, another model answered first")
+            return None
+
+        events.emit("generate", DONE, model_name, attempts=attempt_number, seconds=time.perf_counter() - started_at)
+        if cache_key is not None:
+            # Cached by whoever encodes the raw PNG (encode_generated)
+            image.info[_CACHE_KEY_INFO] = cache_key
+        return image
+
+    except Exception as e:
+        events.emit("generate", FAILED, model_name, attempts=attempt_number, error=describe_failure(e, client),
+                    seconds=time.perf_counter() - started_at)
+        return None
+
+def generate_single_image(model_name, client, prompt, output_dir, job_id, limiter=None, duplicate_index=0):
+    """Generate and save a single image with retry logic"""
+    image = generate_image(model_name, client, prompt, limiter, duplicate_index=duplicate_index)
+    if image is None:
+        return None
+
+    image_path = os.path.join(output_dir, image_filename(model_name, job_id))
+    save_generated(image, image_path)
+    return image_path
@@ -0,0 +1,398 @@
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from functools import lru_cache
+from urllib.parse import urlsplit
+
+from config.settings import (
+    HTTP_MAX_CONNECTIONS,
+    HTTP_MAX_KEEPALIVE,
+    HTTP_KEEPALIVE_EXPIRY,
+    HTTP_MAX_PER_HOST,
+    HTTP_HOST_LIMITS,
+    HTTP2_ENABLED,
+    HTTP_STATS_INTERVAL,
+)
+from utils.events import events
+from utils.metrics import metrics
+
+# Host the Drive v2 API (uploads and permission batches) is served from
+DRIVE_API_HOST = "www.googleapis.com"
+
+def host_limit(host):
+    """Concurrent requests allowed to a host"""
+    return HTTP_HOST_LIMITS.get(host, HTTP_MAX_PER_HOST)
+
+def http2_available():
+    """HTTP/2 is used when enabled and the h2 package is installed"""
+    if not HTTP2_ENABLED:
+        return False
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+class ConnectionStats:
+    """Requests and newly opened connections per host
+
+    Every request made with nothing new opened went over a kept-alive
+    connection. While requests are being made a line per host is emitted
+    as an "http" event every interval seconds.
+    """
+
+    def __init__(self, interval=HTTP_STATS_INTERVAL):
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._hosts = {}
+        self._last_report = time.monotonic()
+
+    def _host(self, host):
+        stats = self._hosts.get(host)
+        if stats is None:
+            stats = self._hosts[host] = {"requests": 0, "connections": 0, "failed": 0, "protocols": Counter()}
+        return stats
+
+    def record_connection(self, host):
+        with self._lock:
+            self._host(host)["connections"] += 1
+        metrics.inc("http_connections_opened", host=host)
+
+    def record_request(self, host, protocol=None, failed=False):
+        now = time.monotonic()
+        with self._lock:
+            stats = self._host(host)
+            stats["requests"] += 1
+            if failed:
+                stats["failed"] += 1
+            elif protocol:
+                stats["protocols"][protocol] += 1
+            due = bool(self.interval) and now - self._last_report >= self.interval
+            if due:
+                self._last_report = now
+        metrics.inc("http_requests", host=host)
+        if due:
+            self.report()
+
+    def reset(self):
+        with self._lock:
+            self._hosts = {}
+            self._last_report = time.monotonic()
+
+    def snapshot(self):
+        """Counts per host, with how many requests reused a connection"""
+        with self._lock:
+            hosts = {host: dict(stats, protocols=dict(stats["protocols"])) for host, stats in self._hosts.items()}
+        for stats in hosts.values():
+            stats["reused"] = max(stats["requests"] - stats["connections"], 0)
+        return hosts
+
+    def summary_lines(self):
+        lines = []
+        for host, stats in sorted(self.snapshot().items()):
+            requests = stats["requests"]
+            reuse = stats["reused"] / requests if requests else 0.0
+            protocols = ", ".join(sorted(stats["protocols"])) or "-"
+            lines.append(
+                f"{host}: {requests} requests over {stats['connections']} new connections "
+                f"({reuse:.0%} reused, {stats['failed']} failed, {protocols})"
+            )
+        return lines
+
+    def report(self):
+        """Emit the counts so far as one "http" event per host"""
+        for line, (host, stats) in zip(self.summary_lines(), sorted(self.snapshot().items())):
+            events.info("http", line, host=host, requests=stats["requests"], connections=stats["connections"],
+                        reused=stats["reused"], failed=stats["failed"])
+
+# Connection counts for every pooled client in this process
+connection_stats = ConnectionStats()
+
+class HostLimiter:
+    """One bounded semaphore per host, created on first use"""
+
+    def __init__(self, limit=host_limit):
+        self._limit = limit
+        self._lock = threading.Lock()
+        self._slots = {}
+
+    def slot(self, host):
+        with self._lock:
+            slot = self._slots.get(host)
+            if slot is None:
+                slot = self._slots[host] = threading.BoundedSemaphore(self._limit(host))
+            return slot
+
+@lru_cache(maxsize=None)
+def _transport_types(httpx):
+    """Transport wrappers for the httpx package huggingface_hub was built on
+
+    httpx checks response streams against its own base classes, so the
+    wrappers are defined once per httpx module rather than at import time.
+    """
+
+    class ReleasingStream(httpx.SyncByteStream):
+        """Response body that frees its host slot once read or closed"""
+
+        def __init__(self, stream, release):
+            self._stream = stream
+            self._release = release
+
+        def __iter__(self):
+            yield from self._stream
+
+        def close(self):
+            try:
+                self._stream.close()
+            finally:
+                release, self._release = self._release, None
+                if release is not None:
+                    release()
+
+    class PooledTransport(httpx.BaseTransport):
+        """HTTPTransport with per-host request limits and connection stats"""
+
+        def __init__(self, transport, stats, limiter):
+            self._transport = transport
+            self._stats = stats
+            self._limiter = limiter
+
+        def handle_request(self, request):
+            host = request.url.host
+            slot = self._limiter.slot(host)
+            wait = (request.extensions.get("timeout") or {}).get("pool")
+            if not slot.acquire(timeout=wait):
+                raise httpx.PoolTimeout(f"No free connection slot for {host}", request=request)
+            request.extensions["trace"] = _connection_trace(self._stats, host)
+            try:
+                response = self._transport.handle_request(request)
+            except BaseException:
+                slot.release()
+                self._stats.record_request(host, failed=True)
+                raise
+            self._stats.record_request(host, _protocol(response))
+            response.stream = ReleasingStream(response.stream, slot.release)
+            return response
+
+        def close(self):
+            self._transport.close()
+
+    class AsyncPooledTransport(httpx.AsyncBaseTransport):
+        """AsyncHTTPTransport reporting connection stats
+
+        Async clients are created per model client and run on one event
+        loop, so their per-host cap is the pool's max_connections.
+        """
+
+        def __init__(self, transport, stats):
+            self._transport = transport
+            self._stats = stats
+
+        async def handle_async_request(self, request):
+            host = request.url.host
+            trace = _connection_trace(self._stats, host)
+
+            async def async_trace(name, info):
+                trace(name, info)
+
+            request.extensions["trace"] = async_trace
+            try:
+                response = await self._transport.handle_async_request(request)
+            except BaseException:
+                self._stats.record_request(host, failed=True)
+                raise
+            self._stats.record_request(host, _protocol(response))
+            return response
+
+        async def aclose(self):
+            await self._transport.aclose()
+
+    return PooledTransport, AsyncPooledTransport
+
+def _connection_trace(stats, host):
+    """httpcore trace callback counting connections opened for a request"""
+    def trace(name, info):
+        if name == "connection.connect_tcp.complete":
+            stats.record_connection(host)
+    return trace
+
+def _protocol(response):
+    version = response.extensions.get("http_version", b"")
+    return version.decode("ascii", "replace") if isinstance(version, bytes) else str(version or "")
+
+def _httpx_limits(httpx, max_connections=HTTP_MAX_CONNECTIONS):
+    return httpx.Limits(
+        max_connections=max_connections,
+        max_keepalive_connections=min(HTTP_MAX_KEEPALIVE, max_connections),
+        keepalive_expiry=HTTP_KEEPALIVE_EXPIRY,
+    )
+
+def make_httpx_client_factories(httpx, stats=connection_stats, limiter=None, hooks=None, async_hooks=None):
+    """(sync, async) client factories sharing limits, HTTP/2 and stats
+
+    hooks are the event hooks huggingface_hub's default clients install.
+    """
+    PooledTransport, AsyncPooledTransport = _transport_types(httpx)
+    limiter = limiter or HostLimiter()
+    http2 = http2_available()
+
+    def client_factory():
+        transport = httpx.HTTPTransport(http2=http2, limits=_httpx_limits(httpx))
+        return httpx.Client(transport=PooledTransport(transport, stats, limiter), event_hooks=hooks or {},
+                            follow_redirects=True, timeout=None)
+
+    def async_client_factory():
+        transport = httpx.AsyncHTTPTransport(http2=http2, limits=_httpx_limits(httpx, HTTP_MAX_PER_HOST))
+        return httpx.AsyncClient(transport=AsyncPooledTransport(transport, stats), event_hooks=async_hooks or {},
+                                 follow_redirects=True, timeout=None)
+
+    return client_factory, async_client_factory
+
+def make_requests_session(stats=connection_stats, limiter=None):
+    """requests Session with the same keep-alive pool, limits and stats (huggingface_hub < 1.0)"""
+    import requests
+    from requests.adapters import HTTPAdapter
+    from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+    limiter = limiter or HostLimiter()
+
+    def counting_pool(base):
+        class CountingPool(base):
+            def _new_conn(self):
+                stats.record_connection(self.host)
+                return super()._new_conn()
+        return CountingPool
+
+    class PooledAdapter(HTTPAdapter):
+        def init_poolmanager(self, *args, **kwargs):
+            super().init_poolmanager(*args, **kwargs)
+            self.poolmanager.pool_classes_by_scheme = {
+                "http": counting_pool(HTTPConnectionPool),
+                "https": counting_pool(HTTPSConnectionPool),
+            }
+
+        def send(self, request, **kwargs):
+            host = urlsplit(request.url).hostname
+            with limiter.slot(host):
+                try:
+                    response = super().send(request, **kwargs)
+                    if not kwargs.get("stream"):
+                        # Read the body here so the connection is back in the pool before the slot is freed
+                        response.content
+                except Exception:
+                    stats.record_request(host, failed=True)
+                    raise
+            stats.record_request(host, "HTTP/1.1")
+            return response
+
+    session = requests.Session()
+    adapter = PooledAdapter(pool_connections=HTTP_MAX_KEEPALIVE, pool_maxsize=HTTP_MAX_PER_HOST)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+_configured = None
+_configure_lock = threading.Lock()
+
+def configure_inference_http():
+    """Make every InferenceClient share the pooled HTTP client; returns the backend name
+
+    huggingface_hub >= 1.0 keeps one process-wide httpx client (httpx2 in
+    later releases) built by a client factory; earlier releases keep a
+    requests Session per thread built by an HTTP backend factory.
+    """
+    global _configured
+    with _configure_lock:
+        if _configured is not None:
+            return _configured
+        from huggingface_hub.utils import _http
+
+        if hasattr(_http, "set_client_factory"):
+            httpx = getattr(_http, "httpx2", None) or _http.httpx
+            hooks = {"request": [_http.hf_request_event_hook]} if hasattr(_http, "hf_request_event_hook") else {}
+            async_hooks = {}
+            for name, hook in (("request", "async_hf_request_event_hook"), ("response", "async_hf_response_event_hook")):
+                if hasattr(_http, hook):
+                    async_hooks[name] = [getattr(_http, hook)]
+            client_factory, async_client_factory = make_httpx_client_factories(httpx, hooks=hooks,
+                                                                               async_hooks=async_hooks)
+            _http.set_client_factory(client_factory)
+            _http.set_async_client_factory(async_client_factory)
+            _configured = f"{httpx.__name__}, HTTP/2 {'on' if http2_available() else 'off'}"
+        else:
+            # Sessions are per thread; the limiter and stats are shared
+            limiter = HostLimiter()
+            _http.configure_http_backend(backend_factory=lambda: make_requests_session(limiter=limiter))
+            _configured = "requests, HTTP/1.1"
+        return _configured
+
+class HttpObjectPool:
+    """Bounded pool of httplib2.Http objects shared by every thread
+
+    httplib2 keeps one keep-alive connection per host inside each Http object
+    but is not thread-safe, so a caller checks one out for its requests and
+    returns it. The most recently returned one is handed out first, so its
+    connection is still open; size caps the connections to the host.
+    """
+
+    def __init__(self, factory, size, stats=connection_stats):
+        self.size = size
+        self._factory = factory
+        self._stats = stats
+        self._idle = []
+        self._created = 0
+        self._available = threading.Condition()
+
+    @contextmanager
+    def connection(self):
+        http = self._acquire()
+        try:
+            yield http
+        finally:
+            with self._available:
+                self._idle.append(http)
+                self._available.notify()
+
+    def _acquire(self):
+        with self._available:
+            while not self._idle and self._created >= self.size:
+                self._available.wait()
+            if self._idle:
+                return self._idle.pop()
+            self._created += 1
+        try:
+            return self._track(self._factory())
+        except BaseException:
+            with self._available:
+                self._created -= 1
+                self._available.notify()
+            raise
+
+    def _track(self, http):
+        """Count requests, and connections httplib2 has to (re)open for them"""
+        request = http.request
+        stats = self._stats
+
+        def tracked_request(uri, *args, **kwargs):
+            parts = urlsplit(uri)
+            connection = http.connections.get(f"{parts.scheme}:{parts.netloc.lower()}")
+            if connection is None or getattr(connection, "sock", None) is None:
+                stats.record_connection(parts.hostname)
+            try:
+                result = request(uri, *args, **kwargs)
+            except Exception:
+                stats.record_request(parts.hostname, failed=True)
+                raise
+            stats.record_request(parts.hostname, "HTTP/1.1")
+            return result
+
+        http.request = tracked_request
+        return http
+
+    def close(self):
+        with self._available:
+            idle, self._idle = self._idle, []
+            self._created -= len(idle)
+        for http in idle:
+            http.close()
@@ -1,56 +1,328 @@
-from PIL import Image
+import io
 import os
-import shutil
-import pathlib
 import logging
+import multiprocessing
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 
-def sanitize_name(name):
-    """Clean filename of invalid characters"""
-    return "".join(c for c in name if c.isalnum() or c in (" ", "-", "_")).strip()
+from config.settings import (
+    IMAGE_OUTPUT_SIZE,
+    POSTPROCESS_WORKERS,
+    POSTPROCESS_MAX_QUEUED,
+    PROCESSED_OUTPUTS,
+    RAW_OUTPUT,
+    ENCODE_THREADS,
+    SEAMLESS_REPAIR,
+)
+from utils.events import events
+from utils.metrics import metrics
 
-def process_images(raw_folder_path, processed_folder_path):
-    """Process all images in the raw folder and save to processed folder"""
+OUTPUT_EXTENSIONS = {"PNG": ".png", "JPEG": ".jpg", "WEBP": ".webp"}
+
+def output_path(base_path, spec):
+    """File path for one output: the base name plus the output's suffix and extension"""
+    root = os.path.splitext(base_path)[0]
+    return f"{root}{spec.get('suffix', '')}{OUTPUT_EXTENSIONS[spec['format'].upper()]}"
+
+def output_paths(base_path, outputs=PROCESSED_OUTPUTS):
+    """File path for every configured output, keyed by output name"""
+    return {name: output_path(base_path, spec) for name, spec in outputs.items()}
+
+def primary_output_path(base_path, outputs=PROCESSED_OUTPUTS):
+    """File path of the main deliverable, the first configured output"""
+    return output_path(base_path, next(iter(outputs.values())))
+
+def encode_image(image, format="PNG", size=None, dpi=None, quality=None, compress_level=None,
+                 optimize=False, tile=None, **_):
+    """Encode one output of an image to bytes in memory
+
+    tile repeats the (resized) image tile × tile times, for seam previews.
+    """
+    from PIL import Image
+
+    format = format.upper()
+    if size:
+        image = image.copy()
+        image.thumbnail(size, Image.LANCZOS)
+    if tile:
+        from utils.seamless import tile_preview
+        image = Image.fromarray(tile_preview(image, tile))
+    if format == "JPEG" and image.mode not in ("RGB", "L"):
+        image = image.convert("RGB")
+    params = {"optimize": optimize}
+    if dpi:
+        params["dpi"] = dpi
+    if quality is not None and format in ("JPEG", "WEBP"):
+        params["quality"] = quality
+    if compress_level is not None and format == "PNG":
+        params["compress_level"] = compress_level
+    buffer = io.BytesIO()
+    image.save(buffer, format=format, **params)
+    return buffer.getvalue()
+
+# Threads encoding outputs side by side; Pillow releases the GIL while encoding.
+# Keyed by pid so a forked worker process never reuses its parent's threads.
+_encoder_threads = {}
+_encoder_threads_lock = threading.Lock()
+
+def _encoder_pool():
+    with _encoder_threads_lock:
+        pid = os.getpid()
+        if pid not in _encoder_threads:
+            _encoder_threads[pid] = ThreadPoolExecutor(max_workers=ENCODE_THREADS, thread_name_prefix="encode")
+        return _encoder_threads[pid]
+
+def encode_outputs(image, outputs=PROCESSED_OUTPUTS):
+    """Encode every configured output of one image in parallel
+
+    Returns ({name: bytes}, {name: seconds}).
+    """
+    def encode(spec):
+        start = time.perf_counter()
+        data = encode_image(image, **spec)
+        return data, time.perf_counter() - start
+
+    if len(outputs) == 1:
+        encoded = {name: encode(spec) for name, spec in outputs.items()}
+    else:
+        futures = {name: _encoder_pool().submit(encode, spec) for name, spec in outputs.items()}
+        encoded = {name: future.result() for name, future in futures.items()}
+    return (
+        {name: data for name, (data, _) in encoded.items()},
+        {name: seconds for name, (_, seconds) in encoded.items()},
+    )
+
+def check_seamless(image, result):
+    """Score the image's tiling and repair its seams if needed, recording the report"""
+    if not SEAMLESS_REPAIR:
+        return image
+    from utils.seamless import enforce_seamless
+
+    image, report = enforce_seamless(image)
+    result["seamless"] = report
+    return image
+
+def process_image_file(input_path, output_path, size=IMAGE_OUTPUT_SIZE, outputs=PROCESSED_OUTPUTS):
+    """Resize a single image and write every configured output
+
+    Runs inside a worker process, so it returns a plain dict instead of
+    raising: input/output paths, ok flag, error message, sizes and timings.
+    output_path is the base name; the main deliverable's path is returned
+    as "output_path" and every file under "outputs".
+    """
+    paths = output_paths(output_path, outputs)
+    result = {
+        "input_path": input_path,
+        "output_path": primary_output_path(output_path, outputs),
+        "outputs": paths,
+        "ok": False,
+        "error": None,
+        "original_size": None,
+        "size": None,
+        "pid": os.getpid(),
+    }
+    from PIL import Image
+
+    start = time.perf_counter()
+    try:
+        with Image.open(input_path) as img:
+            result["original_size"] = img.size
+            img.load()
+            decoded = time.perf_counter()
+            img = img.resize(size, Image.LANCZOS)
+        img = check_seamless(img, result)
+        resized = time.perf_counter()
+        data, encode_seconds = encode_outputs(img, outputs)
+        encoded = time.perf_counter()
+        for name, path in paths.items():
+            with open(path, "wb") as f:
+                f.write(data[name])
+        result["size"] = img.size
+        result["ok"] = True
+        result["timings"] = {
+            "decode": decoded - start,
+            "resize": resized - decoded,
+            "encode": encoded - resized,
+            "write": time.perf_counter() - encoded,
+            "outputs": encode_seconds,
+        }
+    except Exception as e:
+        result["error"] = str(e)
+    result["seconds"] = time.perf_counter() - start
+    return result
+
+def encode_png(image, dpi=None):
+    """Encode an image to PNG bytes in memory with the raw output settings"""
+    spec = dict(RAW_OUTPUT, format="PNG")
+    if dpi:
+        spec["dpi"] = dpi
+    return encode_image(image, **spec)
+
+def save_raw_image(image, path):
+    """Write a generated image with the raw output settings"""
+    with open(path, "wb") as f:
+        f.write(encode_png(image))
+
+def process_image_data(image, size=IMAGE_OUTPUT_SIZE, outputs=PROCESSED_OUTPUTS):
+    """Resize an in-memory image and return every encoded output in the result
+
+    The decoded image is passed straight from generation, so nothing is
+    read back from disk. Encoded bytes are returned under "outputs" keyed by
+    output name, and the main deliverable also under "data".
+    """
+    result = {
+        "ok": False,
+        "error": None,
+        "original_size": image.size,
+        "size": None,
+        "data": None,
+        "outputs": None,
+        "pid": os.getpid(),
+    }
+    from PIL import Image
+
+    start = time.perf_counter()
     try:
-        # Ensure the processed folder exists
-        os.makedirs(processed_folder_path, exist_ok=True)
-        
-        # Get list of image files
-        image_files = [f for f in os.listdir(raw_folder_path) 
-                      if f.lower().endswith(('.png', '.jpg', '.jpeg'))]
-        
-        if not image_files:
-            print(f"⚠️ No images found in {raw_folder_path}")
-            return
-        
-        print(f"\nProcessing {len(image_files)} images:")
-        print(f"From: {raw_folder_path}")
-        print(f"To: {processed_folder_path}")
-        
-        for idx, filename in enumerate(image_files):
+        resized_image = check_seamless(image.resize(size, Image.LANCZOS), result)
+        resized = time.perf_counter()
+        data, encode_seconds = encode_outputs(resized_image, outputs)
+        result["outputs"] = data
+        result["data"] = data[next(iter(outputs))]
+        result["size"] = resized_image.size
+        result["ok"] = True
+        result["timings"] = {
+            "resize": resized - start,
+            "encode": time.perf_counter() - resized,
+            "outputs": encode_seconds,
+        }
+    except Exception as e:
+        result["error"] = str(e)
+    result["seconds"] = time.perf_counter() - start
+    return result
+
+def worker_failure(input_path, output_path, error):
+    """Result for an image whose worker process itself died"""
+    return {
+        "input_path": input_path,
+        "output_path": primary_output_path(output_path),
+        "ok": False,
+        "error": str(error),
+        "seconds": 0.0,
+    }
+
+class PostProcessPool:
+    """Process pool for per-image post-processing with a bounded work queue"""
+
+    def __init__(self, max_workers=POSTPROCESS_WORKERS, max_queued=POSTPROCESS_MAX_QUEUED):
+        self.max_workers = max_workers
+        # Started lazily from a process already running scheduler, upload and
+        # catalog threads; forking it could copy a lock held by one of them
+        self._executor = ProcessPoolExecutor(max_workers=max_workers, mp_context=multiprocessing.get_context("spawn"))
+        # Submissions block once this many images are queued or running
+        self._capacity = threading.BoundedSemaphore(max_workers + max_queued)
+        self._lock = threading.Lock()
+        # Images queued or being processed
+        self.queued = 0
+
+    def _submit(self, fn, *args):
+        self._capacity.acquire()
+        try:
+            future = self._executor.submit(fn, *args)
+        except Exception:
+            self._capacity.release()
+            raise
+        with self._lock:
+            self.queued += 1
+        future.add_done_callback(self._done)
+        return future
+
+    def _done(self, future):
+        with self._lock:
+            self.queued -= 1
+        self._capacity.release()
+
+    def submit(self, input_path, output_path):
+        """Queue one image, blocking while the pool is at capacity"""
+        return self._submit(process_image_file, input_path, output_path)
+
+    def submit_image(self, image):
+        """Queue an in-memory image, blocking while the pool is at capacity"""
+        return self._submit(process_image_data, image)
+
+    def process(self, jobs):
+        """Process (input_path, output_path) pairs and return their results in order"""
+        futures = [self.submit(input_path, output_path) for input_path, output_path in jobs]
+        results = []
+        for future, (input_path, output_path) in zip(futures, jobs):
             try:
-                input_path = os.path.join(raw_folder_path, filename)
-                output_path = os.path.join(processed_folder_path, filename)
-                
-                print(f"\nProcessing image {idx + 1}/{len(image_files)}: {filename}")
-                
-                with Image.open(input_path) as img:
-                    print(f"Original size: {img.size}")
-                    img = img.resize((3600, 3600), Image.LANCZOS)
-                    print(f"Resized to: {img.size}")
-                    img.save(output_path, dpi=(300, 300))
-                    print(f"Saved with 300 DPI to: {output_path}")
-            
+                results.append(future.result())
             except Exception as e:
-                print(f"❌ Error processing image {filename}: {e}")
-                logging.error(f"Error processing image {filename}: {e}")
-                continue
-        
-        # Verify processed files
-        processed_files = [f for f in os.listdir(processed_folder_path) 
-                         if f.lower().endswith(('.png', '.jpg', '.jpeg'))]
-        print(f"\n✅ Processed {len(processed_files)}/{len(image_files)} images")
-        
-    except Exception as e:
-        print(f"❌ Error processing folder: {e}")
-        logging.error(f"Error processing folder: {e}")
-        raise
\ No newline at end of file
+                results.append(worker_failure(input_path, output_path, e))
+        return results
+
+    def shutdown(self, wait=True):
+        self._executor.shutdown(wait=wait)
+
+# Global post-processing pool, shared by every prompt
+_postprocess_pool = None
+_postprocess_pool_lock = threading.Lock()
+
+def get_postprocess_pool():
+    """Get the shared post-processing pool, starting it on first use"""
+    global _postprocess_pool
+    with _postprocess_pool_lock:
+        if _postprocess_pool is None:
+            _postprocess_pool = PostProcessPool()
+            metrics.register_gauge("postprocess_queued", lambda pool=_postprocess_pool: pool.queued)
+        return _postprocess_pool
+
+def shutdown_postprocess_pool():
+    """Stop the shared post-processing pool if it was started"""
+    global _postprocess_pool
+    with _postprocess_pool_lock:
+        if _postprocess_pool is not None:
+            _postprocess_pool.shutdown()
+            _postprocess_pool = None
+
+def record_process_metrics(result):
+    """Record a post-processing result's timings, taken in the worker process"""
+    if not metrics.enabled:
+        return
+    if not result["ok"]:
+        metrics.inc("stage_errors", stage="process")
+        return
+    metrics.observe("process", result["seconds"])
+    for step, seconds in result.get("timings", {}).items():
+        if step == "outputs":
+            for name, output_seconds in seconds.items():
+                metrics.observe("encode_output", output_seconds, output=name)
+        else:
+            metrics.observe(f"process_{step}", seconds)
+
+def process_image_files(image_paths, processed_folder_path):
+    """Process the given images into the processed folder on the shared pool"""
+    os.makedirs(processed_folder_path, exist_ok=True)
+    jobs = [
+        (image_path, os.path.join(processed_folder_path, os.path.basename(image_path)))
+        for image_path in image_paths
+    ]
+    results = get_postprocess_pool().process(jobs)
+    for result in results:
+        report_process_result(result)
+    return results
+
+def report_process_result(result):
+    """Record a file's post-processing result in the metrics and events"""
+    record_process_metrics(result)
+    filename = os.path.basename(result["input_path"])
+    if result["ok"]:
+        events.info("process", f"Processed {filename}: {result['original_size']} -> {result['size']}",
+                    seconds=result["seconds"])
+        seamless = result.get("seamless")
+        if seamless and seamless["repaired"]:
+            events.info("process", f"Repaired seams of {filename}: tiling score "
+                                   f"{seamless['score_before']:.2f} -> {seamless['score']:.2f}")
+    else:
+        events.error("process", f"Error processing image {filename}: {result['error']}")
+        logging.error(f"Error processing image {filename}: {result['error']}")
@@ -0,0 +1,100 @@
+import hashlib
+import sqlite3
+import threading
+import time
+
+from config.settings import JOB_JOURNAL_PATH, DATABASE_JOURNAL_MODE
+
+# Job states in pipeline order; a job only ever moves forward through them
+PENDING = "pending"
+GENERATED = "generated"
+PROCESSED = "processed"
+UPLOADED = "uploaded"
+CATALOGUED = "catalogued"
+# Terminal state for images dropped as near-duplicates of an earlier one
+DUPLICATE = "duplicate"
+STATES = [PENDING, GENERATED, PROCESSED, UPLOADED, CATALOGUED, DUPLICATE]
+
+_FIELDS = [
+    "raw_path", "processed_path", "raw_output_dir", "processed_output_dir",
+    "raw_drive_link", "processed_drive_link", "error",
+]
+
+def mark_job(journal, key, state, **fields):
+    """Advance a job in the journal, when one is kept"""
+    if journal:
+        journal.mark(key, state, **fields)
+
+def job_key(prompt, duplicate_index, model_name):
+    """Stable identifier for a (prompt, duplicate index, model) job"""
+    raw = f"{prompt}\x00{duplicate_index}\x00{model_name}"
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+class JobJournal:
+    """SQLite record of every job and the last pipeline stage it finished"""
+
+    def __init__(self, db_path=JOB_JOURNAL_PATH, journal_mode=DATABASE_JOURNAL_MODE):
+        self.db_path = db_path
+        self.journal_mode = journal_mode
+        self._local = threading.local()
+        conn = self._conn()
+        with conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                "job_key TEXT PRIMARY KEY, prompt TEXT, duplicate_index INTEGER, "
+                "model_name TEXT, state TEXT, state_rank INTEGER, "
+                + ", ".join(f"{field} TEXT" for field in _FIELDS)
+                + ", updated_at REAL)"
+            )
+
+    def _conn(self):
+        # One connection per thread; SQLite serialises the writers
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.row_factory = sqlite3.Row
+            conn.execute(f"PRAGMA journal_mode={self.journal_mode}")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key):
+        """Get a job record as a dict, or None if it was never started"""
+        row = self._conn().execute("SELECT * FROM jobs WHERE job_key = ?", (key,)).fetchone()
+        return dict(row) if row else None
+
+    def start(self, key, prompt, duplicate_index, model_name):
+        """Record a job as pending, discarding any earlier progress"""
+        conn = self._conn()
+        with conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO jobs (job_key, prompt, duplicate_index, model_name, "
+                "state, state_rank, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (key, prompt, duplicate_index, model_name, PENDING, 0, time.time()),
+            )
+
+    def mark(self, key, state, **fields):
+        """Advance a job to a state and store any paths or links produced
+
+        A job never moves backwards, so stages that finish out of order
+        (e.g. background writes) cannot undo later progress.
+        """
+        unknown = set(fields) - set(_FIELDS)
+        if unknown:
+            raise ValueError(f"Unknown job fields: {', '.join(sorted(unknown))}")
+        rank = STATES.index(state)
+        assignments = ["state = CASE WHEN state_rank < ? THEN ? ELSE state END",
+                       "state_rank = MAX(state_rank, ?)",
+                       "updated_at = ?"]
+        params = [rank, state, rank, time.time()]
+        for field, value in fields.items():
+            assignments.append(f"{field} = ?")
+            params.append(value)
+        conn = self._conn()
+        with conn:
+            conn.execute(f"UPDATE jobs SET {', '.join(assignments)} WHERE job_key = ?", (*params, key))
+
+    def counts(self):
+        """Number of jobs in each state"""
+        rows = self._conn().execute("SELECT state, COUNT(*) FROM jobs GROUP BY state").fetchall()
+        return {state: count for state, count in rows}
+
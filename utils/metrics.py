@@ -0,0 +1,276 @@
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+from functools import wraps
+
+from config.settings import METRICS_ENABLED, METRICS_BUCKETS, METRICS_SAMPLE_INTERVAL
+
+class Histogram:
+    """Cumulative bucket counts of observed durations, as Prometheus exposes them"""
+
+    def __init__(self, buckets=METRICS_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        if value > self.max:
+            self.max = value
+
+    def quantile(self, q):
+        """Estimate a quantile by interpolating within its bucket"""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for index, count in enumerate(self.counts):
+            if count and seen + count >= rank:
+                lower = self.buckets[index - 1] if index else 0.0
+                upper = self.buckets[index] if index < len(self.buckets) else self.max
+                return min(lower + (upper - lower) * (rank - seen) / count, self.max)
+            seen += count
+        return self.max
+
+    def summary(self):
+        return {
+            "count": self.count,
+            "sum": self.sum,
+            "mean": self.sum / self.count if self.count else None,
+            "max": self.max,
+            "p50": self.quantile(0.50),
+            "p95": self.quantile(0.95),
+            "p99": self.quantile(0.99),
+        }
+
+class _Timer:
+    __slots__ = ("metrics", "stage", "labels", "started")
+
+    def __init__(self, metrics, stage, labels):
+        self.metrics = metrics
+        self.stage = stage
+        self.labels = labels
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.metrics.observe(self.stage, time.perf_counter() - self.started, **self.labels)
+        if exc_type is not None:
+            self.metrics.inc("stage_errors", stage=self.stage, **self.labels)
+
+class _NullTimer:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return None
+
+_NULL_TIMER = _NullTimer()
+
+def _label_key(labels):
+    return tuple(sorted(labels.items()))
+
+def _format_labels(labels, **extra):
+    pairs = list(labels) + list(extra.items())
+    if not pairs:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"') for _, value in pairs)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+class Metrics:
+    """Stage timers, counters and sampled gauges for one process
+
+    While disabled every call returns straight away, so instrumented code
+    costs one attribute check. Gauges are callables (queue depth, requests
+    in flight) sampled every METRICS_SAMPLE_INTERVAL seconds once enabled.
+    """
+
+    def __init__(self, enabled=False, sample_interval=METRICS_SAMPLE_INTERVAL):
+        self.enabled = False
+        self.sample_interval = sample_interval
+        self._lock = threading.Lock()
+        self._histograms = {}
+        self._counters = {}
+        self._gauge_sources = {}
+        self._gauges = {}
+        self._stop = threading.Event()
+        self._sampler = None
+        self.started_at = None
+        if enabled:
+            self.enable()
+
+    def enable(self):
+        """Start recording and sampling gauges"""
+        with self._lock:
+            if self.enabled:
+                return
+            self.enabled = True
+            self.started_at = time.time()
+            self._stop.clear()
+            self._sampler = threading.Thread(target=self._sample_loop, name="metrics-sampler", daemon=True)
+            self._sampler.start()
+
+    def disable(self):
+        """Stop recording; what was collected so far is kept"""
+        with self._lock:
+            self.enabled = False
+            sampler, self._sampler = self._sampler, None
+        self._stop.set()
+        if sampler is not None:
+            sampler.join()
+
+    def reset(self):
+        """Drop everything recorded so far; registered gauge sources are kept"""
+        with self._lock:
+            self._histograms = {}
+            self._counters = {}
+            self._gauges = {}
+            self.started_at = time.time() if self.enabled else None
+
+    def observe(self, stage, seconds, **labels):
+        """Record one duration for a stage"""
+        if not self.enabled:
+            return
+        key = (stage, _label_key(labels))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram()
+            histogram.observe(seconds)
+
+    def timer(self, stage, **labels):
+        """Context manager timing a block as one observation of a stage"""
+        if not self.enabled:
+            return _NULL_TIMER
+        return _Timer(self, stage, labels)
+
+    def inc(self, name, amount=1, **labels):
+        """Add to a counter"""
+        if not self.enabled:
+            return
+        key = (name, _label_key(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def register_gauge(self, name, source):
+        """Sample source() as a gauge; registering a name again replaces its source"""
+        with self._lock:
+            self._gauge_sources[name] = source
+
+    def _sample_loop(self):
+        while not self._stop.wait(self.sample_interval):
+            self.sample_gauges()
+
+    def sample_gauges(self):
+        with self._lock:
+            sources = list(self._gauge_sources.items())
+        for name, source in sources:
+            try:
+                value = float(source())
+            except Exception:
+                continue
+            with self._lock:
+                gauge = self._gauges.setdefault(name, {"value": 0.0, "max": 0.0, "sum": 0.0, "samples": 0})
+                gauge["value"] = value
+                gauge["max"] = max(gauge["max"], value)
+                gauge["sum"] += value
+                gauge["samples"] += 1
+
+    def snapshot(self):
+        """Everything recorded so far as a JSON-ready dict"""
+        if self.enabled:
+            self.sample_gauges()
+        with self._lock:
+            stages = [
+                dict(stage=stage, labels=dict(labels), **histogram.summary())
+                for (stage, labels), histogram in sorted(self._histograms.items())
+            ]
+            counters = [
+                {"name": name, "labels": dict(labels), "value": value}
+                for (name, labels), value in sorted(self._counters.items())
+            ]
+            gauges = {
+                name: {
+                    "value": gauge["value"],
+                    "max": gauge["max"],
+                    "mean": gauge["sum"] / gauge["samples"] if gauge["samples"] else None,
+                }
+                for name, gauge in sorted(self._gauges.items())
+            }
+        return {
+            "started_at": self.started_at,
+            "duration": time.time() - self.started_at if self.started_at else None,
+            "pid": os.getpid(),
+            "stages": stages,
+            "counters": counters,
+            "gauges": gauges,
+        }
+
+    def prometheus_text(self, prefix="image_gen"):
+        """Everything recorded so far in the Prometheus text exposition format"""
+        if self.enabled:
+            self.sample_gauges()
+        lines = [
+            f"# HELP {prefix}_stage_seconds Time spent in each pipeline stage",
+            f"# TYPE {prefix}_stage_seconds histogram",
+        ]
+        with self._lock:
+            for (stage, labels), histogram in sorted(self._histograms.items()):
+                base = (("stage", stage),) + labels
+                cumulative = 0
+                for bound, count in zip(histogram.buckets, histogram.counts):
+                    cumulative += count
+                    lines.append(f"{prefix}_stage_seconds_bucket{_format_labels(base, le=bound)} {cumulative}")
+                lines.append(f"{prefix}_stage_seconds_bucket{_format_labels(base, le='+Inf')} {histogram.count}")
+                lines.append(f"{prefix}_stage_seconds_sum{_format_labels(base)} {histogram.sum}")
+                lines.append(f"{prefix}_stage_seconds_count{_format_labels(base)} {histogram.count}")
+            typed = set()
+            for (name, labels), value in sorted(self._counters.items()):
+                if name not in typed:
+                    lines.append(f"# TYPE {prefix}_{name}_total counter")
+                    typed.add(name)
+                lines.append(f"{prefix}_{name}_total{_format_labels(labels)} {value}")
+            for name, gauge in sorted(self._gauges.items()):
+                lines.append(f"# TYPE {prefix}_{name} gauge")
+                lines.append(f"{prefix}_{name} {gauge['value']}")
+                lines.append(f"# TYPE {prefix}_{name}_max gauge")
+                lines.append(f"{prefix}_{name}_max {gauge['max']}")
+        return "\n".join(lines) + "\n"
+
+    def export(self, output_dir):
+        """Write metrics.json and metrics.prom to a folder; returns their paths"""
+        os.makedirs(output_dir, exist_ok=True)
+        json_path = os.path.join(output_dir, "metrics.json")
+        prom_path = os.path.join(output_dir, "metrics.prom")
+        for path, text in ((json_path, json.dumps(self.snapshot(), indent=2)), (prom_path, self.prometheus_text())):
+            # Written to a temporary file first so a scraper never reads half a file
+            tmp_path = f"{path}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                f.write(text)
+            os.replace(tmp_path, path)
+        return json_path, prom_path
+
+# Global metrics for this process, off unless METRICS_ENABLED or --metrics
+metrics = Metrics(enabled=METRICS_ENABLED)
+
+def timed(stage):
+    """Decorator timing every call of a function as a stage"""
+    def decorate(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not metrics.enabled:
+                return fn(*args, **kwargs)
+            with _Timer(metrics, stage, {}):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate
@@ -0,0 +1,68 @@
+from collections import deque
+from threading import Lock
+
+from config.settings import ROUTING_WINDOW, ROUTING_MIN_SAMPLES
+
+class LatencyStats:
+    """Rolling latency and success rate of one model's inference calls"""
+
+    def __init__(self, window=ROUTING_WINDOW):
+        self._samples = deque(maxlen=window)
+        self._lock = Lock()
+
+    def record(self, seconds, ok):
+        with self._lock:
+            self._samples.append((seconds, ok))
+
+    def snapshot(self):
+        """Sample count, success rate and p50/p95 latency of successful calls"""
+        with self._lock:
+            samples = list(self._samples)
+        latencies = sorted(seconds for seconds, ok in samples if ok)
+
+        def percentile(q):
+            if not latencies:
+                return None
+            return latencies[min(len(latencies) - 1, int(q * len(latencies)))]
+
+        return {
+            "samples": len(samples),
+            "success_rate": sum(1 for _, ok in samples if ok) / len(samples) if samples else None,
+            "p50": percentile(0.50),
+            "p95": percentile(0.95),
+        }
+
+# Rolling stats shared by every worker, keyed by model name
+_stats = {}
+_stats_lock = Lock()
+
+def get_model_stats(model_name):
+    """Get the shared latency stats for a model"""
+    with _stats_lock:
+        if model_name not in _stats:
+            _stats[model_name] = LatencyStats()
+        return _stats[model_name]
+
+def record_latency(model_name, seconds, ok):
+    get_model_stats(model_name).record(seconds, ok)
+
+def expected_latency(model_name):
+    """p50 latency inflated by the failure rate, or None before enough samples"""
+    stats = get_model_stats(model_name).snapshot()
+    if stats["samples"] < ROUTING_MIN_SAMPLES or stats["p50"] is None:
+        return None
+    return stats["p50"] / max(stats["success_rate"], 0.05)
+
+def rank_models(models):
+    """Order (key, (name, client)) pairs fastest first
+
+    Models without enough samples yet keep their menu order ahead of
+    measured ones, so every model gets tried and measured. Used to order
+    hedge fallbacks; the models a user selected are never reordered.
+    """
+    def sort_key(item):
+        index, (_, (name, _)) = item
+        expected = expected_latency(name)
+        return (expected is not None, expected or 0.0, index)
+
+    return [model for _, model in sorted(enumerate(models), key=sort_key)]
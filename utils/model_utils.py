@@ -1,16 +1,38 @@
-from huggingface_hub import InferenceClient
 from rich.console import Console
 from rich.panel import Panel
-from rich.progress import Progress, SpinnerColumn, TextColumn
+from concurrent.futures import ThreadPoolExecutor
+from threading import Lock
+import concurrent.futures
+import json
+import os
 import time
-from threading import Thread
-from queue import Queue
+
+from config.settings import (
+    GENERATION_TIMEOUT,
+    WARM_UP_REQUEST_TIMEOUT,
+    MODEL_READINESS_TTL,
+    WARM_UP_IN_BACKGROUND,
+)
+from utils.events import events
+from utils.generation_utils import request_image, is_timeout_error
+from utils.http_pool import configure_inference_http
+from utils.scheduler import register_model_limits, get_model_limiter
 
 console = Console()
 
+# key: (name, model id, requests per minute, max in-flight requests)
+MODEL_TABLE = {
+    "1": ("Flux", "strangerzonehf/Flux-Midjourney-Mix2-LoRA", 30, 4),
+    "2": ("Midjourney", "Jovie/Midjourney", 30, 4),
+    "3": ("Seamless", "prithivMLmods/Seamless-Pattern-Design-Flux-LoRA", 30, 4),
+    "4": ("Nercy", "Nercy/flux-dalle", 20, 2)
+}
+
+READINESS_CACHE_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), ".model_readiness.json")
+_readiness_lock = Lock()
+
 def load_environment():
     from dotenv import load_dotenv
-    import os
     
     load_dotenv()
     token = os.getenv("TOKEN")
@@ -18,47 +40,91 @@ def load_environment():
         raise ValueError("TOKEN not found in .env file")
     return token
 
-def warm_up_models(token, timeout=10):
-    """Initialize and warm up all models with timeout"""
+def load_readiness_cache():
+    """Read the per-model readiness cache left by earlier runs"""
+    try:
+        with open(READINESS_CACHE_PATH) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def record_readiness(model_id, ready):
+    """Store a model's warm-up result so later runs can skip the probe"""
+    with _readiness_lock:
+        cache = load_readiness_cache()
+        cache[model_id] = {"ready": ready, "checked_at": time.time()}
+        # The lock only covers this process; the pid keeps concurrent runs off each other's file
+        tmp_path = f"{READINESS_CACHE_PATH}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(cache, f, indent=2)
+        os.replace(tmp_path, READINESS_CACHE_PATH)
+
+def is_ready_cached(cache, model_id, ttl=MODEL_READINESS_TTL):
+    entry = cache.get(model_id)
+    return bool(entry and entry.get("ready") and time.time() - entry.get("checked_at", 0) < ttl)
+
+def _probe_model(client_cls, name, model_id, token):
+    """Send one warm-up request and record whether the model answered
+
+    The request takes a slot from the model's shared limiter, so a probe
+    still running in the background counts against the batch's quota.
+    """
+    try:
+        # A short-lived client whose transport gives up after the warm-up timeout
+        probe = client_cls(model_id, token=token, timeout=WARM_UP_REQUEST_TIMEOUT)
+        with get_model_limiter(name).slot():
+            request_image(probe, "test")
+        record_readiness(model_id, True)
+        events.info("warm_up", "ready", name)
+        return True
+    except Exception as e:
+        record_readiness(model_id, False)
+        if is_timeout_error(e):
+            e = f"Warm-up for {name} timed out"
+        events.warning("warm_up", f"warm-up skipped: {str(e)}", name)
+        return False
+
+def warm_up_models(token, timeout=10, wait=not WARM_UP_IN_BACKGROUND):
+    """Initialize all models and warm up the ones not known to be ready
+
+    Probes run concurrently. Models that answered within the readiness TTL
+    on an earlier run are not probed again. With wait=False the probes
+    continue in the background and the clients are returned immediately.
+    """
+    from huggingface_hub import InferenceClient
+
     console.print(Panel.fit("🎨 Initializing AI Models", style="bold magenta"))
-    models = {
-        "1": ("Flux", InferenceClient("strangerzonehf/Flux-Midjourney-Mix2-LoRA", token=token, timeout=30)),
-        "2": ("Midjourney", InferenceClient("Jovie/Midjourney", token=token, timeout=30)),
-        "3": ("Seamless", InferenceClient("prithivMLmods/Seamless-Pattern-Design-Flux-LoRA", token=token, timeout=30)),
-        "4": ("Nercy", InferenceClient("Nercy/flux-dalle", token=token, timeout=30))
-    }
+    # All clients share one keep-alive connection pool
+    console.print(f"[blue]HTTP connection pool: {configure_inference_http()}[/blue]")
+    models = {}
+    for key, (name, model_id, requests_per_minute, max_in_flight) in MODEL_TABLE.items():
+        models[key] = (name, InferenceClient(model_id, token=token, timeout=GENERATION_TIMEOUT))
+        register_model_limits(name, requests_per_minute=requests_per_minute, max_in_flight=max_in_flight)
     
     start_time = time.time()
+    cache = load_readiness_cache()
+    to_probe = []
+    for name, model_id, _, _ in MODEL_TABLE.values():
+        if is_ready_cached(cache, model_id):
+            console.print(f"[green]✓ {name} ready (cached)[/green]")
+        else:
+            to_probe.append((name, model_id))
     
-    with Progress(SpinnerColumn(), TextColumn("[progress.description]{task.description}"), console=console) as progress:
-        for key, (name, client) in models.items():
-            if time.time() - start_time > timeout:
-                console.print(f"[yellow]⚠ Warm-up taking too long, skipping remaining models[/yellow]")
-                break
-                
-            task = progress.add_task(f"Warming up {name}...", total=None)
-            try:
-                def warm_up():
-                    return client.text_to_image("test")
-                
-                q = Queue()
-                thread = Thread(target=lambda: q.put(warm_up()))
-                thread.daemon = True
-                thread.start()
-                
-                thread.join(timeout=2)
-                
-                if thread.is_alive():
-                    raise TimeoutError(f"Warm-up for {name} timed out")
-                    
-                progress.update(task, completed=True)
-                console.print(f"[green]✓ {name} ready[/green]")
-                
-            except Exception as e:
-                progress.update(task, completed=True)
-                console.print(f"[yellow]⚠ {name} warm-up skipped: {str(e)}[/yellow]")
-                continue
+    if to_probe:
+        executor = ThreadPoolExecutor(max_workers=len(to_probe), thread_name_prefix="warm-up")
+        futures = {
+            executor.submit(_probe_model, InferenceClient, name, model_id, token): name
+            for name, model_id in to_probe
+        }
+        # Probe threads end on their own once the transport timeout passes
+        executor.shutdown(wait=False)
+        if wait:
+            done, not_done = concurrent.futures.wait(futures, timeout=timeout)
+            for future in not_done:
+                console.print(f"[yellow]⚠ {futures[future]} still warming up, continuing in the background[/yellow]")
+        else:
+            console.print(f"[blue]Warming up {len(to_probe)} models in the background[/blue]")
     
     elapsed = time.time() - start_time
     console.print(f"[blue]Model initialization completed in {elapsed:.1f} seconds[/blue]")
-    return models 
\ No newline at end of file
+    return models
@@ -0,0 +1,35 @@
+import itertools
+import os
+import secrets
+from datetime import datetime
+
+RAW_FOLDER = "Digital Paper Store - Raw Folders"
+DIGITAL_PAPER_FOLDER = "Digital Paper Store - Digital Paper"
+SEAMLESS_PAPER_FOLDER = "Digital Paper Store - Seamless Paper"
+
+def make_output_dirs(output_dir, run_id):
+    """Create the raw, digital paper and seamless paper folders for a run"""
+    raw_output_dir = os.path.join(output_dir, RAW_FOLDER, run_id)
+    unprocessed_output_dir = os.path.join(output_dir, DIGITAL_PAPER_FOLDER, run_id)
+    processed_output_dir = os.path.join(output_dir, SEAMLESS_PAPER_FOLDER, run_id)
+
+    os.makedirs(raw_output_dir, exist_ok=True)
+    os.makedirs(unprocessed_output_dir, exist_ok=True)
+    os.makedirs(processed_output_dir, exist_ok=True)
+    return raw_output_dir, unprocessed_output_dir, processed_output_dir
+
+_job_counter = itertools.count(1)
+
+def new_job_id():
+    """Unique id for a job's folders and files
+
+    Keeps the sortable timestamp prefix and adds a per-process counter and a
+    random suffix, so jobs started in the same second (or in different
+    processes) never share a folder or file name.
+    """
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    return f"{timestamp}_{next(_job_counter):06d}_{secrets.token_hex(3)}"
+
+def image_filename(model_name, job_id):
+    """File name of the image a model produced for a job"""
+    return f"{model_name.lower()}_{job_id}.png"
@@ -0,0 +1,259 @@
+import os
+import sqlite3
+import threading
+import time
+from functools import lru_cache
+
+from config.settings import NEAR_DUPLICATE_ACTION, NEAR_DUPLICATE_MAX_DISTANCE, PHASH_INDEX_PATH, DATABASE_JOURNAL_MODE
+from utils.events import events, SKIPPED
+from utils.job_journal import GENERATED, DUPLICATE, mark_job
+
+HASH_SIZE = 8
+_DCT_SIZE = 32
+
+def _dct_matrix(n):
+    """Orthonormal DCT-II basis, so a 2-D DCT is two matrix products"""
+    import numpy as np
+
+    k = np.arange(n)[:, np.newaxis]
+    x = np.arange(n)[np.newaxis, :]
+    matrix = np.sqrt(2.0 / n) * np.cos(np.pi * (2 * x + 1) * k / (2 * n))
+    matrix[0] /= np.sqrt(2.0)
+    return matrix
+
+@lru_cache(maxsize=None)
+def _tables():
+    """DCT basis, bit weights and per-byte popcounts, built when first needed"""
+    import numpy as np
+
+    dct = _dct_matrix(_DCT_SIZE)
+    bit_weights = np.left_shift(np.uint64(1), np.arange(HASH_SIZE * HASH_SIZE, dtype=np.uint64))
+    popcount = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+    return dct, bit_weights, popcount
+
+def _pack_bits(bits):
+    """Pack 64 booleans into one unsigned 64-bit integer"""
+    import numpy as np
+
+    _, bit_weights, _ = _tables()
+    return int(np.bitwise_or.reduce(bit_weights[bits.ravel()], initial=np.uint64(0)))
+
+def _grayscale(image, size):
+    import numpy as np
+    from PIL import Image
+
+    return np.asarray(image.convert("L").resize(size, Image.LANCZOS), dtype=np.float32)
+
+def phash(image):
+    """64-bit perceptual hash: low DCT frequencies of a 32×32 thumbnail against their median"""
+    import numpy as np
+
+    dct, _, _ = _tables()
+    pixels = _grayscale(image, (_DCT_SIZE, _DCT_SIZE))
+    low = (dct @ pixels @ dct.T)[:HASH_SIZE, :HASH_SIZE]
+    # The DC term only reflects overall brightness
+    return _pack_bits(low > np.median(low.ravel()[1:]))
+
+def dhash(image):
+    """64-bit difference hash: whether each pixel of a 9×8 thumbnail is brighter than its right neighbour"""
+    pixels = _grayscale(image, (HASH_SIZE + 1, HASH_SIZE))
+    return _pack_bits(pixels[:, 1:] > pixels[:, :-1])
+
+def image_hashes(image):
+    """(phash, dhash) of a PIL image or an image file"""
+    if isinstance(image, (str, os.PathLike)):
+        from PIL import Image
+
+        with Image.open(image) as img:
+            img.draft("L", (_DCT_SIZE * 4, _DCT_SIZE * 4))
+            return phash(img), dhash(img)
+    return phash(image), dhash(image)
+
+def hamming_distances(hashes, value):
+    """Bit distance from value to every hash in a uint64 array"""
+    import numpy as np
+
+    xor = np.bitwise_xor(hashes, np.uint64(value))
+    if hasattr(np, "bitwise_count"):
+        return np.bitwise_count(xor)
+    _, _, popcount = _tables()
+    return popcount[xor.view(np.uint8)].reshape(-1, 8).sum(axis=1)
+
+def _to_signed(value):
+    # SQLite integers are signed 64-bit
+    return value - (1 << 64) if value >= 1 << 63 else value
+
+class PerceptualHashIndex:
+    """Persistent pHash/dHash index of generated images with vectorized near-duplicate lookup
+
+    Hashes live in SQLite and are mirrored in growable NumPy arrays, so a
+    lookup is a single XOR and popcount over every entry. Rows added by
+    other processes sharing the file are picked up before each lookup.
+    Each row records the job that generated it, so a job re-run (or served
+    from the generation cache) never matches its own earlier image.
+    """
+
+    def __init__(self, db_path=PHASH_INDEX_PATH, max_distance=NEAR_DUPLICATE_MAX_DISTANCE,
+                 journal_mode=DATABASE_JOURNAL_MODE):
+        import numpy as np
+
+        self.db_path = db_path
+        self.max_distance = max_distance
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, timeout=30, check_same_thread=False)
+        self._conn.execute(f"PRAGMA journal_mode={journal_mode}")
+        with self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS hashes ("
+                "id INTEGER PRIMARY KEY, phash INTEGER, dhash INTEGER, path TEXT, "
+                "model_name TEXT, prompt TEXT, created_at REAL)"
+            )
+            columns = {row[1] for row in self._conn.execute("PRAGMA table_info(hashes)")}
+            if "job_key" not in columns:
+                self._conn.execute("ALTER TABLE hashes ADD COLUMN job_key TEXT")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS hashes_job_key ON hashes (job_key)")
+        self._size = 0
+        self._ids = np.zeros(1024, dtype=np.int64)
+        self._phashes = np.zeros(1024, dtype=np.uint64)
+        self._dhashes = np.zeros(1024, dtype=np.uint64)
+        self._refresh()
+
+    def __len__(self):
+        return self._size
+
+    def _refresh(self):
+        """Load hashes added since the last load, including ones from other worker processes"""
+        import numpy as np
+
+        last_id = int(self._ids[self._size - 1]) if self._size else 0
+        rows = np.array(
+            self._conn.execute("SELECT id, phash, dhash FROM hashes WHERE id > ? ORDER BY id", (last_id,)).fetchall(),
+            dtype=np.int64
+        ).reshape(-1, 3)
+        if not len(rows):
+            return
+        self._grow(self._size + len(rows))
+        end = self._size + len(rows)
+        self._ids[self._size:end] = rows[:, 0]
+        # Stored signed; the bit pattern is the hash
+        self._phashes[self._size:end] = rows[:, 1].view(np.uint64)
+        self._dhashes[self._size:end] = rows[:, 2].view(np.uint64)
+        self._size = end
+
+    def _grow(self, needed):
+        import numpy as np
+
+        if needed <= len(self._ids):
+            return
+        capacity = max(needed, len(self._ids) * 2)
+        for name in ("_ids", "_phashes", "_dhashes"):
+            old = getattr(self, name)
+            new = np.zeros(capacity, dtype=old.dtype)
+            new[:self._size] = old[:self._size]
+            setattr(self, name, new)
+
+    def _nearest(self, phash_value, dhash_value, max_distance, exclude_job=None):
+        import numpy as np
+
+        self._refresh()
+        if not self._size:
+            return None
+        p = hamming_distances(self._phashes[:self._size], phash_value)
+        d = hamming_distances(self._dhashes[:self._size], dhash_value)
+        # Both hashes must agree, which keeps false positives rare
+        distance = np.maximum(p, d)
+        candidates = np.flatnonzero(distance <= max_distance)
+        for index in candidates[np.argsort(distance[candidates], kind="stable")]:
+            row = self._conn.execute(
+                "SELECT path, model_name, prompt, job_key FROM hashes WHERE id = ?", (int(self._ids[index]),)
+            ).fetchone()
+            if exclude_job is not None and row[3] == exclude_job:
+                continue
+            return {"path": row[0], "model_name": row[1], "prompt": row[2], "distance": int(distance[index])}
+        return None
+
+    def find(self, hashes, max_distance=None, exclude_job=None):
+        """Closest indexed image within max_distance bits of (phash, dhash), or None
+
+        Images indexed for exclude_job are not considered.
+        """
+        with self._lock:
+            return self._nearest(*hashes, self.max_distance if max_distance is None else max_distance, exclude_job)
+
+    def add(self, hashes, path, model_name=None, prompt=None, job_key=None):
+        with self._lock:
+            self._add(hashes, path, model_name, prompt, job_key)
+
+    def _add(self, hashes, path, model_name, prompt, job_key):
+        phash_value, dhash_value = hashes
+        if job_key is not None and self._conn.execute(
+            "SELECT 1 FROM hashes WHERE job_key = ? LIMIT 1", (job_key,)
+        ).fetchone():
+            # A re-run job keeps its first entry
+            return
+        with self._conn:
+            self._conn.execute(
+                "INSERT INTO hashes (phash, dhash, path, model_name, prompt, created_at, job_key) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (_to_signed(phash_value), _to_signed(dhash_value), path, model_name, prompt, time.time(), job_key),
+            )
+        # Loads the new row along with any added by other processes
+        self._refresh()
+
+    def check_and_add(self, image, path, model_name=None, prompt=None, job_key=None):
+        """Look an image up and index it in one step
+
+        Returns the near-duplicate it matched, or None. Matches against the
+        same job_key are ignored, so re-running a job (whose image may come
+        back unchanged from the generation cache) is never a duplicate of
+        itself. New images are always indexed; a near-duplicate is not, so
+        the original stays the reference for later lookups.
+        """
+        hashes = image_hashes(image)
+        with self._lock:
+            match = self._nearest(*hashes, self.max_distance, job_key)
+            if match is None:
+                self._add(hashes, path, model_name, prompt, job_key)
+            return match
+
+    def close(self):
+        self._conn.close()
+
+# Global near-duplicate index, opened on first use
+_phash_index = None
+_phash_index_lock = threading.Lock()
+
+def get_phash_index():
+    """Get the shared near-duplicate index"""
+    global _phash_index
+    with _phash_index_lock:
+        if _phash_index is None:
+            _phash_index = PerceptualHashIndex()
+        return _phash_index
+
+def set_phash_index(index):
+    """Use another near-duplicate index, e.g. a temporary one; returns the previous index"""
+    global _phash_index
+    with _phash_index_lock:
+        previous, _phash_index = _phash_index, index
+    return previous
+
+def skip_near_duplicate(image, image_path, model_name, prompt, journal=None, key=None):
+    """Check a generated image against the near-duplicate index before it is processed
+
+    Returns True when the job should stop here; with NEAR_DUPLICATE_ACTION
+    "flag" the match is only recorded in the journal.
+    """
+    if not NEAR_DUPLICATE_ACTION:
+        return False
+    match = get_phash_index().check_and_add(image, image_path, model_name, prompt, job_key=key)
+    if match is None:
+        return False
+    message = f"near duplicate of {match['path']} ({match['distance']} bits apart)"
+    if NEAR_DUPLICATE_ACTION == "flag":
+        events.warning("dedupe", f"{os.path.basename(image_path)} is a {message}", model_name)
+        mark_job(journal, key, GENERATED, error=message)
+        return False
+    events.emit("dedupe", SKIPPED, model_name, message=f"{os.path.basename(image_path)}: {message}")
+    mark_job(journal, key, DUPLICATE, raw_path=image_path, error=message)
+    return True
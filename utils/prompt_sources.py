@@ -0,0 +1,66 @@
+import csv
+import json
+import os
+
+PROMPT_COLUMNS = ("Prompts", "Prompt", "prompts", "prompt")
+
+def split_prompts(cell):
+    """A prompt cell may hold several prompts, one per line"""
+    if not cell:
+        return []
+    return [line.strip() for line in str(cell).splitlines() if line.strip()]
+
+def _prompt_column(headers):
+    for column in PROMPT_COLUMNS:
+        if column in headers:
+            return column
+    raise ValueError(f"No prompt column found, expected one of: {', '.join(PROMPT_COLUMNS)}")
+
+def iter_jsonl_prompts(path):
+    """Yield prompts from a JSONL file of strings or objects with a prompt field"""
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            record = json.loads(line)
+            if isinstance(record, str):
+                yield from split_prompts(record)
+            else:
+                yield from split_prompts(record[_prompt_column(record)])
+
+def iter_csv_prompts(path):
+    """Yield prompts from a CSV file with a Prompts column"""
+    with open(path, newline="", encoding="utf-8") as f:
+        reader = csv.DictReader(f)
+        column = _prompt_column(reader.fieldnames or [])
+        for row in reader:
+            yield from split_prompts(row[column])
+
+def iter_xlsx_prompts(path):
+    """Yield prompts from the active sheet of a workbook, streaming rows in read-only mode"""
+    import openpyxl
+
+    workbook = openpyxl.load_workbook(path, read_only=True, data_only=True)
+    try:
+        rows = workbook.active.iter_rows(values_only=True)
+        headers = list(next(rows, []))
+        index = headers.index(_prompt_column(headers))
+        for row in rows:
+            if index < len(row):
+                yield from split_prompts(row[index])
+    finally:
+        workbook.close()
+
+PROMPT_READERS = {
+    ".jsonl": iter_jsonl_prompts,
+    ".csv": iter_csv_prompts,
+    ".xlsx": iter_xlsx_prompts,
+}
+
+def iter_prompts(path):
+    """Lazily yield prompts from a .jsonl, .csv or .xlsx file"""
+    extension = os.path.splitext(path)[1].lower()
+    if extension not in PROMPT_READERS:
+        raise ValueError(f"Unsupported prompt file {path}, expected one of: {', '.join(PROMPT_READERS)}")
+    return PROMPT_READERS[extension](path)
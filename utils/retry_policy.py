@@ -0,0 +1,197 @@
+from email.utils import parsedate_to_datetime
+from threading import Lock
+import random
+import time
+
+from tenacity import (
+    AsyncRetrying,
+    Retrying,
+    retry_if_exception,
+    stop_after_attempt,
+    wait_exponential_jitter,
+)
+
+from config.settings import (
+    RETRY_MAX_ATTEMPTS,
+    RETRY_BASE_DELAY,
+    RETRY_MAX_DELAY,
+    CIRCUIT_FAILURE_THRESHOLD,
+    CIRCUIT_RESET_TIMEOUT,
+    MAX_COOL_DOWN_WAIT,
+)
+
+# Error kinds
+LOADING = "loading"
+RATE_LIMITED = "rate_limited"
+TIMEOUT = "timeout"
+TRANSIENT = "transient"
+PERMANENT = "permanent"
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling a model whose circuit breaker is open"""
+
+    def __init__(self, model_name, retry_in):
+        super().__init__(f"{model_name} is unavailable, retry in {retry_in:.0f} seconds")
+        self.model_name = model_name
+        self.retry_in = retry_in
+
+def _status_code(error):
+    response = getattr(error, "response", None)
+    status = getattr(response, "status_code", None)
+    return status if status is not None else getattr(error, "status_code", None)
+
+def classify_error(error):
+    """Sort an inference failure into loading, rate limited, timeout, transient or permanent"""
+    if isinstance(error, TimeoutError) or "timeout" in type(error).__name__.lower():
+        return TIMEOUT
+    status = _status_code(error)
+    if status == 503 or "currently loading" in str(error).lower():
+        return LOADING
+    if status == 429:
+        return RATE_LIMITED
+    if status is not None and 400 <= status < 500:
+        return PERMANENT
+    return TRANSIENT
+
+def retry_after(error):
+    """Seconds the server asked us to wait, from Retry-After or a loading estimate"""
+    response = getattr(error, "response", None)
+    if response is None:
+        return None
+    header = getattr(response, "headers", {}).get("Retry-After")
+    if header:
+        try:
+            return max(0.0, float(header))
+        except ValueError:
+            try:
+                return max(0.0, parsedate_to_datetime(header).timestamp() - time.time())
+            except (TypeError, ValueError):
+                pass
+    try:
+        # The HF API reports how long a cold model needs to load
+        estimated = response.json().get("estimated_time")
+        return float(estimated) if estimated is not None else None
+    except Exception:
+        return None
+
+class CircuitBreaker:
+    """Shared health state for one model, consulted by every worker before a call
+
+    Loading and rate-limit responses pause all callers until the server's
+    hint has passed. Repeated failures open the circuit so callers stop
+    sending requests and retry once it reopens; after reset_timeout one
+    trial call is let through to close it again.
+    """
+
+    def __init__(self, model_name, failure_threshold=CIRCUIT_FAILURE_THRESHOLD,
+                 reset_timeout=CIRCUIT_RESET_TIMEOUT, max_wait=MAX_COOL_DOWN_WAIT):
+        self.model_name = model_name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.max_wait = max_wait
+        self.failures = 0
+        self.opened_at = None
+        self.paused_until = 0.0
+        self._trial_running = False
+        self._lock = Lock()
+
+    @property
+    def state(self):
+        with self._lock:
+            if self.opened_at is None:
+                return "closed"
+            if time.monotonic() - self.opened_at < self.reset_timeout:
+                return "open"
+            return "half-open"
+
+    def before_call(self):
+        """Seconds to wait before calling the model; raises CircuitOpenError while the circuit is open"""
+        with self._lock:
+            now = time.monotonic()
+            if self.opened_at is not None:
+                remaining = self.reset_timeout - (now - self.opened_at)
+                if remaining > 0 or self._trial_running:
+                    raise CircuitOpenError(self.model_name, max(remaining, 0))
+                # Half-open: let exactly one trial call through
+                self._trial_running = True
+            wait = max(0.0, self.paused_until - now)
+            if wait > self.max_wait:
+                raise CircuitOpenError(self.model_name, wait)
+            return wait
+
+    def skip_call(self):
+        """Give back a call allowed by before_call that was never made, e.g. a cancelled one"""
+        with self._lock:
+            self._trial_running = False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial_running = False
+
+    def record_failure(self, kind, pause=None):
+        with self._lock:
+            now = time.monotonic()
+            self._trial_running = False
+            if kind in (LOADING, RATE_LIMITED) and pause:
+                self.paused_until = max(self.paused_until, now + pause)
+            if kind == PERMANENT:
+                return
+            self.failures += 1
+            if self.failures >= self.failure_threshold or self.opened_at is not None:
+                self.opened_at = now
+
+# Circuit breakers shared by every worker, keyed by model name
+_breakers = {}
+_breakers_lock = Lock()
+
+def get_circuit_breaker(model_name):
+    """Get the shared circuit breaker for a model"""
+    with _breakers_lock:
+        if model_name not in _breakers:
+            _breakers[model_name] = CircuitBreaker(model_name)
+        return _breakers[model_name]
+
+class RetryPolicy:
+    """Exponential backoff with jitter that honours Retry-After and skips permanent errors"""
+
+    def __init__(self, max_attempts=RETRY_MAX_ATTEMPTS, base_delay=RETRY_BASE_DELAY, max_delay=RETRY_MAX_DELAY):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._backoff = wait_exponential_jitter(initial=base_delay, max=max_delay, jitter=base_delay)
+
+    def should_retry(self, error):
+        # An open circuit is retried once it lets calls through again
+        return isinstance(error, CircuitOpenError) or classify_error(error) != PERMANENT
+
+    def wait(self, retry_state):
+        """Delay before the next attempt: backoff, stretched to any server hint or circuit reopen time"""
+        delay = self._backoff(retry_state)
+        error = retry_state.outcome.exception()
+        if isinstance(error, CircuitOpenError):
+            return max(delay, min(error.retry_in, MAX_COOL_DOWN_WAIT) + random.uniform(0, self.base_delay))
+        hinted = retry_after(error) if error is not None else None
+        if hinted is not None:
+            # Spread the herd a little so waiting workers don't all return at once
+            delay = max(delay, min(hinted, self.max_delay) + random.uniform(0, self.base_delay))
+        return delay
+
+    def _kwargs(self):
+        return dict(
+            stop=stop_after_attempt(self.max_attempts),
+            wait=self.wait,
+            retry=retry_if_exception(self.should_retry),
+            reraise=True,
+        )
+
+    def retrying(self):
+        """tenacity.Retrying configured with this policy"""
+        return Retrying(**self._kwargs())
+
+    def async_retrying(self):
+        """tenacity.AsyncRetrying configured with this policy"""
+        return AsyncRetrying(**self._kwargs())
+
+default_retry_policy = RetryPolicy()
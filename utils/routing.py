@@ -0,0 +1,121 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+from config.settings import (
+    HEDGE_DELAY,
+    HEDGE_MIN_DELAY,
+    HEDGE_MAX_EXTRA,
+    HEDGE_WORKERS,
+    HEDGE_EQUIVALENTS,
+    GENERATION_TIMEOUT,
+    ROUTING_MIN_SAMPLES,
+)
+from utils.generation_utils import generate_image
+from utils.model_stats import get_model_stats, rank_models
+
+# Threads for hedged attempts; separate from the job scheduler so a job can
+# wait on its own attempts without starving the pool it runs on
+_hedge_pool = None
+_hedge_pool_lock = threading.Lock()
+
+def _hedge_executor():
+    global _hedge_pool
+    with _hedge_pool_lock:
+        if _hedge_pool is None:
+            _hedge_pool = ThreadPoolExecutor(max_workers=HEDGE_WORKERS, thread_name_prefix="hedge")
+        return _hedge_pool
+
+def hedge_candidates(models, selected_models):
+    """Selected models followed by their configured equivalents from the model menu
+
+    HEDGE_EQUIVALENTS maps a model key to the keys it may be hedged with;
+    keys without an entry may be hedged with any other model.
+    """
+    candidates = list(selected_models)
+    chosen = {key for key, _ in candidates}
+    for key, _ in selected_models:
+        for other in HEDGE_EQUIVALENTS.get(key, list(models)):
+            if other in models and other not in chosen:
+                candidates.append((other, models[other]))
+                chosen.add(other)
+    return candidates
+
+def hedge_delay_for(model_name):
+    """How long to wait on a model before hedging: its rolling p95, within bounds"""
+    stats = get_model_stats(model_name).snapshot()
+    if stats["samples"] < ROUTING_MIN_SAMPLES or stats["p95"] is None:
+        return HEDGE_DELAY
+    return min(max(stats["p95"], HEDGE_MIN_DELAY), GENERATION_TIMEOUT)
+
+def hedged_generate(prompt, candidates, first_n=1, scheduler=None, duplicate_index=0,
+                    hedge_delay=None, max_extra=HEDGE_MAX_EXTRA, preferred_keys=None):
+    """Generate images from the first first_n models to answer
+
+    Candidates in preferred_keys (the models the user selected) go first in
+    their given order; the others are fallbacks ranked by rolling latency
+    and success rate. Without preferred_keys every candidate is ranked.
+    The first first_n start right away. Whenever the hedge delay passes
+    without enough results, or a request fails, the next candidate
+    starts, up to max_extra extra requests. Once first_n images arrived
+    the losers are cancelled: they make no further attempts and their
+    results are dropped.
+
+    Returns a list of (key, model_name, image) in arrival order.
+    """
+    if preferred_keys is None:
+        ranked = rank_models(candidates)
+    else:
+        preferred_keys = set(preferred_keys)
+        ranked = [candidate for candidate in candidates if candidate[0] in preferred_keys]
+        ranked += rank_models([candidate for candidate in candidates if candidate[0] not in preferred_keys])
+    budget = min(len(ranked), first_n + max_extra)
+    cancel = threading.Event()
+    pending = {}
+    results = []
+    launched = 0
+    last_launch = None
+
+    def launch():
+        nonlocal launched, last_launch
+        key, (model_name, client) = ranked[launched]
+        launched += 1
+        last_launch = time.monotonic()
+        future = _hedge_executor().submit(
+            generate_image,
+            model_name,
+            client,
+            prompt,
+            limiter=scheduler.limiter(model_name) if scheduler else None,
+            duplicate_index=duplicate_index,
+            cancel=cancel
+        )
+        pending[future] = (key, model_name)
+
+    for _ in range(min(first_n, budget)):
+        launch()
+    try:
+        while pending and len(results) < first_n:
+            delay = None
+            if launched < budget:
+                # The hedge is due a delay after the last model was launched, not after this wakeup
+                delay = hedge_delay if hedge_delay is not None else hedge_delay_for(ranked[launched - 1][1][0])
+                delay = max(0.0, last_launch + delay - time.monotonic())
+            done, _ = wait(pending, timeout=delay, return_when=FIRST_COMPLETED)
+            if not done:
+                launch()
+                continue
+            for future in done:
+                key, model_name = pending.pop(future)
+                try:
+                    image = future.result()
+                except Exception:
+                    image = None
+                if image is not None:
+                    results.append((key, model_name, image))
+                elif launched < budget:
+                    # Fall back to the next model straight away
+                    launch()
+    finally:
+        cancel.set()
+    return results[:first_n]
@@ -0,0 +1,141 @@
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from threading import BoundedSemaphore, Lock
+import time
+
+from config.settings import (
+    MAX_CONCURRENT_JOBS,
+    MAX_QUEUED_JOBS,
+    DEFAULT_REQUESTS_PER_MINUTE,
+    DEFAULT_MAX_IN_FLIGHT,
+)
+
+# Per-model limits registered by warm_up_models, keyed by model name
+_model_limits = {}
+# Rate limiters shared by every scheduler and the warm-up probes, keyed by model name
+_model_limiters = {}
+_model_limits_lock = Lock()
+
+def register_model_limits(model_name, requests_per_minute=DEFAULT_REQUESTS_PER_MINUTE,
+                          max_in_flight=DEFAULT_MAX_IN_FLIGHT):
+    """Record the request quota for a model"""
+    with _model_limits_lock:
+        _model_limits[model_name] = {
+            "requests_per_minute": requests_per_minute,
+            "max_in_flight": max_in_flight,
+        }
+        # The next caller gets a limiter built from the new quota
+        _model_limiters.pop(model_name, None)
+
+def get_model_limits(model_name):
+    """Get the request quota for a model, falling back to the defaults"""
+    with _model_limits_lock:
+        return dict(_model_limits.get(model_name, {
+            "requests_per_minute": DEFAULT_REQUESTS_PER_MINUTE,
+            "max_in_flight": DEFAULT_MAX_IN_FLIGHT,
+        }))
+
+class TokenBucket:
+    """Thread-safe token bucket refilled at a fixed requests-per-minute rate"""
+
+    def __init__(self, requests_per_minute, capacity=1):
+        self.rate = requests_per_minute / 60.0
+        self.capacity = max(1, capacity)
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self._lock = Lock()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self):
+        """Block until a token is available, then take it"""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+class ModelLimiter:
+    """Combines a model's request rate with its maximum in-flight requests"""
+
+    def __init__(self, model_name, requests_per_minute, max_in_flight):
+        self.model_name = model_name
+        self.bucket = TokenBucket(requests_per_minute, capacity=max_in_flight)
+        self._in_flight = BoundedSemaphore(max_in_flight)
+
+    @contextmanager
+    def slot(self):
+        """Hold one in-flight request slot for the duration of a call"""
+        self._in_flight.acquire()
+        try:
+            self.bucket.acquire()
+            yield
+        finally:
+            self._in_flight.release()
+
+def get_model_limiter(model_name):
+    """Get the process-wide rate limiter for a model"""
+    limits = get_model_limits(model_name)
+    with _model_limits_lock:
+        if model_name not in _model_limiters:
+            _model_limiters[model_name] = ModelLimiter(
+                model_name,
+                limits["requests_per_minute"],
+                limits["max_in_flight"],
+            )
+        return _model_limiters[model_name]
+
+class JobScheduler:
+    """Single bounded worker pool shared by every prompt and model"""
+
+    def __init__(self, max_concurrency=MAX_CONCURRENT_JOBS, max_queued=MAX_QUEUED_JOBS):
+        self.max_concurrency = max_concurrency
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="job")
+        # Submissions block once this many jobs are queued or running
+        self._capacity = BoundedSemaphore(max_concurrency + max_queued)
+        self._lock = Lock()
+        self.submitted = 0
+        self.completed = 0
+
+    def limiter(self, model_name):
+        """Get the shared rate limiter for a model"""
+        return get_model_limiter(model_name)
+
+    def submit(self, fn, *args, **kwargs):
+        """Queue a job, blocking while the scheduler is at capacity"""
+        self._capacity.acquire()
+        try:
+            future = self._executor.submit(fn, *args, **kwargs)
+        except Exception:
+            self._capacity.release()
+            raise
+        with self._lock:
+            self.submitted += 1
+        future.add_done_callback(self._job_done)
+        return future
+
+    def _job_done(self, future):
+        with self._lock:
+            self.completed += 1
+        self._capacity.release()
+
+    def pending(self):
+        """Number of jobs queued or running"""
+        with self._lock:
+            return self.submitted - self.completed
+
+    def shutdown(self, wait=True, cancel_futures=False):
+        self._executor.shutdown(wait=wait, cancel_futures=cancel_futures)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        # On Ctrl-C or an error, drop queued jobs instead of starting them
+        self.shutdown(wait=True, cancel_futures=exc_type is not None)
@@ -0,0 +1,135 @@
+import time
+
+import numpy as np
+
+from config.settings import (
+    SEAMLESS_MIN_SCORE,
+    SEAMLESS_BLEND_WIDTH,
+    SEAMLESS_SCORE_BAND,
+)
+
+# Arrays are (H, W, C) for one image or (N, H, W, C) for a batch of equal-sized images
+ROWS, COLS = -3, -2
+
+def _mean_abs_diff(a, b):
+    """Mean absolute difference per image, reducing everything but the batch axis"""
+    diff = np.abs(a.astype(np.float32) - b.astype(np.float32))
+    return diff.mean(axis=(-3, -2, -1))
+
+def edge_continuity_score(images, band=SEAMLESS_SCORE_BAND):
+    """Score how well images tile, from 0 (hard seams) to 1 (seams look like the interior)
+
+    The wrap-around difference between opposite edges is compared with the
+    difference between neighbouring pixels in a band next to each edge, so
+    busy and flat patterns are judged on the same scale.
+    """
+    images = np.asarray(images)
+    seam = (
+        _mean_abs_diff(images[..., :, :1, :], images[..., :, -1:, :])
+        + _mean_abs_diff(images[..., :1, :, :], images[..., -1:, :, :])
+    ) / 2
+    interior = (
+        _mean_abs_diff(images[..., :, 1:band + 1, :], images[..., :, :band, :])
+        + _mean_abs_diff(images[..., :, -band:, :], images[..., :, -band - 1:-1, :])
+        + _mean_abs_diff(images[..., 1:band + 1, :, :], images[..., :band, :, :])
+        + _mean_abs_diff(images[..., -band:, :, :], images[..., -band - 1:-1, :, :])
+    ) / 4
+    # A seam no worse than the texture itself counts as continuous
+    return np.clip((interior + 1.0) / (seam + 1.0), 0.0, 1.0)
+
+def _blend_weights(band):
+    """Smoothstep ramp from 0 at the edge to 1 at the end of the blend band"""
+    t = (np.arange(band, dtype=np.float32) + 0.5) / band
+    return t * t * (3 - 2 * t)
+
+def _to_dtype(values, dtype):
+    if np.issubdtype(dtype, np.integer):
+        info = np.iinfo(dtype)
+        values = np.clip(np.rint(values), info.min, info.max)
+    return values.astype(dtype)
+
+def _blend_axis(images, axis, blend_width):
+    """Offset-and-blend along one axis, touching only the bands next to its edges
+
+    Near each edge the image is cross-faded with itself shifted by half a
+    period, whose content is continuous across the wrap. The original seam
+    ends up weighted to zero and the shifted copy's seam, at the centre, is
+    never used.
+    """
+    size = images.shape[axis]
+    band = max(1, min(int(size * blend_width), size // 2))
+    half = size // 2
+    shape = [1] * images.ndim
+    shape[axis] = band
+    weights = _blend_weights(band).reshape(shape)
+
+    def take(start, stop):
+        index = [slice(None)] * images.ndim
+        index[axis] = slice(start, stop)
+        return tuple(index)
+
+    head, tail = take(0, band), take(size - band, size)
+    shifted_head = images[take(half, half + band)].astype(np.float32)
+    shifted_tail = images[take(half - band, half)].astype(np.float32)
+    out = images.copy()
+    out[head] = _to_dtype(weights * images[head] + (1 - weights) * shifted_head, images.dtype)
+    weights = np.flip(weights, axis=axis)
+    out[tail] = _to_dtype(weights * images[tail] + (1 - weights) * shifted_tail, images.dtype)
+    return out
+
+def repair_seams(images, blend_width=SEAMLESS_BLEND_WIDTH):
+    """Make images tile by offset-and-blend across both axes
+
+    Works on one image or a whole batch at once with array operations.
+    """
+    images = np.asarray(images)
+    repaired = _blend_axis(images, COLS, blend_width)
+    return _blend_axis(repaired, ROWS, blend_width)
+
+def make_seamless(images, min_score=SEAMLESS_MIN_SCORE, blend_width=SEAMLESS_BLEND_WIDTH):
+    """Score a batch, repair the images below min_score and score them again
+
+    Returns (images, scores_before, scores_after, repaired_mask).
+    """
+    images = np.asarray(images)
+    single = images.ndim == 3
+    if single:
+        images = images[np.newaxis]
+    before = edge_continuity_score(images)
+    repaired_mask = before < min_score
+    result = images
+    after = before.copy()
+    if repaired_mask.any():
+        result = images.copy()
+        result[repaired_mask] = repair_seams(images[repaired_mask], blend_width)
+        after[repaired_mask] = edge_continuity_score(result[repaired_mask])
+    if single:
+        return result[0], before[0], after[0], repaired_mask[0]
+    return result, before, after, repaired_mask
+
+def tile_preview(image, tiles=2):
+    """Repeat an image tiles × tiles times so seams are easy to inspect"""
+    array = np.asarray(image)
+    # Only rows and columns repeat; grayscale ("L") arrays have no channel axis
+    return np.tile(array, (tiles, tiles) + (1,) * (array.ndim - 2))
+
+def enforce_seamless(image, min_score=SEAMLESS_MIN_SCORE, blend_width=SEAMLESS_BLEND_WIDTH):
+    """PIL front end for make_seamless; returns (image, report)"""
+    from PIL import Image
+
+    mode = image.mode
+    array = np.asarray(image.convert("RGB") if mode not in ("RGB", "RGBA", "L") else image)
+    squeeze = array.ndim == 2
+    if squeeze:
+        array = array[..., np.newaxis]
+    start = time.perf_counter()
+    array, before, after, repaired = make_seamless(array, min_score, blend_width)
+    report = {
+        "score_before": float(before),
+        "score": float(after),
+        "repaired": bool(repaired),
+        "seconds": time.perf_counter() - start,
+    }
+    if not repaired:
+        return image, report
+    return Image.fromarray(array[..., 0] if squeeze else array), report
@@ -0,0 +1,33 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from config.settings import BACKGROUND_WRITER_WORKERS
+
+# Global background writer, shared by every job
+_writer = None
+_writer_lock = threading.Lock()
+
+def _write_file(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.part"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+    return path
+
+def write_in_background(path, data):
+    """Write an encoded artifact to disk off the calling thread and return the future"""
+    global _writer
+    with _writer_lock:
+        if _writer is None:
+            _writer = ThreadPoolExecutor(max_workers=BACKGROUND_WRITER_WORKERS, thread_name_prefix="writer")
+        return _writer.submit(_write_file, path, data)
+
+def shutdown_background_writer():
+    """Wait for pending writes and stop the background writer"""
+    global _writer
+    with _writer_lock:
+        if _writer is not None:
+            _writer.shutdown(wait=True)
+            _writer = None
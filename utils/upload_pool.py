@@ -0,0 +1,283 @@
+import hashlib
+import io
+import os
+import queue
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from config.settings import (
+    UPLOAD_WORKERS,
+    UPLOAD_MAX_QUEUED,
+    UPLOAD_CHUNK_SIZE,
+    UPLOAD_CHUNK_RETRIES,
+    PERMISSION_BATCH_SIZE,
+    PERMISSION_BATCH_WAIT,
+    UPLOAD_INDEX_PATH,
+    DATABASE_JOURNAL_MODE,
+)
+from utils.events import events
+from utils.http_pool import HttpObjectPool, DRIVE_API_HOST, host_limit
+from utils.metrics import metrics
+
+PUBLIC_PERMISSION = {
+    'type': 'anyone',
+    'value': 'anyone',
+    'role': 'reader'
+}
+
+def content_hash(path=None, data=None):
+    """SHA-256 of a file or an in-memory buffer"""
+    digest = hashlib.sha256()
+    if data is not None:
+        digest.update(data)
+    else:
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1024 * 1024), b""):
+                digest.update(block)
+    return digest.hexdigest()
+
+class UploadIndex:
+    """Persistent map from content hash to the Drive file already holding it"""
+
+    def __init__(self, db_path=UPLOAD_INDEX_PATH, journal_mode=DATABASE_JOURNAL_MODE):
+        self.db_path = db_path
+        self.journal_mode = journal_mode
+        self._local = threading.local()
+        conn = self._conn()
+        with conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS uploads ("
+                "content_hash TEXT PRIMARY KEY, file_id TEXT, link TEXT, title TEXT, uploaded_at REAL)"
+            )
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.execute(f"PRAGMA journal_mode={self.journal_mode}")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key):
+        """Drive link for a content hash, or None"""
+        row = self._conn().execute("SELECT link FROM uploads WHERE content_hash = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def put(self, key, file_id, link, title):
+        conn = self._conn()
+        with conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO uploads VALUES (?, ?, ?, ?, ?)",
+                (key, file_id, link, title, time.time()),
+            )
+
+class PyDriveBackend:
+    """Drive v2 API calls made through an authenticated pydrive GoogleDrive
+
+    httplib2 connections are not thread-safe, so calls check an authorized
+    Http object out of a pool shared by all upload and permission threads;
+    its size is the connection limit for the Drive API host.
+    """
+
+    def __init__(self, drive, chunk_size=UPLOAD_CHUNK_SIZE, max_chunk_retries=UPLOAD_CHUNK_RETRIES, http_pool=None):
+        self.drive = drive
+        self.chunk_size = chunk_size
+        self.max_chunk_retries = max_chunk_retries
+        self.http_pool = http_pool or HttpObjectPool(drive.auth.Get_Http_Object, host_limit(DRIVE_API_HOST))
+
+    @property
+    def service(self):
+        return self.drive.auth.service
+
+    def upload(self, stream, title, mime_type):
+        """Resumable chunked upload; a failed chunk is retried from the last committed offset"""
+        from googleapiclient.errors import HttpError
+        from googleapiclient.http import MediaIoBaseUpload
+
+        media = MediaIoBaseUpload(stream, mimetype=mime_type, chunksize=self.chunk_size, resumable=True)
+        request = self.service.files().insert(
+            body={'title': title, 'mimeType': mime_type},
+            media_body=media,
+            fields='id,alternateLink'
+        )
+        response = None
+        failures = 0
+        while response is None:
+            try:
+                with self.http_pool.connection() as http:
+                    _, response = request.next_chunk(http=http)
+                failures = 0
+            except (HttpError, OSError) as e:
+                status = int(getattr(getattr(e, "resp", None), "status", 0) or 0)
+                if isinstance(e, HttpError) and status < 500 and status != 429:
+                    raise
+                failures += 1
+                if failures > self.max_chunk_retries:
+                    raise
+                time.sleep(min(2 ** failures, 30))
+        return response['id'], response['alternateLink']
+
+    def share(self, file_ids):
+        """Make files publicly readable in one batch request; returns errors by file id"""
+        errors = {}
+
+        def callback(request_id, response, exception):
+            if exception is not None:
+                errors[request_id] = exception
+
+        batch = self.service.new_batch_http_request(callback=callback)
+        for file_id in file_ids:
+            batch.add(
+                self.service.permissions().insert(fileId=file_id, body=PUBLIC_PERMISSION, sendNotificationEmails=False),
+                request_id=file_id
+            )
+        with self.http_pool.connection() as http:
+            batch.execute(http=http)
+        return errors
+
+class UploadPool:
+    """Bounded pool of upload workers with batched sharing and a content-hash cache
+
+    backend needs upload(stream, title, mime_type) -> (file_id, link) and
+    share(file_ids) -> {file_id: error}; PyDriveBackend is the real one.
+    """
+
+    def __init__(self, backend, index=None, max_workers=UPLOAD_WORKERS, max_queued=UPLOAD_MAX_QUEUED,
+                 batch_size=PERMISSION_BATCH_SIZE, batch_wait=PERMISSION_BATCH_WAIT):
+        self.backend = backend
+        self.index = index if index is not None else UploadIndex()
+        self.batch_size = batch_size
+        self.batch_wait = batch_wait
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="upload")
+        self._capacity = threading.BoundedSemaphore(max_workers + max_queued)
+        self._lock = threading.Lock()
+        self._in_flight = {}
+        self._permissions = queue.Queue()
+        self._closed = False
+        self.uploaded = 0
+        self.skipped = 0
+        # Uploads queued or running
+        self.queued = 0
+        self._sharer = threading.Thread(target=self._share_loop, name="drive-share", daemon=True)
+        self._sharer.start()
+
+    def submit(self, path=None, data=None, title=None, mime_type='image/png'):
+        """Queue a file or buffer for upload; the future resolves to its public link"""
+        title = title or os.path.basename(path)
+        result = Future()
+        self._capacity.acquire()
+        try:
+            worker = self._executor.submit(self._upload, path, data, title, mime_type, result)
+        except Exception:
+            self._capacity.release()
+            raise
+        with self._lock:
+            self.queued += 1
+        worker.add_done_callback(self._upload_done)
+        return result
+
+    def _upload_done(self, worker):
+        with self._lock:
+            self.queued -= 1
+        self._capacity.release()
+
+    def _upload(self, path, data, title, mime_type, result):
+        try:
+            key = content_hash(path=path, data=data)
+            link = self.index.get(key)
+        except Exception as e:
+            result.set_exception(e)
+            return
+        if link:
+            with self._lock:
+                self.skipped += 1
+            metrics.inc("uploads_deduplicated")
+            result.set_result(link)
+            return
+
+        with self._lock:
+            # Identical content already uploading: reuse that upload's link
+            pending = self._in_flight.get(key)
+            if pending is not None:
+                self.skipped += 1
+                pending.append(result)
+                return
+            self._in_flight[key] = [result]
+
+        try:
+            with metrics.timer("upload"):
+                if data is not None:
+                    file_id, link = self.backend.upload(io.BytesIO(data), title, mime_type)
+                else:
+                    with open(path, "rb") as stream:
+                        file_id, link = self.backend.upload(stream, title, mime_type)
+        except Exception as e:
+            self._finish(key, error=e)
+            return
+        with self._lock:
+            self.uploaded += 1
+        self._permissions.put((key, file_id, link, title))
+
+    def _finish(self, key, link=None, error=None):
+        with self._lock:
+            waiting = self._in_flight.pop(key, [])
+        for result in waiting:
+            if error is not None:
+                result.set_exception(error)
+            else:
+                result.set_result(link)
+
+    def _share_loop(self):
+        while True:
+            item = self._permissions.get()
+            if item is None:
+                return
+            batch = [item]
+            deadline = time.monotonic() + self.batch_wait
+            stop = False
+            while len(batch) < self.batch_size:
+                try:
+                    item = self._permissions.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+                if item is None:
+                    stop = True
+                    break
+                batch.append(item)
+            try:
+                self._share_batch(batch)
+            except Exception as e:
+                # Keep sharing later uploads; anyone waiting on this batch gets the error
+                for key, _, _, _ in batch:
+                    self._finish(key, error=e)
+            if stop:
+                return
+
+    def _share_batch(self, batch):
+        try:
+            with metrics.timer("upload_share"):
+                errors = self.backend.share([file_id for _, file_id, _, _ in batch])
+        except Exception as e:
+            errors = {file_id: e for _, file_id, _, _ in batch}
+        for key, file_id, link, title in batch:
+            if file_id in errors:
+                self._finish(key, error=errors[file_id])
+            else:
+                try:
+                    self.index.put(key, file_id, link, title)
+                except Exception as e:
+                    # The file is uploaded and shared; only later dedupe of it is lost
+                    events.warning("upload", f"Could not record {title} in the upload index: {e}")
+                self._finish(key, link=link)
+
+    def shutdown(self):
+        """Finish queued uploads and pending permission batches"""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+        self._executor.shutdown(wait=True)
+        self._permissions.put(None)
+        self._sharer.join()
@@ -0,0 +1,217 @@
+import os
+import socket
+import sqlite3
+import threading
+import time
+
+from config.settings import (
+    WORK_QUEUE_PATH,
+    WORK_QUEUE_JOURNAL_MODE,
+    LEASE_SECONDS,
+    HEARTBEAT_INTERVAL,
+    MAX_JOB_ATTEMPTS,
+)
+from utils.events import events
+from utils.job_journal import job_key
+
+# Queue job states
+QUEUED = "queued"
+LEASED = "leased"
+DONE = "done"
+FAILED = "failed"
+
+def worker_id():
+    """Identifier of this worker process, unique across hosts sharing a queue"""
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+class WorkQueue:
+    """Lease-based job queue in a SQLite file shared by producer and worker processes
+
+    A claimed job is leased to one worker until lease_expires. Workers
+    extend their leases with heartbeats; a job whose lease runs out (its
+    worker died or hung) can be claimed again, up to max_attempts times.
+    """
+
+    def __init__(self, db_path=WORK_QUEUE_PATH, lease_seconds=LEASE_SECONDS, max_attempts=MAX_JOB_ATTEMPTS,
+                 journal_mode=WORK_QUEUE_JOURNAL_MODE):
+        self.db_path = db_path
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.journal_mode = journal_mode
+        self._local = threading.local()
+        conn = self._conn()
+        with conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                "id INTEGER PRIMARY KEY, job_key TEXT UNIQUE, prompt TEXT, duplicate_index INTEGER, "
+                "model_key TEXT, status TEXT, worker TEXT, lease_expires REAL, attempts INTEGER DEFAULT 0, "
+                "error TEXT, enqueued_at REAL, updated_at REAL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS jobs_claimable ON jobs (status, lease_expires)")
+
+    def _conn(self):
+        # One connection per thread; isolation_level=None so claims can take the write lock up front
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=60, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute(f"PRAGMA journal_mode={self.journal_mode}")
+            self._local.conn = conn
+        return conn
+
+    def enqueue(self, jobs, batch_size=500):
+        """Add (prompt, duplicate_index, model_key) jobs, ignoring ones already queued
+
+        jobs may be a lazy generator; it is consumed in batches.
+        """
+        conn = self._conn()
+        added = 0
+        batch = []
+
+        def flush():
+            nonlocal added
+            now = time.time()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                before = conn.total_changes
+                conn.executemany(
+                    "INSERT OR IGNORE INTO jobs (job_key, prompt, duplicate_index, model_key, status, "
+                    "enqueued_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    [(job_key(prompt, duplicate_index, model_key), prompt, duplicate_index, model_key, QUEUED, now, now)
+                     for prompt, duplicate_index, model_key in batch],
+                )
+                added += conn.total_changes - before
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+            batch.clear()
+
+        for job in jobs:
+            batch.append(job)
+            if len(batch) >= batch_size:
+                flush()
+        if batch:
+            flush()
+        return added
+
+    def claim(self, worker):
+        """Lease the oldest claimable job to a worker; returns the job as a dict, or None"""
+        conn = self._conn()
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            # Expired leases that used up their attempts are given up on
+            conn.execute(
+                "UPDATE jobs SET status = ?, error = COALESCE(error, 'lease expired'), updated_at = ? "
+                "WHERE status = ? AND lease_expires < ? AND attempts >= ?",
+                (FAILED, now, LEASED, now, self.max_attempts),
+            )
+            row = conn.execute(
+                "SELECT * FROM jobs WHERE status = ? OR (status = ? AND lease_expires < ?) ORDER BY id LIMIT 1",
+                (QUEUED, LEASED, now),
+            ).fetchone()
+            if row is not None:
+                conn.execute(
+                    "UPDATE jobs SET status = ?, worker = ?, lease_expires = ?, attempts = attempts + 1, "
+                    "updated_at = ? WHERE id = ?",
+                    (LEASED, worker, now + self.lease_seconds, now, row["id"]),
+                )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        if row is None:
+            return None
+        job = dict(row)
+        job["attempts"] += 1
+        return job
+
+    def heartbeat(self, job_ids, worker):
+        """Extend a worker's leases; returns the ids it still holds"""
+        if not job_ids:
+            return set()
+        conn = self._conn()
+        now = time.time()
+        placeholders = ", ".join("?" for _ in job_ids)
+        conn.execute(
+            f"UPDATE jobs SET lease_expires = ?, updated_at = ? "
+            f"WHERE worker = ? AND status = ? AND id IN ({placeholders})",
+            (now + self.lease_seconds, now, worker, LEASED, *job_ids),
+        )
+        rows = conn.execute(
+            f"SELECT id FROM jobs WHERE worker = ? AND status = ? AND id IN ({placeholders})",
+            (worker, LEASED, *job_ids),
+        ).fetchall()
+        return {row[0] for row in rows}
+
+    def complete(self, job_id, worker):
+        """Mark a leased job done; returns False if the lease was lost to another worker"""
+        return self._finish(job_id, worker, DONE, None)
+
+    def fail(self, job_id, worker, error, retry=True):
+        """Give a job back to the queue, or fail it for good once it used up its attempts
+
+        With retry=False the job fails for good straight away, e.g. when no
+        worker could ever run it.
+        """
+        conn = self._conn()
+        row = conn.execute("SELECT attempts FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        status = FAILED if not retry or row is None or row[0] >= self.max_attempts else QUEUED
+        return self._finish(job_id, worker, status, error)
+
+    def _finish(self, job_id, worker, status, error):
+        cursor = self._conn().execute(
+            "UPDATE jobs SET status = ?, error = ?, lease_expires = NULL, updated_at = ? "
+            "WHERE id = ? AND worker = ? AND status = ?",
+            (status, error, time.time(), job_id, worker, LEASED),
+        )
+        return cursor.rowcount == 1
+
+    def counts(self):
+        """Number of jobs in each status"""
+        rows = self._conn().execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()
+        return {status: count for status, count in rows}
+
+    def pending(self):
+        """Jobs queued or leased"""
+        counts = self.counts()
+        return counts.get(QUEUED, 0) + counts.get(LEASED, 0)
+
+class LeaseKeeper:
+    """Background thread that heartbeats every lease a worker process holds"""
+
+    def __init__(self, queue, worker, interval=HEARTBEAT_INTERVAL):
+        self.queue = queue
+        self.worker = worker
+        self.interval = interval
+        self._held = set()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="lease-heartbeat", daemon=True)
+        self._thread.start()
+
+    def hold(self, job_id):
+        with self._lock:
+            self._held.add(job_id)
+
+    def release(self, job_id):
+        with self._lock:
+            self._held.discard(job_id)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            with self._lock:
+                held = list(self._held)
+            try:
+                still_held = self.queue.heartbeat(held, self.worker)
+            except sqlite3.Error as e:
+                events.warning("queue", f"Lease heartbeat failed: {e}")
+                continue
+            lost = set(held) - still_held
+            if lost:
+                events.warning("queue", f"Lost leases on jobs {sorted(lost)}; another worker may redo them")
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()